@@ -0,0 +1,219 @@
+"""
+Asyncio repost pipeline for the repost tool
+Runs many reposts side by side on one event loop. yt-dlp, instagrapi and the
+upload calls are blocking, so each step runs on a sized thread pool while the
+loop only coordinates; a single worker process can keep dozens of jobs in flight.
+Output is routed per job, so concurrent jobs never mix their log lines or events.
+"""
+
+import os
+import sys
+import io
+import json
+import asyncio
+import argparse
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import simple_repost_api
+from simple_repost_api import (
+    DOWNLOAD_FOLDER, download_video, publish_video, cleanup_video, prefetch_video, is_valid_source_url,
+    extract_video_id, find_previous_repost, fingerprint_video, record_repost, report_duplicate,
+    account_unavailable, emit_event, timed, phase_started, safe_error_text, safe_print_error,
+    format_api_result, write_frame, FramedJobOutput, LockedStream,
+)
+
+# --- Configuration ---
+ASYNC_DOWNLOAD_WORKERS = int(os.environ.get("ASYNC_DOWNLOAD_WORKERS", 8))  # Concurrent yt-dlp downloads
+ASYNC_UPLOAD_WORKERS = int(os.environ.get("ASYNC_UPLOAD_WORKERS", 4))      # Concurrent Instagram uploads
+ASYNC_MAX_JOBS = int(os.environ.get("ASYNC_MAX_JOBS", 32))                 # Jobs in flight per worker
+
+download_executor = ThreadPoolExecutor(max_workers=ASYNC_DOWNLOAD_WORKERS, thread_name_prefix="download")
+upload_executor = ThreadPoolExecutor(max_workers=ASYNC_UPLOAD_WORKERS, thread_name_prefix="upload")
+
+# Where the current job's stdout and stderr go; unset means the real streams
+job_stdout = contextvars.ContextVar("job_stdout", default=None)
+job_stderr = contextvars.ContextVar("job_stderr", default=None)
+
+class JobOutputRouter(io.TextIOBase):
+    """Stands in for sys.stdout/sys.stderr and writes to the current job's output"""
+
+    def __init__(self, target, fallback):
+        self.target = target
+        self.fallback = fallback
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        return (self.target.get() or self.fallback).write(text)
+
+    def flush(self):
+        (self.target.get() or self.fallback).flush()
+
+async def run_blocking(executor, func, *args):
+    """Run a blocking call on an executor, keeping the caller's job output routing"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args))
+
+async def repost_video(video_url, custom_caption=None, custom_hashtags=None, source="instagram"):
+    """Async version of simple_repost_api.repost_video with the same events and result."""
+    # Phase timings are per job, shared with the executor threads that run its phases
+    phase_started.set({})
+    upload_success = False
+    video_path = None
+    error = None
+
+    if not video_url:
+        print("Error: No video URL provided")
+        emit_event("job", "failed", error_code="missing_url", message="No video URL provided")
+        return False
+
+    with timed("parse"):
+        valid = is_valid_source_url(video_url, source)
+        video_id = extract_video_id(video_url)
+    if not valid:
+        print(f"Error: Invalid {source} URL")
+        emit_event("job", "failed", error_code="invalid_url", message=f"Invalid {source} URL")
+        return False
+
+    previous = find_previous_repost(video_id, source)
+    if previous:
+        report_duplicate(previous)
+        return False
+    if account_unavailable():
+        return False
+
+    try:
+        video_path = await run_blocking(download_executor, download_video, video_url, DOWNLOAD_FOLDER, source)
+
+        if not video_path or not os.path.exists(video_path):
+            print("Error: Failed to download video.")
+            return False
+
+        phash, previous = await run_blocking(download_executor, fingerprint_video, video_path)
+        if previous:
+            return False
+
+        upload_success = await run_blocking(upload_executor, publish_video, video_path,
+                                            custom_caption, custom_hashtags, source, video_id)
+        if upload_success:
+            record_repost(video_id, source, video_url, phash)
+        return upload_success
+    except Exception as e:
+        safe_print_error("Unexpected error during repost process", e)
+        error = e
+        return False
+    finally:
+        if upload_success:
+            print("Upload completed successfully!")
+
+        cleanup_video(video_path)
+
+        if upload_success:
+            emit_event("job", "completed")
+        elif previous:
+            report_duplicate(previous)
+        elif error:
+            emit_event("job", "failed", error_code="unexpected_error", message=safe_error_text(error))
+        else:
+            emit_event("job", "failed")
+
+# --- Async worker mode ---
+# Same framed protocol as `simple_repost_api.py --worker`, but jobs run side by
+# side instead of one after another; frames are matched to jobs by their "id".
+
+async def run_worker_job(job, stream, limit):
+    """Run one framed job with its output routed to its own frames"""
+    job_id = job.get("id")
+    stdout = FramedJobOutput(stream, job_id)
+    stderr = FramedJobOutput(stream, job_id, "stderr")
+    success = False
+
+    async with limit:
+        job_stdout.set(stdout)
+        job_stderr.set(stderr)
+        try:
+            if job.get("action") == "prefetch":
+                success = await run_blocking(download_executor, prefetch_video, job.get("url"),
+                                             job.get("source") or "instagram")
+            else:
+                success = await repost_video(job.get("url"), job.get("caption"), job.get("hashtags"),
+                                             job.get("source") or "instagram")
+        except Exception as e:
+            safe_print_error("Unexpected error", e)
+            emit_event("job", "failed", error_code="unexpected_error", message=safe_error_text(e))
+
+    stdout.finish()
+    stderr.finish()
+    write_frame(stream, {"id": job_id, "type": "result", "success": bool(success)})
+
+async def serve_jobs(input_stream, stream, max_jobs=ASYNC_MAX_JOBS):
+    """Read framed jobs until the input ends or asks to shut down, then wait for running jobs"""
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(max_jobs)
+    running = set()
+    write_frame(stream, {"type": "ready"})
+
+    while True:
+        # Reading stdin blocks, so it gets its own thread instead of a job executor slot
+        raw = await loop.run_in_executor(None, input_stream.readline)
+        if not raw:
+            break
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            job = json.loads(raw)
+        except ValueError as e:
+            write_frame(stream, {"type": "error", "error": f"Invalid job frame: {e}"})
+            continue
+        if job.get("type") == "shutdown":
+            break
+        task = asyncio.create_task(run_worker_job(job, stream, limit))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    if running:
+        await asyncio.gather(*running)
+
+def run_worker(max_jobs=ASYNC_MAX_JOBS):
+    """Run as a persistent worker on stdin/stdout with up to max_jobs jobs in flight"""
+    stream = LockedStream(sys.stdout)
+    # Anything printed outside a job still reaches the real streams
+    sys.stdout = JobOutputRouter(job_stdout, sys.stdout)
+    sys.stderr = JobOutputRouter(job_stderr, sys.stderr)
+    asyncio.run(serve_jobs(sys.stdin, stream, max_jobs))
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+    sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
+
+    parser = argparse.ArgumentParser(description='Repost Videos to Instagram (asyncio pipeline)')
+    parser.add_argument('url', nargs='?', help='Instagram reel or YouTube shorts URL to repost')
+    parser.add_argument('--caption', help='Custom caption for the repost')
+    parser.add_argument('--hashtags', help='Custom hashtags for the repost')
+    parser.add_argument('--source', help='Source platform (instagram or youtube)', default='instagram')
+    parser.add_argument('--worker', action='store_true', help='Run as a concurrent worker reading JSON jobs from stdin')
+    parser.add_argument('--max-jobs', type=int, default=ASYNC_MAX_JOBS, help='Jobs in flight at once in worker mode')
+    parser.add_argument('--spool', choices=['disk', 'memory'], default=simple_repost_api.DOWNLOAD_SPOOL,
+                        help='Where downloads are written before upload (memory uses tmpfs)')
+
+    args = parser.parse_args()
+    simple_repost_api.DOWNLOAD_SPOOL = args.spool
+    simple_repost_api.UPLOAD_DEFER = args.worker
+
+    if args.worker:
+        run_worker(max(1, args.max_jobs))
+        sys.exit(0)
+
+    if args.url:
+        success = asyncio.run(repost_video(args.url, args.caption, args.hashtags, args.source))
+        if success:
+            print(format_api_result(True, f"{args.source.capitalize()} video uploaded successfully"))
+        else:
+            print(format_api_result(False, f"Failed to upload {args.source} video"))
+    else:
+        print(format_api_result(False, "Error: No video URL provided"))
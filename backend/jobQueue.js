@@ -0,0 +1,143 @@
+// Admission control and scheduling for repost jobs
+// Jobs wait in per-account queues and are started only while the global and
+// per-account concurrency limits allow. Accounts take turns so one busy account
+// cannot starve the others, and a full queue is reported so the API can answer 429.
+
+const MAX_CONCURRENT_JOBS = parseInt(process.env.MAX_CONCURRENT_JOBS || '2', 10);
+const MAX_JOBS_PER_ACCOUNT = parseInt(process.env.MAX_JOBS_PER_ACCOUNT || '1', 10);
+const MAX_QUEUE_DEPTH = parseInt(process.env.MAX_QUEUE_DEPTH || '100', 10);
+
+class JobQueue {
+    // run(job) must return a promise that settles when the job is finished
+    constructor({
+        run,
+        maxConcurrent = MAX_CONCURRENT_JOBS,
+        maxPerAccount = MAX_JOBS_PER_ACCOUNT,
+        maxDepth = MAX_QUEUE_DEPTH
+    }) {
+        this.run = run;
+        this.maxConcurrent = maxConcurrent;
+        this.maxPerAccount = maxPerAccount;
+        this.maxDepth = maxDepth;
+        // account -> queued jobs, highest priority first and FIFO within a priority
+        this.queues = new Map();
+        // account -> number of running jobs
+        this.runningByAccount = new Map();
+        this.running = 0;
+        this.queued = 0;
+        // Accounts in the order they should next be served
+        this.rotation = [];
+    }
+
+    isFull() {
+        return this.queued >= this.maxDepth;
+    }
+
+    // Queue a job ({ id, account, priority }); returns false if the queue is full
+    enqueue(job) {
+        if (this.isFull()) {
+            return false;
+        }
+
+        const account = job.account || 'default';
+        if (!this.queues.has(account)) {
+            this.queues.set(account, []);
+            this.rotation.push(account);
+        }
+
+        // Insert after every queued job with the same or higher priority
+        const queue = this.queues.get(account);
+        const priority = job.priority || 0;
+        let index = queue.length;
+        while (index > 0 && (queue[index - 1].priority || 0) < priority) {
+            index--;
+        }
+        queue.splice(index, 0, { ...job, account, priority });
+        this.queued++;
+
+        this.pump();
+        return true;
+    }
+
+    // Position of a queued job among all queued jobs, or -1 if it is not waiting
+    position(jobId) {
+        let position = 0;
+        for (const queue of this.queues.values()) {
+            const index = queue.findIndex((job) => job.id === jobId);
+            if (index !== -1) {
+                return position + index;
+            }
+            position += queue.length;
+        }
+        return -1;
+    }
+
+    stats() {
+        return {
+            running: this.running,
+            queued: this.queued,
+            maxConcurrent: this.maxConcurrent,
+            maxPerAccount: this.maxPerAccount,
+            maxDepth: this.maxDepth
+        };
+    }
+
+    // Pick the next job: highest head priority wins, ties go to the account served least recently
+    next() {
+        let best = null;
+        for (const account of this.rotation) {
+            const queue = this.queues.get(account);
+            if (!queue.length || (this.runningByAccount.get(account) || 0) >= this.maxPerAccount) {
+                continue;
+            }
+            if (!best || queue[0].priority > best.priority) {
+                best = queue[0];
+            }
+        }
+        if (!best) {
+            return null;
+        }
+
+        this.queues.get(best.account).shift();
+        this.queued--;
+        // Move the served account to the back of the rotation
+        this.rotation.splice(this.rotation.indexOf(best.account), 1);
+        if (this.queues.get(best.account).length) {
+            this.rotation.push(best.account);
+        } else {
+            this.queues.delete(best.account);
+        }
+        return best;
+    }
+
+    // Start as many jobs as the limits allow
+    pump() {
+        while (this.running < this.maxConcurrent) {
+            const job = this.next();
+            if (!job) {
+                return;
+            }
+
+            this.running++;
+            this.runningByAccount.set(job.account, (this.runningByAccount.get(job.account) || 0) + 1);
+
+            Promise.resolve()
+                .then(() => this.run(job))
+                .catch((error) => {
+                    console.error(`Job ${job.id} failed to run:`, error);
+                })
+                .finally(() => {
+                    this.running--;
+                    const remaining = this.runningByAccount.get(job.account) - 1;
+                    if (remaining) {
+                        this.runningByAccount.set(job.account, remaining);
+                    } else {
+                        this.runningByAccount.delete(job.account);
+                    }
+                    this.pump();
+                });
+        }
+    }
+}
+
+module.exports = { JobQueue };
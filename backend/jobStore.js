@@ -0,0 +1,171 @@
+// Job store for repost status tracking
+// Recent jobs live in a bounded in-memory LRU so /api/status stays a Map lookup.
+// Finished jobs are also written to disk, so older jobs can be evicted from memory
+// and still be looked up after a restart.
+const fs = require('fs');
+const path = require('path');
+const { EventEmitter } = require('events');
+
+const MAX_MEMORY_JOBS = parseInt(process.env.JOB_STORE_MAX_JOBS || '200', 10);
+const MAX_LOG_LINES = parseInt(process.env.JOB_LOG_MAX_LINES || '200', 10);
+const MAX_JOB_AGE_MS = parseInt(process.env.JOB_STORE_MAX_AGE_DAYS || '7', 10) * 24 * 60 * 60 * 1000;
+const JOB_STORE_DIR = process.env.JOB_STORE_DIR || path.join(__dirname, 'data', 'jobs');
+
+// On-disk backing store: one JSON file per job
+class FileJobBackend {
+    constructor(dir) {
+        this.dir = dir;
+        fs.mkdirSync(dir, { recursive: true });
+    }
+
+    filePath(jobId) {
+        // Job IDs come from URLs, so only allow safe file name characters
+        return path.join(this.dir, `${String(jobId).replace(/[^\w-]/g, '_')}.json`);
+    }
+
+    async read(jobId) {
+        try {
+            return JSON.parse(await fs.promises.readFile(this.filePath(jobId), 'utf8'));
+        } catch (error) {
+            return null;
+        }
+    }
+
+    async write(jobId, job) {
+        // Write to a temp file and rename so readers never see a half-written job
+        const target = this.filePath(jobId);
+        const tempPath = `${target}.${process.pid}.tmp`;
+        await fs.promises.writeFile(tempPath, JSON.stringify(job));
+        await fs.promises.rename(tempPath, target);
+    }
+
+    // Remove job files older than maxAgeMs
+    async prune(maxAgeMs) {
+        const cutoff = Date.now() - maxAgeMs;
+        const files = await fs.promises.readdir(this.dir);
+        await Promise.all(files.map(async (file) => {
+            const filePath = path.join(this.dir, file);
+            try {
+                const stats = await fs.promises.stat(filePath);
+                if (stats.mtimeMs < cutoff) {
+                    await fs.promises.unlink(filePath);
+                }
+            } catch (error) {
+                // Already gone
+            }
+        }));
+    }
+}
+
+class JobStore {
+    constructor({ maxJobs = MAX_MEMORY_JOBS, maxLogLines = MAX_LOG_LINES, backend = null } = {}) {
+        this.maxJobs = maxJobs;
+        this.maxLogLines = maxLogLines;
+        this.backend = backend;
+        // Map keeps insertion order, so the first entry is always the least recently used
+        this.jobs = new Map();
+        // Jobs whose disk write has not finished yet and so must stay in memory
+        this.writing = new Set();
+        // Per-job change notifications for streaming status clients
+        this.events = new EventEmitter();
+        this.events.setMaxListeners(0);
+    }
+
+    // Listen for changes to one job; returns a function that stops listening
+    subscribe(jobId, listener) {
+        this.events.on(jobId, listener);
+        return () => this.events.removeListener(jobId, listener);
+    }
+
+    // Notify subscribers of a change to a job
+    publish(jobId, delta) {
+        this.events.emit(jobId, delta);
+    }
+
+    create(jobId, job) {
+        this.jobs.set(jobId, job);
+        this.evict();
+        return job;
+    }
+
+    // Look up a job held in memory, marking it as recently used
+    get(jobId) {
+        const job = this.jobs.get(jobId);
+        if (job) {
+            this.jobs.delete(jobId);
+            this.jobs.set(jobId, job);
+        }
+        return job || null;
+    }
+
+    // Look up a job in memory, falling back to the on-disk store
+    async load(jobId) {
+        const job = this.get(jobId);
+        if (job || !this.backend) {
+            return job;
+        }
+        return this.backend.read(jobId);
+    }
+
+    // Append a log line, keeping only the most recent maxLogLines
+    appendLog(jobId, job, line) {
+        this.publish(jobId, { type: 'log', line });
+        job.log.push(line);
+        if (job.log.length > this.maxLogLines) {
+            const dropped = job.log.length - this.maxLogLines;
+            job.log.splice(0, dropped);
+            job.logDropped = (job.logDropped || 0) + dropped;
+        }
+    }
+
+    // Write a job to disk once it has finished
+    persist(jobId) {
+        const job = this.jobs.get(jobId);
+        if (!job || !this.backend) {
+            return Promise.resolve();
+        }
+        this.writing.add(jobId);
+        return this.backend.write(jobId, job).catch((error) => {
+            console.error(`Could not persist job ${jobId}:`, error.message);
+        }).finally(() => {
+            this.writing.delete(jobId);
+            this.evict();
+        });
+    }
+
+    // Drop the least recently used finished jobs once over the memory limit
+    evict() {
+        if (this.jobs.size <= this.maxJobs) {
+            return;
+        }
+        for (const [jobId, job] of this.jobs) {
+            if (this.jobs.size <= this.maxJobs) {
+                break;
+            }
+            // Running jobs stay in memory; finished ones are already on disk
+            if (job.completed && !this.writing.has(jobId)) {
+                this.jobs.delete(jobId);
+            }
+        }
+    }
+}
+
+// Create the store used by the server, with disk spill-over unless JOB_STORE_DIR is 'memory'
+const createJobStore = () => {
+    if (JOB_STORE_DIR === 'memory') {
+        return new JobStore();
+    }
+    let backend;
+    try {
+        backend = new FileJobBackend(JOB_STORE_DIR);
+    } catch (error) {
+        console.error(`Job store directory unavailable, keeping jobs in memory only: ${error.message}`);
+        return new JobStore();
+    }
+    backend.prune(MAX_JOB_AGE_MS).catch((error) => {
+        console.error('Could not prune old jobs:', error.message);
+    });
+    return new JobStore({ backend });
+};
+
+module.exports = { JobStore, FileJobBackend, createJobStore };
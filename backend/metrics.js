@@ -0,0 +1,192 @@
+// Prometheus metrics for repost jobs
+// Phase timings, byte counts and outcomes come from the Python progress events and
+// are kept as counters and histograms labelled by account and source, then served
+// in the Prometheus text format on /metrics. Kept dependency-free on purpose: a few
+// Maps are all the bookkeeping needs.
+
+// Seconds, from a sub-millisecond URL parse up to a slow upload
+const DURATION_BUCKETS = [0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600];
+// Bytes per second, 64 KB/s to 64 MB/s
+const THROUGHPUT_BUCKETS = [65536, 262144, 1048576, 4194304, 16777216, 67108864];
+
+const escapeLabel = (value) => String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n');
+
+const formatLabels = (labels) => {
+    const pairs = Object.entries(labels).map(([name, value]) => `${name}="${escapeLabel(value)}"`);
+    return pairs.length ? `{${pairs.join(',')}}` : '';
+};
+
+// Series are keyed by their label values in labelNames order
+const seriesKey = (labelNames, labels) => labelNames.map((name) => String(labels[name] ?? '')).join('\u0000');
+
+const pickLabels = (labelNames, labels) => Object.fromEntries(labelNames.map((name) => [name, labels[name] ?? '']));
+
+class Counter {
+    constructor(name, help, labelNames = []) {
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.series = new Map();
+    }
+
+    inc(labels = {}, value = 1) {
+        const key = seriesKey(this.labelNames, labels);
+        const series = this.series.get(key);
+        if (series) {
+            series.value += value;
+        } else {
+            this.series.set(key, { labels: pickLabels(this.labelNames, labels), value });
+        }
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} counter`];
+        for (const { labels, value } of this.series.values()) {
+            lines.push(`${this.name}${formatLabels(labels)} ${value}`);
+        }
+        return lines.join('\n');
+    }
+}
+
+class Histogram {
+    constructor(name, help, labelNames = [], buckets = DURATION_BUCKETS) {
+        this.name = name;
+        this.help = help;
+        this.labelNames = labelNames;
+        this.buckets = buckets;
+        this.series = new Map();
+    }
+
+    observe(labels, value) {
+        const key = seriesKey(this.labelNames, labels);
+        let series = this.series.get(key);
+        if (!series) {
+            series = { labels: pickLabels(this.labelNames, labels), counts: this.buckets.map(() => 0), sum: 0, count: 0 };
+            this.series.set(key, series);
+        }
+        // Counts are per bucket here and made cumulative when rendered
+        const index = this.buckets.findIndex((bound) => value <= bound);
+        if (index !== -1) {
+            series.counts[index]++;
+        }
+        series.sum += value;
+        series.count++;
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`];
+        for (const { labels, counts, sum, count } of this.series.values()) {
+            let cumulative = 0;
+            this.buckets.forEach((bound, index) => {
+                cumulative += counts[index];
+                lines.push(`${this.name}_bucket${formatLabels({ ...labels, le: bound })} ${cumulative}`);
+            });
+            lines.push(`${this.name}_bucket${formatLabels({ ...labels, le: '+Inf' })} ${count}`);
+            lines.push(`${this.name}_sum${formatLabels(labels)} ${sum}`);
+            lines.push(`${this.name}_count${formatLabels(labels)} ${count}`);
+        }
+        return lines.join('\n');
+    }
+}
+
+// A value read when metrics are scraped, e.g. the current queue depth
+class Gauge {
+    constructor(name, help, collect) {
+        this.name = name;
+        this.help = help;
+        this.collect = collect;
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} gauge`];
+        for (const [labels, value] of this.collect()) {
+            lines.push(`${this.name}${formatLabels(labels)} ${value}`);
+        }
+        return lines.join('\n');
+    }
+}
+
+class RepostMetrics {
+    constructor() {
+        const labels = ['account', 'source'];
+        this.phaseDuration = new Histogram('repost_phase_duration_seconds',
+            'Time spent in each repost phase', ['phase', ...labels, 'outcome']);
+        this.stepDuration = new Histogram('repost_step_duration_seconds',
+            'Time spent in short steps inside a phase (URL parse, caption build, publish call)', ['step', ...labels]);
+        this.jobDuration = new Histogram('repost_job_duration_seconds',
+            'Time from a job starting to it finishing', [...labels, 'outcome']);
+        this.jobs = new Counter('repost_jobs_total', 'Finished repost jobs', [...labels, 'outcome']);
+        this.phaseFailures = new Counter('repost_phase_failures_total',
+            'Phases that gave up, by error code', ['phase', ...labels, 'error_code']);
+        this.retries = new Counter('repost_phase_retries_total',
+            'Phase attempts that failed and were retried', ['phase', ...labels, 'error_class']);
+        this.downloadBytes = new Counter('repost_download_bytes_total',
+            'Bytes of video downloaded, cached downloads included', [...labels, 'cached']);
+        this.downloadThroughput = new Histogram('repost_download_throughput_bytes_per_second',
+            'Download speed of videos fetched from the network', labels, THROUGHPUT_BUCKETS);
+        this.uploadWait = new Counter('repost_upload_wait_seconds_total',
+            'Seconds spent waiting for an upload slot from the rate limiter', labels);
+        this.gauges = [];
+    }
+
+    // Report a value read at scrape time; collect() returns [labels, value] pairs
+    gauge(name, help, collect) {
+        this.gauges.push(new Gauge(name, help, collect));
+    }
+
+    labelsFor(job) {
+        return { account: job.account || 'default', source: job.source || 'instagram' };
+    }
+
+    // Record one progress event ({ type: 'progress', phase, state, duration_ms, ... }) for a job
+    observeEvent(job, event) {
+        const labels = this.labelsFor(job);
+        const { phase, state } = event;
+
+        if (state === 'retrying') {
+            this.retries.inc({ ...labels, phase, error_class: event.error_class || 'unknown' });
+        } else if (state === 'waiting' && event.delay !== undefined) {
+            this.uploadWait.inc(labels, event.delay);
+        }
+        if (phase === 'job' || (state !== 'completed' && state !== 'failed')) {
+            return;
+        }
+
+        if (event.duration_ms !== undefined) {
+            this.phaseDuration.observe({ ...labels, phase, outcome: state }, event.duration_ms / 1000);
+        }
+        if (state === 'failed') {
+            this.phaseFailures.inc({ ...labels, phase, error_code: event.error_code || 'unknown' });
+        } else if (phase === 'download' && event.bytes !== undefined) {
+            this.downloadBytes.inc({ ...labels, cached: event.cached ? 'true' : 'false' }, event.bytes);
+            if (event.bytes_per_second) {
+                this.downloadThroughput.observe(labels, event.bytes_per_second);
+            }
+        }
+    }
+
+    // Record a timing line ({ type: 'timing', name, duration_ms }) for a job
+    observeTiming(job, timing) {
+        this.stepDuration.observe({ ...this.labelsFor(job), step: timing.name }, timing.duration_ms / 1000);
+    }
+
+    // Record a finished job
+    observeJob(job) {
+        const outcome = job.deferredUntil ? 'deferred' : job.success ? 'completed' : 'failed';
+        const labels = { ...this.labelsFor(job), outcome };
+        this.jobs.inc(labels);
+        if (job.startedAt) {
+            this.jobDuration.observe(labels, (Date.now() - job.startedAt) / 1000);
+        }
+    }
+
+    render() {
+        const metrics = [
+            this.phaseDuration, this.stepDuration, this.jobDuration, this.jobs, this.phaseFailures,
+            this.retries, this.downloadBytes, this.downloadThroughput, this.uploadWait, ...this.gauges
+        ];
+        return metrics.map((metric) => metric.render()).join('\n') + '\n';
+    }
+}
+
+module.exports = { RepostMetrics, Counter, Histogram, Gauge };
@@ -0,0 +1,120 @@
+// Long-lived Python repost workers
+// Keeps `simple_repost_api.py --worker` processes running so that Python startup,
+// the instagrapi/yt_dlp imports and the Instagram login are paid once, not per job.
+// Each worker runs one job at a time; up to PYTHON_WORKER_COUNT workers run side by side.
+// With PYTHON_WORKER_ASYNC=1 the workers run `async_repost.py --worker` instead, and each
+// one drives up to PYTHON_WORKER_JOBS jobs at once on an asyncio event loop.
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+const PYTHON_WORKER_ASYNC = process.env.PYTHON_WORKER_ASYNC === '1';
+const scriptPath = path.join(__dirname, '..', PYTHON_WORKER_ASYNC ? 'async_repost.py' : 'simple_repost_api.py');
+const PYTHON_WORKER_COUNT = parseInt(
+    process.env.PYTHON_WORKER_COUNT || (PYTHON_WORKER_ASYNC ? '1' : process.env.MAX_CONCURRENT_JOBS || '2'),
+    10
+);
+// Jobs sent to one worker before another is started
+const PYTHON_WORKER_JOBS = PYTHON_WORKER_ASYNC
+    ? parseInt(process.env.PYTHON_WORKER_JOBS || process.env.MAX_CONCURRENT_JOBS || '32', 10)
+    : 1;
+
+// Running workers: { proc, handlers } where handlers maps job ID -> callbacks
+const workers = [];
+
+// Start a worker process and route its frames to that worker's job handlers
+const startWorker = () => {
+    console.log('Starting Python repost worker');
+    const args = ['-u', scriptPath, '--worker'];
+    if (PYTHON_WORKER_ASYNC) {
+        args.push('--max-jobs', String(PYTHON_WORKER_JOBS));
+    }
+    const proc = spawn('python', args);
+    const worker = { proc, handlers: new Map() };
+    const lines = readline.createInterface({ input: proc.stdout });
+
+    lines.on('line', (line) => {
+        let frame;
+        try {
+            frame = JSON.parse(line);
+        } catch (error) {
+            console.log(`Python worker: ${line}`);
+            return;
+        }
+
+        if (frame.type === 'ready' || frame.type === 'error') {
+            console.log(`Python worker ${frame.type}${frame.error ? `: ${frame.error}` : ''}`);
+            return;
+        }
+
+        const handler = worker.handlers.get(frame.id);
+        if (!handler) {
+            return;
+        }
+
+        if (frame.type === 'log') {
+            handler.onOutput(frame.line);
+        } else if (frame.type === 'stderr') {
+            handler.onError(frame.line);
+        } else if (frame.type === 'result') {
+            worker.handlers.delete(frame.id);
+            handler.resolve(0);
+        }
+    });
+
+    proc.stdin.on('error', (error) => {
+        console.error('Could not write to Python worker:', error.message);
+    });
+
+    proc.stderr.on('data', (data) => {
+        console.error(`Python worker stderr: ${data.toString().trim()}`);
+    });
+
+    proc.on('close', (code) => {
+        console.log(`Python worker exited with code ${code}`);
+        const index = workers.indexOf(worker);
+        if (index !== -1) {
+            workers.splice(index, 1);
+        }
+        // Fail every job the worker did not finish
+        for (const handler of worker.handlers.values()) {
+            handler.resolve(code || 1);
+        }
+        worker.handlers.clear();
+    });
+
+    proc.on('error', (error) => {
+        console.error('Python worker failed to start:', error);
+    });
+
+    workers.push(worker);
+    return worker;
+};
+
+// Use a worker with a free job slot, start another while under the limit, or queue on the least busy one
+const pickWorker = () => {
+    const available = workers.find((worker) => worker.handlers.size < PYTHON_WORKER_JOBS);
+    if (available) {
+        return available;
+    }
+    if (workers.length < PYTHON_WORKER_COUNT) {
+        return startWorker();
+    }
+    return workers.reduce((least, worker) => (worker.handlers.size < least.handlers.size ? worker : least));
+};
+
+// Send a job to a worker; resolves with an exit-code-like value once the job is done
+const runJob = (jobId, job, { onOutput, onError }) => new Promise((resolve) => {
+    const worker = pickWorker();
+    worker.handlers.set(jobId, { onOutput, onError, resolve });
+    worker.proc.stdin.write(JSON.stringify({ id: jobId, ...job }) + '\n');
+});
+
+// Ask every worker to exit after its current job
+const stopWorker = () => {
+    for (const worker of workers) {
+        worker.proc.stdin.end(JSON.stringify({ type: 'shutdown' }) + '\n');
+    }
+};
+
+module.exports = { runJob, stopWorker, PYTHON_WORKER_COUNT, PYTHON_WORKER_JOBS };
@@ -0,0 +1,363 @@
+// Scheduled posting for repost jobs
+// Pending posts sit in a min-heap ordered by due time, and a single timer is armed
+// for the earliest entry, so tens of thousands of posts cost nothing until one is due.
+// Each post is prefetched (downloaded and validated) a few minutes before its slot.
+// Changes are appended to a journal file that is replayed on start-up, so schedules
+// survive restarts without polling a database.
+const fs = require('fs');
+const path = require('path');
+
+const SCHEDULE_FILE = process.env.SCHEDULE_FILE || path.join(__dirname, 'data', 'schedule.jsonl');
+const SCHEDULE_PREFETCH_LEAD_MS = parseInt(process.env.SCHEDULE_PREFETCH_LEAD_MINUTES || '15', 10) * 60 * 1000;
+const SCHEDULE_MAX_PREFETCHES = parseInt(process.env.SCHEDULE_MAX_PREFETCHES || '2', 10);
+// Wait before offering a due post again when the job queue is full
+const SCHEDULE_RETRY_MS = 30 * 1000;
+// setTimeout overflows past about 24.8 days, so longer waits are armed in steps
+const MAX_TIMER_MS = 2 ** 31 - 1;
+
+// Binary min-heap of timer entries ({ at, seq, id, kind }), earliest first and FIFO on ties
+class TimerHeap {
+    constructor() {
+        this.entries = [];
+    }
+
+    get size() {
+        return this.entries.length;
+    }
+
+    peek() {
+        return this.entries[0] || null;
+    }
+
+    before(a, b) {
+        return a.at < b.at || (a.at === b.at && a.seq < b.seq);
+    }
+
+    push(entry) {
+        const entries = this.entries;
+        entries.push(entry);
+        let index = entries.length - 1;
+        while (index > 0) {
+            const parent = (index - 1) >> 1;
+            if (!this.before(entries[index], entries[parent])) {
+                break;
+            }
+            [entries[index], entries[parent]] = [entries[parent], entries[index]];
+            index = parent;
+        }
+    }
+
+    pop() {
+        const entries = this.entries;
+        const top = entries[0];
+        const last = entries.pop();
+        if (entries.length) {
+            entries[0] = last;
+            let index = 0;
+            for (;;) {
+                const left = 2 * index + 1;
+                const right = left + 1;
+                let smallest = index;
+                if (left < entries.length && this.before(entries[left], entries[smallest])) {
+                    smallest = left;
+                }
+                if (right < entries.length && this.before(entries[right], entries[smallest])) {
+                    smallest = right;
+                }
+                if (smallest === index) {
+                    break;
+                }
+                [entries[index], entries[smallest]] = [entries[smallest], entries[index]];
+                index = smallest;
+            }
+        }
+        return top;
+    }
+}
+
+class PostScheduler {
+    // onDue(post) starts a due post and returns false if it cannot be taken yet;
+    // prefetch(post) must return a promise of { success, errorCode, error }
+    constructor({
+        onDue,
+        prefetch,
+        file = SCHEDULE_FILE,
+        prefetchLeadMs = SCHEDULE_PREFETCH_LEAD_MS,
+        maxPrefetches = SCHEDULE_MAX_PREFETCHES
+    }) {
+        this.onDue = onDue;
+        this.prefetch = prefetch;
+        this.file = file;
+        this.prefetchLeadMs = prefetchLeadMs;
+        this.maxPrefetches = maxPrefetches;
+        // post ID -> post; the heap may still hold entries for removed posts, which are skipped
+        this.posts = new Map();
+        this.heap = new TimerHeap();
+        this.seq = 0;
+        this.timer = null;
+        this.timerAt = null;
+        // In-memory only, so after a restart unfinished prefetches and posts run again
+        this.prefetchRunning = new Set();
+        this.started = new Set();
+        this.prefetchWaiting = [];
+        // Journal writes are chained so they land in order
+        this.writing = Promise.resolve();
+        this.journalLines = 0;
+    }
+
+    // Replay the journal, rewrite it compacted, and arm timers for every pending post
+    load() {
+        let lines = [];
+        try {
+            lines = fs.readFileSync(this.file, 'utf8').split('\n');
+        } catch (error) {
+            if (error.code !== 'ENOENT') {
+                console.error(`Could not read schedule ${this.file}:`, error.message);
+            }
+        }
+
+        for (const line of lines) {
+            if (!line.trim()) {
+                continue;
+            }
+            let entry;
+            try {
+                entry = JSON.parse(line);
+            } catch (error) {
+                // A crash can leave a torn last line; everything before it is still valid
+                continue;
+            }
+            if (entry.op === 'add') {
+                this.posts.set(entry.post.id, entry.post);
+            } else if (entry.op === 'update' && this.posts.has(entry.id)) {
+                Object.assign(this.posts.get(entry.id), entry.fields);
+            } else if (entry.op === 'remove') {
+                this.posts.delete(entry.id);
+            }
+        }
+
+        this.compact();
+        for (const post of this.posts.values()) {
+            this.addTimers(post);
+        }
+        console.log(`Scheduler loaded ${this.posts.size} pending posts`);
+        this.arm();
+    }
+
+    // Schedule a post ({ id, publishAt, videoUrl, ... }); publishAt is epoch milliseconds.
+    // A post that was already prefetched can pass its prefetch result to skip the prefetch.
+    schedule(post) {
+        const scheduled = { ...post, createdAt: Date.now(), prefetch: post.prefetch || null, firedAt: null };
+        this.posts.set(scheduled.id, scheduled);
+        this.append({ op: 'add', post: scheduled });
+        this.addTimers(scheduled);
+        this.arm();
+        return scheduled;
+    }
+
+    // Run a post again at post.publishAt under the same ID, e.g. after its upload was deferred
+    defer(post) {
+        const existing = this.posts.get(post.id);
+        if (!existing) {
+            return this.schedule(post);
+        }
+        this.started.delete(post.id);
+        this.update(existing, { publishAt: post.publishAt, prefetch: post.prefetch || existing.prefetch, firedAt: null });
+        this.addTimers(existing);
+        this.arm();
+        return existing;
+    }
+
+    // Remove a post that has not run yet; returns false if it is unknown or already started
+    cancel(postId) {
+        const post = this.posts.get(postId);
+        if (!post || post.firedAt) {
+            return false;
+        }
+        this.remove(postId);
+        return true;
+    }
+
+    // Forget a post once its repost job has finished
+    complete(postId) {
+        if (this.posts.has(postId)) {
+            this.remove(postId);
+        }
+    }
+
+    get(postId) {
+        return this.posts.get(postId) || null;
+    }
+
+    // Pending posts in publish order
+    list({ offset = 0, limit = 100 } = {}) {
+        return [...this.posts.values()]
+            .sort((a, b) => a.publishAt - b.publishAt)
+            .slice(offset, offset + limit);
+    }
+
+    stats() {
+        const next = this.heap.peek();
+        return {
+            pending: this.posts.size,
+            prefetching: this.prefetchRunning.size,
+            prefetchWaiting: this.prefetchWaiting.length,
+            nextTimerAt: next ? new Date(next.at).toISOString() : null
+        };
+    }
+
+    remove(postId) {
+        this.posts.delete(postId);
+        this.started.delete(postId);
+        this.append({ op: 'remove', id: postId });
+    }
+
+    update(post, fields) {
+        Object.assign(post, fields);
+        this.append({ op: 'update', id: post.id, fields });
+    }
+
+    push(at, id, kind) {
+        this.heap.push({ at, seq: this.seq++, id, kind });
+    }
+
+    addTimers(post) {
+        if (post.firedAt) {
+            // Fired before a restart but never finished; the repost ledger stops double posts
+            this.push(Date.now(), post.id, 'publish');
+            return;
+        }
+        if (!post.prefetch) {
+            this.push(Math.max(Date.now(), post.publishAt - this.prefetchLeadMs), post.id, 'prefetch');
+        }
+        this.push(post.publishAt, post.id, 'publish');
+    }
+
+    // Point the single timer at the earliest entry, unless it already is
+    arm() {
+        const next = this.heap.peek();
+        if (!next) {
+            return;
+        }
+        if (this.timer && this.timerAt <= next.at) {
+            return;
+        }
+        clearTimeout(this.timer);
+        const delay = Math.min(Math.max(0, next.at - Date.now()), MAX_TIMER_MS);
+        this.timerAt = Date.now() + delay;
+        this.timer = setTimeout(() => this.tick(), delay);
+        // A pending schedule alone should not keep the process alive
+        if (this.timer.unref) {
+            this.timer.unref();
+        }
+    }
+
+    // Run every entry that is due, then re-arm for the next one
+    tick() {
+        this.timer = null;
+        this.timerAt = null;
+        const now = Date.now();
+        while (this.heap.size && this.heap.peek().at <= now) {
+            const entry = this.heap.pop();
+            const post = this.posts.get(entry.id);
+            if (!post) {
+                continue;
+            }
+            if (entry.kind === 'prefetch') {
+                this.startPrefetch(post);
+            } else {
+                this.fire(post);
+            }
+        }
+        this.arm();
+    }
+
+    startPrefetch(post) {
+        if (post.prefetch || post.firedAt || this.prefetchRunning.has(post.id)) {
+            return;
+        }
+        if (this.prefetchRunning.size >= this.maxPrefetches) {
+            this.prefetchWaiting.push(post.id);
+            return;
+        }
+
+        this.prefetchRunning.add(post.id);
+        Promise.resolve()
+            .then(() => this.prefetch(post))
+            .catch((error) => ({ success: false, errorCode: 'prefetch_error', error: error.message }))
+            .then((result) => {
+                // The post may have been cancelled or fired while it was prefetching
+                if (this.posts.get(post.id) === post) {
+                    this.update(post, {
+                        prefetch: {
+                            state: result.success ? 'ready' : 'failed',
+                            errorCode: result.errorCode || null,
+                            error: result.error || null,
+                            at: Date.now()
+                        }
+                    });
+                }
+            })
+            .finally(() => {
+                this.prefetchRunning.delete(post.id);
+                while (this.prefetchWaiting.length && this.prefetchRunning.size < this.maxPrefetches) {
+                    const waiting = this.posts.get(this.prefetchWaiting.shift());
+                    if (waiting) {
+                        this.startPrefetch(waiting);
+                    }
+                }
+            });
+    }
+
+    fire(post) {
+        if (this.started.has(post.id)) {
+            return;
+        }
+        let accepted = false;
+        try {
+            accepted = this.onDue(post) !== false;
+        } catch (error) {
+            console.error(`Scheduled post ${post.id} could not be started:`, error);
+        }
+        if (!accepted) {
+            // Backpressure from the job queue: offer the post again shortly
+            this.push(Date.now() + SCHEDULE_RETRY_MS, post.id, 'publish');
+            return;
+        }
+        this.started.add(post.id);
+        if (!post.firedAt) {
+            this.update(post, { firedAt: Date.now() });
+        }
+    }
+
+    append(entry) {
+        this.journalLines++;
+        const line = JSON.stringify(entry) + '\n';
+        this.writing = this.writing
+            .then(() => fs.promises.appendFile(this.file, line))
+            .catch((error) => {
+                console.error('Could not write schedule journal:', error.message);
+            });
+        // Rewrite the journal once it is mostly superseded entries
+        if (this.journalLines > 1000 && this.journalLines > 4 * this.posts.size) {
+            this.writing = this.writing.then(() => this.compact());
+        }
+    }
+
+    // Replace the journal with one add entry per pending post
+    compact() {
+        const lines = [...this.posts.values()].map((post) => JSON.stringify({ op: 'add', post }) + '\n');
+        const tempPath = `${this.file}.${process.pid}.tmp`;
+        try {
+            fs.mkdirSync(path.dirname(this.file), { recursive: true });
+            // Write to a temp file and rename so a crash never leaves a half-written journal
+            fs.writeFileSync(tempPath, lines.join(''));
+            fs.renameSync(tempPath, this.file);
+            this.journalLines = lines.length;
+        } catch (error) {
+            console.error('Could not compact schedule journal:', error.message);
+        }
+    }
+}
+
+module.exports = { PostScheduler, TimerHeap };
@@ -6,8 +6,15 @@ const cors = require('cors');
 const bodyParser = require('body-parser');
 const { spawn } = require('child_process');
 const path = require('path');
+const readline = require('readline');
 const axios = require('axios');
 const fs = require('fs');
+const crypto = require('crypto');
+const { runJob } = require('./pythonWorker');
+const { createJobStore } = require('./jobStore');
+const { JobQueue } = require('./jobQueue');
+const { PostScheduler } = require('./scheduler');
+const { RepostMetrics } = require('./metrics');
 const app = express();
 const PORT = process.env.PORT || 5000;
 
@@ -132,296 +139,489 @@ app.post('/auth/delete-data', (req, res) => {
 });
 
 // Status tracking for repost jobs
-const jobStatus = {};
+const jobStore = createJobStore();
 
-// API endpoint to handle repost requests
-app.post('/api/repost', (req, res) => {
-    const { videoUrl, caption, hashtags, source } = req.body;
+// Phase timings and outcomes, served on /metrics
+const metrics = new RepostMetrics();
+
+// Run jobs through the long-lived Python worker unless legacy per-job spawning is requested
+const PYTHON_WORKER_MODE = process.env.PYTHON_WORKER_MODE || 'worker';
+
+// The Python workers post every job as the one Instagram account configured in simple_repost_api.py,
+// so jobs are queued, limited per account and labelled under that account, never one the client names
+const REPOST_ACCOUNT = process.env.REPOST_ACCOUNT || 'default';
+const REPOST_SOURCES = ['instagram', 'youtube'];
+// Highest priority a request may ask for; with the default of 0 no client can jump the queue
+const MAX_JOB_PRIORITY = parseInt(process.env.MAX_JOB_PRIORITY || '0', 10);
+
+// Check the body of a repost or schedule request; returns { error } or the accepted fields
+const parseRepostRequest = (body) => {
+    const { videoUrl, caption, hashtags } = body;
+    const source = body.source || 'instagram';
+    
+    if (!videoUrl || typeof videoUrl !== 'string') {
+        return { error: 'Video URL is required' };
+    }
+    if (!REPOST_SOURCES.includes(source)) {
+        return { error: `source must be one of: ${REPOST_SOURCES.join(', ')}` };
+    }
+    const priority = Math.min(Math.max(parseInt(body.priority, 10) || 0, 0), MAX_JOB_PRIORITY);
+    return { videoUrl, caption, hashtags, source, account: REPOST_ACCOUNT, priority };
+};
+
+// Phases reported by the Python progress events, in pipeline order
+const PHASES = ['download', 'login', 'upload'];
+
+// Apply one progress event ({ type: 'progress', phase, state, ts, ... }) to a job
+const applyProgressEvent = (job, event) => {
+    const { phase, state } = event;
+    job.steps.push(`${phase}_${state}`);
     
-    if (!videoUrl) {
-        return res.status(400).json({ success: false, error: 'Video URL is required' });
+    if (phase === 'job') {
+        if (job.deferredUntil) {
+            // The job goes back on the schedule instead of ending here
+            return;
+        }
+        job.completed = true;
+        job.success = state === 'completed';
+        job.finishedAt = event.ts;
+        if (!job.success && !job.error) {
+            job.error = event.message || 'Process reported failure';
+            job.errorCode = event.error_code || null;
+        }
+        return;
+    }
+    
+    const phaseStatus = job.phases[phase];
+    if (!phaseStatus) {
+        return;
+    }
+    
+    if (event.bytes !== undefined) {
+        phaseStatus.bytes = event.bytes;
     }
     
-    // Generate a unique job ID
-    const jobId = Date.now().toString();
+    if (state === 'started') {
+        PHASES.forEach((name) => { job.phases[name].current = false; });
+        phaseStatus.started = true;
+        phaseStatus.current = true;
+        phaseStatus.startedAt = event.ts;
+        job.currentStep = phase;
+    } else if (state === 'completed') {
+        phaseStatus.completed = true;
+        phaseStatus.current = false;
+        phaseStatus.completedAt = event.ts;
+    } else if (state === 'failed') {
+        phaseStatus.current = false;
+        phaseStatus.failed = true;
+        job.error = event.message || `${phase} failed`;
+        job.errorCode = event.error_code || null;
+    } else if (state === 'deferred') {
+        // No upload slot is free for the account; the job runs again once one is
+        phaseStatus.current = false;
+        job.deferredUntil = Date.now() + (event.retry_in || 0) * 1000;
+    }
+};
+
+// Push the changed status fields (everything except the log) to streaming clients
+const publishJobUpdate = (jobId, job) => {
+    jobStore.publish(jobId, {
+        type: 'update',
+        phases: job.phases,
+        currentStep: job.currentStep,
+        completed: job.completed,
+        success: job.success,
+        error: job.error,
+        errorCode: job.errorCode,
+        deferredUntil: job.deferredUntil || null
+    });
+};
+
+// Update a job from one line of Python stdout
+const handlePythonOutput = (jobId, line) => {
+    const job = jobStore.get(jobId);
     
+    // Progress events are single-line JSON objects; everything else is plain log text
+    if (line.startsWith('{')) {
+        try {
+            const event = JSON.parse(line);
+            if (event.type === 'progress') {
+                console.log(`Job ${jobId} ${event.phase} ${event.state}`);
+                metrics.observeEvent(job, event);
+                applyProgressEvent(job, event);
+                publishJobUpdate(jobId, job);
+                return;
+            }
+            if (event.type === 'timing') {
+                metrics.observeTiming(job, event);
+                return;
+            }
+        } catch (error) {
+            // Not an event, keep it as a log line
+        }
+    }
+    
+    console.log(`Python stdout: ${line}`);
+    jobStore.appendLog(jobId, job, line);
+};
+
+// Record Python stderr output against a job
+const handlePythonError = (jobId, errorMsg) => {
+    console.error(`Python stderr: ${errorMsg}`);
+    
+    jobStore.appendLog(jobId, jobStore.get(jobId), `ERROR: ${errorMsg}`);
+};
+
+// Settle a job once its Python process or worker job has finished
+const finishJob = (jobId, code) => {
+    const job = jobStore.get(jobId);
+    
+    // 'close' only fires once stdout has ended, and the worker sends its result frame after
+    // every log frame, so all progress events have already been applied at this point
+    if (job.deferredUntil) {
+        job.status = 'deferred';
+    } else if (!job.completed) {
+        settleUnfinishedJob(job, code);
+    }
+    metrics.observeJob(job);
+    
+    publishJobUpdate(jobId, job);
+    if (!job.deferredUntil) {
+        jobStore.publish(jobId, { type: 'done' });
+    }
+    jobStore.persist(jobId);
+};
+
+// Mark a job that ended without a final progress event as failed
+const settleUnfinishedJob = (job, code) => {
+    job.completed = true;
+    job.success = false;
+    
+    if (code !== 0) {
+        job.error = job.error || `Process exited with code ${code}`;
+    } else if (!job.error) {
+        // The job ended without a final event, so report the last phase that was reached
+        const lastStarted = [...PHASES].reverse().find((name) => job.phases[name].started);
+        if (!lastStarted) {
+            job.error = 'Process completed without expected steps';
+        } else if (job.phases[lastStarted].completed) {
+            job.error = `${lastStarted} completed but the job did not finish`;
+        } else {
+            job.error = `${lastStarted} started but didn't complete`;
+        }
+    }
+};
+
+// Run one repost job in Python; resolves once the job has finished
+const runRepostJob = ({ id: jobId, videoUrl, caption, hashtags, source }) => {
+    const job = jobStore.get(jobId);
+    if (job) {
+        job.status = 'processing';
+        job.startedAt = Date.now();
+        publishJobUpdate(jobId, job);
+    }
+    
+    if (PYTHON_WORKER_MODE === 'worker') {
+        // Hand the job to a warm worker instead of starting a new interpreter
+        return runJob(jobId, { url: videoUrl, caption, hashtags, source }, {
+            onOutput: (message) => handlePythonOutput(jobId, message),
+            onError: (message) => handlePythonError(jobId, message)
+        }).then((code) => finishJob(jobId, code));
+    }
+    
+    return new Promise((resolve) => {
+        // Prepare arguments for the Python script
+        const scriptPath = path.join(__dirname, '..', 'simple_repost_api.py');
+        // Hand a job with no free upload slot back to the scheduler instead of sleeping in the queue
+        const args = ['-u', scriptPath, videoUrl, '--defer-uploads'];
+        
+        // Add source parameter
+        if (source) {
+            args.push('--source');
+            args.push(source);
+        }
+        
+        // Add caption and hashtags if provided
+        if (caption) {
+            args.push('--caption');
+            args.push(caption);
+        }
+        
+        if (hashtags) {
+            args.push('--hashtags');
+            args.push(hashtags);
+        }
+        
+        // Execute the Python script
+        console.log(`Running Python with arguments: ${JSON.stringify(args)}`);
+        const pythonProcess = spawn('python', args);
+        
+        // Read stdout line by line so events split across chunks are reassembled
+        readline.createInterface({ input: pythonProcess.stdout }).on('line', (line) => {
+            handlePythonOutput(jobId, line);
+        });
+        
+        // Handle errors from the Python process
+        readline.createInterface({ input: pythonProcess.stderr }).on('line', (line) => {
+            handlePythonError(jobId, line);
+        });
+        
+        // Handle process completion
+        pythonProcess.on('close', (code) => {
+            console.log(`Python process exited with code ${code}`);
+            finishJob(jobId, code);
+            resolve();
+        });
+    });
+};
+
+// Put a job whose upload was deferred back on the schedule for when its slot is free,
+// so it does not hold a queue slot while it waits
+const deferRepostJob = (job, publishAt) => {
+    console.log(`Job ${job.id} deferred until ${new Date(publishAt).toISOString()}`);
+    scheduler.defer({
+        id: job.id,
+        publishAt,
+        videoUrl: job.videoUrl,
+        caption: job.caption,
+        hashtags: job.hashtags,
+        source: job.source || 'instagram',
+        account: REPOST_ACCOUNT,
+        priority: job.priority,
+        // The video was downloaded and checked on this run
+        prefetch: { state: 'ready', errorCode: null, error: null, at: Date.now() }
+    });
+};
+
+// Jobs wait here until the global and per-account concurrency limits allow them to run
+const jobQueue = new JobQueue({
+    run: (job) => runRepostJob(job).then(() => {
+        const status = jobStore.get(job.id);
+        if (status && status.deferredUntil) {
+            deferRepostJob(job, status.deferredUntil);
+        } else if (job.scheduled) {
+            scheduler.complete(job.id);
+        }
+    })
+});
+
+// Create a job's status record and put it in the queue
+const queueRepostJob = (jobId, { videoUrl, caption, hashtags, source, priority = 0, scheduled = false }) => {
     // Set initial status with three distinct phases
-    jobStatus[jobId] = {
-        status: 'processing',
+    const job = jobStore.create(jobId, {
+        status: 'queued',
         steps: [],
         log: [],
         completed: false,
         success: false,
         error: null,
         source: source || 'instagram',
+        account: REPOST_ACCOUNT,
+        priority,
         phases: {
             download: { started: false, completed: false, current: false },
             login: { started: false, completed: false, current: false },
             upload: { started: false, completed: false, current: false }
         }
-    };
+    });
     
-    // Send back the job ID immediately
-    res.json({ success: true, jobId });
-      // Prepare arguments for the Python script
-    const scriptPath = path.join(__dirname, '..', 'simple_repost_api.py');
-    const args = ['-u', scriptPath, videoUrl];
+    jobQueue.enqueue({
+        id: jobId,
+        account: REPOST_ACCOUNT,
+        priority,
+        videoUrl,
+        caption,
+        hashtags,
+        source,
+        scheduled
+    });
+    return job;
+};
+
+// Prefetch errors that mean the post can never succeed, so it fails at its slot without running
+const PREFETCH_FATAL_ERRORS = ['invalid_url', 'duplicate'];
+
+// Start a scheduled post that is due; returns false while the queue is full so it is retried
+const startScheduledPost = (post) => {
+    const { prefetch } = post;
+    if (prefetch && prefetch.state === 'failed' && PREFETCH_FATAL_ERRORS.includes(prefetch.errorCode)) {
+        console.log(`Scheduled post ${post.id} failed validation: ${prefetch.errorCode}`);
+        jobStore.create(post.id, {
+            status: 'failed',
+            steps: [],
+            log: [],
+            completed: true,
+            success: false,
+            error: prefetch.error || 'Video failed validation before its scheduled time',
+            errorCode: prefetch.errorCode,
+            source: post.source || 'instagram',
+            account: REPOST_ACCOUNT,
+            scheduledFor: post.publishAt,
+            phases: {
+                download: { started: false, completed: false, current: false },
+                login: { started: false, completed: false, current: false },
+                upload: { started: false, completed: false, current: false }
+            }
+        });
+        jobStore.persist(post.id);
+        scheduler.complete(post.id);
+        return true;
+    }
     
-    // Add source parameter
-    if (source) {
-        args.push('--source');
-        args.push(source);
+    if (jobQueue.isFull()) {
+        return false;
     }
+    console.log(`Scheduled post ${post.id} is due`);
+    const job = queueRepostJob(post.id, { ...post, scheduled: true });
+    job.scheduledFor = post.publishAt;
+    job.prefetch = prefetch;
+    return true;
+};
+
+// Download and validate a scheduled post's video ahead of its slot
+const prefetchScheduledPost = (post) => new Promise((resolve) => {
+    const outcome = { success: false, errorCode: null, error: null };
     
-    // Add caption and hashtags if provided
-    if (caption) {
-        args.push('--caption');
-        args.push(caption);
+    // Only the final job event matters; the rest is log text
+    const onOutput = (line) => {
+        if (!line.startsWith('{')) {
+            return;
+        }
+        try {
+            const event = JSON.parse(line);
+            if (event.type === 'progress' && event.phase === 'job') {
+                outcome.success = event.state === 'completed';
+                outcome.errorCode = event.error_code || null;
+                outcome.error = event.message || null;
+            }
+        } catch (error) {
+            // Not an event
+        }
+    };
+    const onError = (line) => console.error(`Prefetch ${post.id} stderr: ${line}`);
+    
+    console.log(`Prefetching scheduled post ${post.id}`);
+    if (PYTHON_WORKER_MODE === 'worker') {
+        runJob(`${post.id}-prefetch`, { action: 'prefetch', url: post.videoUrl, source: post.source }, {
+            onOutput,
+            onError
+        }).then(() => resolve(outcome));
+        return;
     }
     
-    if (hashtags) {
-        args.push('--hashtags');
-        args.push(hashtags);
+    const scriptPath = path.join(__dirname, '..', 'simple_repost_api.py');
+    const pythonProcess = spawn('python', ['-u', scriptPath, post.videoUrl, '--prefetch', '--source', post.source || 'instagram']);
+    readline.createInterface({ input: pythonProcess.stdout }).on('line', onOutput);
+    readline.createInterface({ input: pythonProcess.stderr }).on('line', onError);
+    pythonProcess.on('close', () => resolve(outcome));
+    pythonProcess.on('error', (error) => {
+        outcome.error = error.message;
+        resolve(outcome);
+    });
+});
+
+// Posts with a publish-at time wait here, on one timer, until they are due
+const scheduler = new PostScheduler({ onDue: startScheduledPost, prefetch: prefetchScheduledPost });
+scheduler.load();
+
+metrics.gauge('repost_queue_jobs', 'Repost jobs running or waiting in the queue', () => {
+    const { running, queued } = jobQueue.stats();
+    return [[{ state: 'running' }, running], [{ state: 'queued' }, queued]];
+});
+metrics.gauge('repost_scheduled_posts', 'Scheduled posts waiting for their publish time', () => [
+    [{}, scheduler.stats().pending]
+]);
+
+// API endpoint to handle repost requests
+app.post('/api/repost', (req, res) => {
+    const request = parseRepostRequest(req.body);
+    if (request.error) {
+        return res.status(400).json({ success: false, error: request.error });
     }
     
-    // Execute the Python script
-    console.log(`Running Python with arguments: ${JSON.stringify(args)}`);
-    const pythonProcess = spawn('python', args);
+    // Generate a unique job ID (bursts can land in the same millisecond)
+    const jobId = `${Date.now()}-${crypto.randomBytes(3).toString('hex')}`;
     
-    // Set a timeout to ensure process completes even with output buffering
-    let outputBuffer = '';
+    if (jobQueue.isFull()) {
+        // Backpressure: tell the client to retry instead of piling up more work
+        res.set('Retry-After', '30');
+        return res.status(429).json({
+            success: false,
+            error: 'Too many repost jobs are queued, please try again shortly'
+        });
+    }
     
-    // Collect data from stdout
-    pythonProcess.stdout.on('data', (data) => {
-        const message = data.toString().trim();
-        outputBuffer += message + '\n';
-        console.log(`Python stdout: ${message}`);
-        
-        // Update job status with logs
-        jobStatus[jobId].log.push(message);        
-          // Check for explicit step markers first
-        if (message.includes('STEP_MARKER:')) {
-            const step = message.split('STEP_MARKER:')[1].trim().toLowerCase();
-            console.log(`Step marker detected: ${step}`);
-            
-            switch(step) {
-                case 'download_started':
-                    jobStatus[jobId].steps.push('download_started');
-                    jobStatus[jobId].currentStep = 'download';
-                    
-                    // Update phase tracking
-                    jobStatus[jobId].phases.download.started = true;
-                    jobStatus[jobId].phases.download.current = true;
-                    jobStatus[jobId].phases.login.current = false;
-                    jobStatus[jobId].phases.upload.current = false;
-                    break;
-                    
-                case 'download_completed':
-                    jobStatus[jobId].steps.push('download_completed');
-                    
-                    // Update phase tracking
-                    jobStatus[jobId].phases.download.completed = true;
-                    jobStatus[jobId].phases.download.current = false;
-                    break;
-                    
-                case 'login_started':
-                    jobStatus[jobId].steps.push('login_started');
-                    jobStatus[jobId].currentStep = 'login';
-                    
-                    // Update phase tracking
-                    jobStatus[jobId].phases.login.started = true;
-                    jobStatus[jobId].phases.login.current = true;
-                    jobStatus[jobId].phases.download.current = false;
-                    jobStatus[jobId].phases.upload.current = false;
-                    break;
-                    
-                case 'login_completed':
-                    jobStatus[jobId].steps.push('login_completed');
-                    
-                    // Update phase tracking
-                    jobStatus[jobId].phases.login.completed = true;
-                    jobStatus[jobId].phases.login.current = false;
-                    break;
-                    
-                case 'upload_started':
-                    jobStatus[jobId].steps.push('upload_started');
-                    jobStatus[jobId].currentStep = 'upload';
-                    
-                    // Update phase tracking
-                    jobStatus[jobId].phases.upload.started = true;
-                    jobStatus[jobId].phases.upload.current = true;
-                    jobStatus[jobId].phases.download.current = false;
-                    jobStatus[jobId].phases.login.current = false;
-                    break;
-                    
-                case 'upload_completed':
-                    jobStatus[jobId].steps.push('upload_completed');
-                    jobStatus[jobId].completed = true;
-                    jobStatus[jobId].success = true;
-                    
-                    // Update phase tracking
-                    jobStatus[jobId].phases.upload.completed = true;
-                    jobStatus[jobId].phases.upload.current = false;
-                    break;
-                    
-                case 'upload_failed':
-                    jobStatus[jobId].error = "Upload failed";
-                    jobStatus[jobId].completed = true;
-                    jobStatus[jobId].success = false;
-                    
-                    // Update phase tracking
-                    jobStatus[jobId].phases.upload.current = false;
-                    break;
-            }
-        }
-        // Fall back to checking for keyword indicators
-        else if (message.includes('Downloading reel from:')) {
-            if (!jobStatus[jobId].steps.includes('download_started')) {
-                jobStatus[jobId].steps.push('download_started');
-                jobStatus[jobId].currentStep = 'download';
-            }
-        } else if (message.includes('Downloaded video:')) {
-            if (!jobStatus[jobId].steps.includes('download_completed')) {
-                jobStatus[jobId].steps.push('download_completed');
-            }
-        } else if (message.includes('Logging into Instagram')) {
-            if (!jobStatus[jobId].steps.includes('login_started')) {
-                jobStatus[jobId].steps.push('login_started');
-                jobStatus[jobId].currentStep = 'login';
-            }
-        } else if (message.includes('Logged in successfully')) {
-            if (!jobStatus[jobId].steps.includes('login_completed')) {
-                jobStatus[jobId].steps.push('login_completed');
-            }
-        } else if (message.includes('Uploading reel to Instagram')) {
-            if (!jobStatus[jobId].steps.includes('upload_started')) {
-                jobStatus[jobId].steps.push('upload_started');
-                jobStatus[jobId].currentStep = 'upload';
-            }
-        } else if (message.includes('STEP_MARKER: UPLOAD_COMPLETED') || 
-                 message.includes('Reel uploaded successfully') || 
-                 message.includes('Video uploaded successfully') ||
-                 message.includes('Upload successful') ||
-                 message.includes('Upload completed successfully')) {
-            if (!jobStatus[jobId].steps.includes('upload_completed')) {
-                console.log('Upload completed detected in log output: ' + message);
-                jobStatus[jobId].steps.push('upload_completed');
-                jobStatus[jobId].completed = true;
-                jobStatus[jobId].success = true;
-            }
-        } else if (message.includes('Error:') || 
-                 message.includes('Failed to') || 
-                 message.includes('STEP_MARKER: UPLOAD_FAILED') ||
-                 message.includes('Upload failed')) {
-            // Handle errors
-            console.log('Error detected in log output: ' + message);
-            jobStatus[jobId].error = message;
-            if (!jobStatus[jobId].completed) {
-                jobStatus[jobId].completed = true;
-                jobStatus[jobId].success = false;
-            }
-        } else if (message.includes('FINAL_STATUS:')) {
-            // Check for final status marker
-            const status = message.split('FINAL_STATUS:')[1].trim().toLowerCase();
-            if (status === 'success') {
-                console.log('Final success status detected');
-                if (!jobStatus[jobId].steps.includes('upload_completed')) {
-                    jobStatus[jobId].steps.push('upload_completed');
-                }
-                jobStatus[jobId].completed = true;
-                jobStatus[jobId].success = true;
-            } else if (status === 'failed') {
-                console.log('Final failed status detected');
-                jobStatus[jobId].completed = true;
-                jobStatus[jobId].success = false;
-                if (!jobStatus[jobId].error) {
-                    jobStatus[jobId].error = 'Process reported failure';
-                }
-            }
-        }
-    });
+    queueRepostJob(jobId, request);
     
-    // Handle errors from the Python process
-    pythonProcess.stderr.on('data', (data) => {
-        const errorMsg = data.toString().trim();
-        console.error(`Python stderr: ${errorMsg}`);
-        
-        jobStatus[jobId].log.push(`ERROR: ${errorMsg}`);
-        jobStatus[jobId].error = errorMsg;
-    });
+    // Send back the job ID immediately
+    res.json({ success: true, jobId, queuePosition: jobQueue.position(jobId) });
+});
+
+// Prometheus scrape endpoint
+app.get('/metrics', (req, res) => {
+    res.set('Content-Type', 'text/plain; version=0.0.4; charset=utf-8');
+    res.send(metrics.render());
+});
+
+// Queue depth and concurrency, for monitoring
+app.get('/api/queue', (req, res) => {
+    res.json({ success: true, queue: jobQueue.stats() });
+});
+
+// Schedule a repost for later; publishAt is an ISO date or epoch milliseconds
+app.post('/api/schedule', (req, res) => {
+    const request = parseRepostRequest(req.body);
+    const publishAt = typeof req.body.publishAt === 'number' ? req.body.publishAt : Date.parse(req.body.publishAt);
     
-    // Handle process completion
-    pythonProcess.on('close', (code) => {
-        console.log(`Python process exited with code ${code}`);
-        
-        // Add a small delay before processing completion to ensure all stdout has been processed
-        setTimeout(() => {
-            // Only mark as completed if we haven't already done so in the stdout handler
-            if (!jobStatus[jobId].completed) {
-                jobStatus[jobId].completed = true;
-                
-                // Check if we have upload_completed in the steps list
-                const hasUploadCompleted = jobStatus[jobId].steps.includes('upload_completed');
-                
-                if (code !== 0) {
-                    jobStatus[jobId].error = `Process exited with code ${code}`;
-                    jobStatus[jobId].success = false;
-                } else if (!jobStatus[jobId].error) {
-                    // For success code (0), look for success markers in the logs if no explicit upload_completed step
-                    if (!hasUploadCompleted) {
-                        const logs = jobStatus[jobId].log.join('\n').toLowerCase();
-                        
-                        // More comprehensive check for success markers
-                        const successIndicators = [
-                            'upload successful',
-                            'upload completed',
-                            'upload_completed',
-                            'video uploaded successfully',
-                            'reel uploaded successfully',
-                            'step_marker: upload_completed',
-                            'final_status: success',
-                            'downloaded video'
-                        ];
-                        
-                        const hasSuccessIndicator = successIndicators.some(indicator => 
-                            logs.includes(indicator.toLowerCase()));
-                        
-                        if (hasSuccessIndicator) {
-                            console.log('Success indicators found in logs, marking job as successful');
-                            // Add upload_completed step
-                            jobStatus[jobId].steps.push('upload_completed');
-                            jobStatus[jobId].success = true;
-                        } else {
-                            // Track the progress based on available step information
-                            if (jobStatus[jobId].steps.includes('upload_started')) {
-                                jobStatus[jobId].error = "Upload process started but didn't complete";
-                            } else if (jobStatus[jobId].steps.includes('login_completed')) {
-                                jobStatus[jobId].error = "Login successful but upload didn't start";
-                            } else if (jobStatus[jobId].steps.includes('login_started')) {
-                                jobStatus[jobId].error = "Login process started but didn't complete";
-                            } else if (jobStatus[jobId].steps.includes('download_completed')) {
-                                jobStatus[jobId].error = "Download completed but login didn't start";
-                            } else if (jobStatus[jobId].steps.includes('download_started')) {
-                                jobStatus[jobId].error = "Download started but didn't complete";
-                            } else {
-                                jobStatus[jobId].error = "Process completed without expected steps";
-                            }
-                        }
-                    } else {
-                        // We already have upload_completed in steps
-                        jobStatus[jobId].success = true;
-                    }
-                }
-            }
-        }, 100); // 100ms delay to ensure all stdout is processed
-    });
+    if (request.error) {
+        return res.status(400).json({ success: false, error: request.error });
+    }
+    if (!Number.isFinite(publishAt)) {
+        return res.status(400).json({ success: false, error: 'publishAt must be a date or a timestamp in milliseconds' });
+    }
+    
+    const jobId = `${Date.now()}-${crypto.randomBytes(3).toString('hex')}`;
+    scheduler.schedule({ id: jobId, publishAt, ...request });
+    
+    res.json({ success: true, jobId, publishAt: new Date(publishAt).toISOString() });
+});
+
+// Pending scheduled posts in publish order
+app.get('/api/schedule', (req, res) => {
+    const offset = parseInt(req.query.offset, 10) || 0;
+    const limit = Math.min(parseInt(req.query.limit, 10) || 100, 1000);
+    res.json({ success: true, schedule: scheduler.stats(), posts: scheduler.list({ offset, limit }) });
+});
+
+// Cancel a scheduled post that has not started yet
+app.delete('/api/schedule/:jobId', (req, res) => {
+    if (!scheduler.cancel(req.params.jobId)) {
+        return res.status(404).json({ success: false, error: 'Scheduled post not found or already started' });
+    }
+    res.json({ success: true });
+});
+
+// Status record for a post that is still waiting for its publish time
+const scheduledJobStatus = (post) => ({
+    status: 'scheduled',
+    scheduledFor: post.publishAt,
+    prefetch: post.prefetch,
+    completed: false,
+    success: false,
+    error: null,
+    source: post.source,
+    account: REPOST_ACCOUNT
 });
 
 // API endpoint to check job status
-app.get('/api/status/:jobId', (req, res) => {
+app.get('/api/status/:jobId', async (req, res) => {
     const { jobId } = req.params;
     
-    if (!jobStatus[jobId]) {
+    // Running and recent jobs are served from memory; older ones are read back from disk
+    const scheduled = scheduler.get(jobId);
+    const job = await jobStore.load(jobId) || (scheduled && scheduledJobStatus(scheduled));
+    
+    if (!job) {
         return res.status(404).json({ 
             success: false, 
             error: 'Job not found'
@@ -430,10 +630,58 @@ app.get('/api/status/:jobId', (req, res) => {
     
     res.json({
         success: true,
-        jobStatus: jobStatus[jobId]
+        jobStatus: job
     });
 });
 
+// Stream job progress as Server-Sent Events: one snapshot, then only the changes
+app.get('/api/status/:jobId/stream', async (req, res) => {
+    const { jobId } = req.params;
+    const job = await jobStore.load(jobId);
+    
+    if (!job) {
+        return res.status(404).json({
+            success: false,
+            error: 'Job not found'
+        });
+    }
+    
+    res.set({
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no'
+    });
+    res.flushHeaders();
+    
+    const send = (type, data) => {
+        res.write(`event: ${type}\ndata: ${JSON.stringify(data)}\n\n`);
+    };
+    
+    send('snapshot', job);
+    if (job.completed) {
+        send('done', {});
+        return res.end();
+    }
+    
+    // Comment lines keep proxies from closing an idle stream
+    const heartbeat = setInterval(() => res.write(': ping\n\n'), 15000);
+    const unsubscribe = jobStore.subscribe(jobId, (delta) => {
+        const { type, ...data } = delta;
+        send(type, data);
+        if (type === 'done') {
+            stop();
+            res.end();
+        }
+    });
+    const stop = () => {
+        clearInterval(heartbeat);
+        unsubscribe();
+    };
+    
+    req.on('close', stop);
+});
+
 // Import OAuth handler
 const { saveOAuthToken, getOAuthToken } = require('./oauthHandler');
 
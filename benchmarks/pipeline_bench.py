@@ -0,0 +1,615 @@
+"""
+End-to-end repost benchmark against local stand-ins
+Runs the repost pipeline against the stand-in media and Instagram servers in
+stand_ins.py, so no network or real account is needed. It reports throughput,
+latency percentiles, per-phase timings and memory, and can compare a run against
+an earlier one to catch regressions.
+
+    sync    simple_repost_api.repost_video on a thread pool
+    async   async_repost.repost_video on one event loop
+    graph   instagram_graph_api.upload_media (the Graph API publish flow)
+    server  backend/server.js: jobs posted to /api/repost and run by the Python workers
+
+    python benchmarks/pipeline_bench.py --mode sync --jobs 40 --concurrency 4 --latency 0.05
+    python benchmarks/pipeline_bench.py --mode server --jobs 100 --json server.json
+    python benchmarks/pipeline_bench.py --mode sync --baseline sync.json
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import functools
+import tempfile
+import threading
+import contextvars
+import subprocess
+import tracemalloc
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+import stand_ins  # noqa: E402
+
+ACCOUNT_ID = "17841400000000000"
+PHASES = ["download", "transcode", "login", "upload"]
+
+# --- Per-job output capture ---
+
+current_job = contextvars.ContextVar("current_job", default=None)
+
+class JobRecorder:
+    """Collects one job's progress events; log text is dropped."""
+
+    def __init__(self, index):
+        self.index = index
+        self.buffer = ""
+        self.phases = {}
+        self.steps = {}
+        self.outcome = None
+        self.error_code = None
+        self.error_message = None
+        self.last_line = ""
+        self.submitted = None
+        self.started = None
+        self.finished = None
+        self.memory_peak = None
+
+    def write(self, text):
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.record(line.strip())
+
+    def record(self, line):
+        if not line:
+            return
+        if not line.startswith("{"):
+            self.last_line = line
+            return
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        if event.get("type") == "timing":
+            self.steps[event["name"]] = event["duration_ms"]
+        elif event.get("type") == "progress":
+            if event["phase"] == "job":
+                self.outcome = event["state"]
+                self.error_code = event.get("error_code")
+                self.error_message = event.get("message")
+            elif "duration_ms" in event:
+                self.phases[event["phase"]] = event["duration_ms"]
+
+class RoutedOutput(io.TextIOBase):
+    """Sends writes to the current job's recorder, and anything else nowhere."""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        recorder = current_job.get()
+        if recorder is not None:
+            recorder.write(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+# --- Memory ---
+
+def rss_bytes(pid="self"):
+    """Resident memory of a process from /proc, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+def process_tree(pid):
+    """The process and all its descendants (Linux only)."""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children", "r") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+class MemorySampler:
+    """Samples the RSS of a process tree in the background and keeps the peak."""
+
+    def __init__(self, pid=None, interval=0.02):
+        self.pid = pid
+        self.interval = interval
+        self.baseline = self.sample()
+        self.peak = self.baseline
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        pids = process_tree(self.pid) if self.pid else ["self"]
+        sizes = [rss_bytes(pid) for pid in pids]
+        sizes = [size for size in sizes if size is not None]
+        return sum(sizes) if sizes else None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            size = self.sample()
+            if size is not None and (self.peak is None or size > self.peak):
+                self.peak = size
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+# --- Job sources ---
+
+def job_urls(args, run_tag, count, first_video=0, videos=None):
+    """One source URL per job; job i uses video first_video + i % videos, with IDs unique to this run."""
+    urls = []
+    for index in range(count):
+        video = first_video + index % (videos or count)
+        source = args.source if args.source != "mixed" else ("instagram", "youtube")[index % 2]
+        if source == "youtube":
+            urls.append((f"https://www.youtube.com/shorts/{('Y' + run_tag + format(video, '05d'))[:11]}", source))
+        else:
+            urls.append((f"https://www.instagram.com/reel/B{run_tag}{video:05d}/", source))
+    return urls
+
+# --- In-process modes ---
+
+def run_sync(args, urls):
+    import simple_repost_api
+
+    def run_job(index):
+        url, source = urls[index]
+        recorder = JobRecorder(index)
+        current_job.set(recorder)
+        recorder.started = time.perf_counter()
+        try:
+            simple_repost_api.repost_video(url, f"Benchmark job {index}", None, source)
+        finally:
+            recorder.finished = time.perf_counter()
+            current_job.set(None)
+        return recorder
+
+    if args.trace_memory and args.concurrency == 1:
+        recorders = []
+        for index in range(len(urls)):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            recorder = run_job(index)
+            recorder.memory_peak = tracemalloc.get_traced_memory()[1] - before
+            recorders.append(recorder)
+        return recorders
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(run_job, range(len(urls))))
+
+def run_async(args, urls):
+    import async_repost
+
+    async def run_all():
+        limit = asyncio.Semaphore(args.concurrency)
+
+        async def run_job(index):
+            url, source = urls[index]
+            async with limit:
+                recorder = JobRecorder(index)
+                current_job.set(recorder)
+                recorder.started = time.perf_counter()
+                try:
+                    await async_repost.repost_video(url, f"Benchmark job {index}", None, source)
+                finally:
+                    recorder.finished = time.perf_counter()
+            return recorder
+
+        return await asyncio.gather(*(run_job(index) for index in range(len(urls))))
+
+    return asyncio.run(run_all())
+
+def run_graph(args, urls, samples):
+    import instagram_graph_api
+
+    def run_job(index):
+        recorder = JobRecorder(index)
+        current_job.set(recorder)
+        recorder.started = time.perf_counter()
+        try:
+            published = instagram_graph_api.upload_media(
+                ACCOUNT_ID, samples[index % len(samples)], f"Benchmark job {index}", "stand-in-token")
+            recorder.outcome = "completed" if published else "failed"
+            recorder.error_code = None if published else "graph_upload_failed"
+        finally:
+            recorder.finished = time.perf_counter()
+            current_job.set(None)
+        return recorder
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(run_job, range(len(urls))))
+
+# --- Server mode ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def http_json(url, body=None, timeout=30):
+    """GET or POST JSON; returns (status, data, headers)."""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"{}"), response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}"), e.headers
+
+def scrape_phase_totals(base):
+    """Summed phase durations (seconds) and counts from the backend's /metrics output."""
+    with urllib.request.urlopen(f"{base}/metrics", timeout=10) as response:
+        text = response.read().decode("utf-8")
+    totals = {}
+    pattern = re.compile(r'^repost_phase_duration_seconds_(sum|count)\{phase="(\w+)".*?\} ([\d.e+-]+)$')
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if match:
+            kind, phase, value = match.groups()
+            phase_totals = totals.setdefault(phase, {"sum": 0.0, "count": 0.0})
+            phase_totals[kind] += float(value)
+    return totals
+
+def submit_and_wait(base, urls):
+    """Post one repost job per URL to the backend and wait for all of them to finish."""
+    recorders = [JobRecorder(index) for index in range(len(urls))]
+    job_ids = {}
+    # perf_counter has no fixed epoch, so keep the offset to the wall clock the backend reports in
+    clock_offset = time.time() - time.perf_counter()
+
+    for index, (url, source) in enumerate(urls):
+        while True:
+            status, data, headers = http_json(f"{base}/api/repost", {
+                "videoUrl": url, "source": source, "caption": f"Benchmark job {index}"})
+            if status != 429:
+                break
+            # Queue full: back off as the API asks
+            time.sleep(min(float(headers.get("Retry-After") or 1), 0.25))
+        recorders[index].submitted = recorders[index].started = time.perf_counter()
+        if status == 200:
+            job_ids[data["jobId"]] = recorders[index]
+        else:
+            recorders[index].outcome = "failed"
+            recorders[index].error_code = f"http_{status}"
+            recorders[index].error_message = data.get("error")
+            recorders[index].finished = recorders[index].started
+
+    pending = dict(job_ids)
+    while pending:
+        for job_id, recorder in list(pending.items()):
+            status, data, _ = http_json(f"{base}/api/status/{job_id}")
+            job = data.get("jobStatus") or {}
+            if not job.get("completed"):
+                continue
+            recorder.outcome = "completed" if job.get("success") else "failed"
+            recorder.error_code = job.get("errorCode")
+            recorder.error_message = job.get("error")
+            # Use the backend's own timestamps: latency counts from when a worker took the job,
+            # as in the in-process modes, and polling adds no delay
+            if job.get("startedAt"):
+                recorder.started = job["startedAt"] / 1000 - clock_offset
+            finished_at = job.get("finishedAt")
+            recorder.finished = finished_at - clock_offset if finished_at else time.perf_counter()
+            del pending[job_id]
+        time.sleep(0.05)
+    return recorders
+
+def run_server(args, urls, warmup, env, workdir):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    pythonpath = os.pathsep.join(filter(None, [os.path.join(BENCH_DIR, "site"), BENCH_DIR, REPO_ROOT,
+                                                os.environ.get("PYTHONPATH")]))
+    server_env = dict(env, PORT=str(port), PYTHONPATH=pythonpath,
+                      JOB_STORE_DIR=os.path.join(workdir, "jobs"),
+                      SCHEDULE_FILE=os.path.join(workdir, "schedule.jsonl"),
+                      MAX_CONCURRENT_JOBS=str(args.concurrency),
+                      MAX_JOBS_PER_ACCOUNT=str(args.concurrency),
+                      MAX_QUEUE_DEPTH=str(max(100, args.jobs)))
+    log = open(os.path.join(workdir, "server.log"), "w")
+    server = subprocess.Popen(["node", os.path.join(REPO_ROOT, "backend", "server.js")], cwd=workdir,
+                              env=server_env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if http_json(f"{base}/api/test", timeout=2)[0] == 200:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError(f"Backend did not start, see {log.name}")
+            time.sleep(0.1)
+
+        # Warm-up jobs start the Python workers and log in before anything is measured
+        submit_and_wait(base, warmup)
+        before = scrape_phase_totals(base)
+        sampler = MemorySampler(server.pid).start()
+        started = time.perf_counter()
+        recorders = submit_and_wait(base, urls)
+        wall = time.perf_counter() - started
+        sampler.stop()
+
+        # Only the histograms are exported, so phases get a mean rather than percentiles
+        phase_means = {}
+        for phase, totals in scrape_phase_totals(base).items():
+            previous = before.get(phase, {"sum": 0.0, "count": 0.0})
+            count = totals["count"] - previous["count"]
+            if count:
+                phase_means[phase] = {"count": int(count),
+                                      "mean_ms": (totals["sum"] - previous["sum"]) / count * 1000}
+        return recorders, sampler, phase_means, wall
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+
+# --- Reporting ---
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def summarize(args, recorders, wall, sampler, phase_means=None, trace_peak=None):
+    latencies = [(r.finished - r.started) * 1000 for r in recorders if r.started is not None and r.finished]
+    succeeded = sum(1 for r in recorders if r.outcome == "completed")
+    errors = {}
+    for r in recorders:
+        if r.outcome != "completed":
+            code = r.error_code or "unknown"
+            entry = errors.setdefault(code, {"count": 0, "example": r.error_message or r.last_line})
+            entry["count"] += 1
+
+    phases = {}
+    for name in PHASES + ["parse", "caption", "publish"]:
+        values = [r.phases[name] for r in recorders if name in r.phases]
+        values += [r.steps[name] for r in recorders if name in r.steps]
+        if values:
+            phases[name] = {"count": len(values), "p50_ms": percentile(values, 0.5),
+                            "p99_ms": percentile(values, 0.99), "mean_ms": sum(values) / len(values)}
+    queued = [(r.started - r.submitted) * 1000 for r in recorders if r.submitted is not None]
+    if queued:
+        phases["queue"] = {"count": len(queued), "p50_ms": percentile(queued, 0.5),
+                           "p99_ms": percentile(queued, 0.99), "mean_ms": sum(queued) / len(queued)}
+    for name, stats in (phase_means or {}).items():
+        phases.setdefault(name, stats)
+
+    memory = {"baseline_bytes": sampler.baseline, "peak_bytes": sampler.peak}
+    if sampler.baseline is not None and sampler.peak is not None:
+        in_flight = max(1, min(args.concurrency, len(recorders)))
+        memory["per_in_flight_job_bytes"] = (sampler.peak - sampler.baseline) / in_flight
+    job_peaks = [r.memory_peak for r in recorders if r.memory_peak is not None]
+    if job_peaks:
+        memory["python_peak_per_job_bytes"] = {"p50": percentile(job_peaks, 0.5), "max": max(job_peaks)}
+    elif trace_peak is not None:
+        memory["python_peak_bytes"] = trace_peak
+
+    return {
+        "mode": args.mode,
+        "config": {"jobs": args.jobs, "videos": args.videos, "concurrency": args.concurrency,
+                   "source": args.source, "downloader": args.downloader,
+                   "media_latency": args.media_latency, "instagram_latency": args.instagram_latency,
+                   "error_rate": args.error_rate, "error_status": args.error_status},
+        "jobs": len(recorders),
+        "succeeded": succeeded,
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_jobs_per_second": len(recorders) / wall if wall else None,
+        "latency_ms": {"p50": percentile(latencies, 0.5), "p90": percentile(latencies, 0.9),
+                       "p99": percentile(latencies, 0.99), "max": max(latencies) if latencies else None,
+                       "mean": sum(latencies) / len(latencies) if latencies else None},
+        "phases": phases,
+        "memory": memory,
+    }
+
+def megabytes(value):
+    return f"{value / (1024 * 1024):.1f} MB" if value is not None else "n/a"
+
+def milliseconds(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+def print_report(result, servers):
+    config = result["config"]
+    print(f"mode={result['mode']} jobs={result['jobs']} videos={config['videos']} "
+          f"concurrency={config['concurrency']} source={config['source']} "
+          f"latency={config['media_latency']}s/{config['instagram_latency']}s error_rate={config['error_rate']}")
+    print(f"succeeded {result['succeeded']}/{result['jobs']} in {result['wall_seconds']:.2f}s "
+          f"-> {result['throughput_jobs_per_second']:.2f} jobs/s")
+    if result["errors"]:
+        for code, entry in sorted(result["errors"].items()):
+            print(f"failed: {code} x{entry['count']}" + (f" ({entry['example']})" if entry["example"] else ""))
+
+    latency = result["latency_ms"]
+    print(f"{'latency ms':<14}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    print(f"{'job':<14}{milliseconds(latency['p50']):>10}{milliseconds(latency['p90']):>10}"
+          f"{milliseconds(latency['p99']):>10}{milliseconds(latency['max']):>10}")
+    if result["phases"]:
+        print(f"{'phase':<14}{'count':>10}{'p50':>10}{'p99':>10}{'mean':>10}")
+        for name, stats in result["phases"].items():
+            print(f"{name:<14}{stats['count']:>10}{milliseconds(stats.get('p50_ms')):>10}"
+                  f"{milliseconds(stats.get('p99_ms')):>10}{milliseconds(stats.get('mean_ms')):>10}")
+
+    memory = result["memory"]
+    line = f"memory: baseline {megabytes(memory['baseline_bytes'])}, peak {megabytes(memory['peak_bytes'])}"
+    if "per_in_flight_job_bytes" in memory:
+        line += f", {megabytes(memory['per_in_flight_job_bytes'])} per in-flight job"
+    if "python_peak_per_job_bytes" in memory:
+        line += f", Python heap peak per job p50 {megabytes(memory['python_peak_per_job_bytes']['p50'])}"
+    elif "python_peak_bytes" in memory:
+        line += f", Python heap peak {megabytes(memory['python_peak_bytes'])}"
+    print(line)
+    print("stand-ins (warm-up included): " + ", ".join(f"{name} {server.requests} requests ({server.errors} errors)"
+                                   for name, server in servers.items()))
+
+def compare(result, baseline, tolerance):
+    """Print the change against a baseline run; returns True if anything regressed past the tolerance."""
+    if baseline.get("mode") != result["mode"]:
+        print(f"Baseline is a {baseline.get('mode')} run, not {result['mode']}; skipping comparison")
+        return False
+    checks = [
+        ("throughput", result["throughput_jobs_per_second"], baseline.get("throughput_jobs_per_second"), -1),
+        ("latency p50", result["latency_ms"]["p50"], baseline.get("latency_ms", {}).get("p50"), 1),
+        ("latency p99", result["latency_ms"]["p99"], baseline.get("latency_ms", {}).get("p99"), 1),
+    ]
+    regressed = False
+    for name, current, previous, worse_when in checks:
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        flag = ""
+        if change * worse_when > tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{name:<14}{previous:>12.2f} -> {current:<12.2f}{change:+.1%}{flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the repost pipeline against local stand-ins")
+    parser.add_argument("--mode", choices=["sync", "async", "graph", "server"], default="sync")
+    parser.add_argument("--jobs", type=int, default=20, help="Reposts to run")
+    parser.add_argument("--videos", type=int, help="Distinct videos (defaults to one per job; fewer exercises the cache)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs in flight at once")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured jobs run first (worker start-up, login)")
+    parser.add_argument("--source", choices=["instagram", "youtube", "mixed"], default="instagram")
+    parser.add_argument("--downloader", choices=["yt-dlp", "http"], default="yt-dlp",
+                        help="Download through yt-dlp (if installed) or plain urllib")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every stand-in request")
+    parser.add_argument("--media-latency", type=float, help="Override --latency for the media server")
+    parser.add_argument("--instagram-latency", type=float, help="Override --latency for the Instagram server")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stand-in requests that fail")
+    parser.add_argument("--error-status", type=int, default=503,
+                        help="Status of injected errors; 429 exercises the rate-limit backoff")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for injected errors")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Track Python heap use with tracemalloc (per job when --concurrency 1)")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare against results written earlier with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary working folder")
+    args = parser.parse_args()
+    args.videos = max(1, args.videos or args.jobs)
+    args.concurrency = max(1, args.concurrency)
+    args.media_latency = args.latency if args.media_latency is None else args.media_latency
+    args.instagram_latency = args.latency if args.instagram_latency is None else args.instagram_latency
+    # The run changes directory below, so resolve the result files against the caller's
+    args.json = os.path.abspath(args.json) if args.json else None
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    servers = {
+        "media": stand_ins.MediaServer(latency=args.media_latency, error_rate=args.error_rate,
+                                       error_status=args.error_status, seed=args.seed),
+        "instagram": stand_ins.InstagramServer(latency=args.instagram_latency, error_rate=args.error_rate,
+                                               error_status=args.error_status, seed=args.seed + 1),
+    }
+    for server in servers.values():
+        server.start()
+
+    # Caches, the ledger, sessions and the rate limiter all live in a throwaway folder
+    workdir = tempfile.mkdtemp(prefix="repost_bench_")
+    env = dict(os.environ,
+               STAND_IN_MEDIA_URL=servers["media"].url,
+               STAND_IN_INSTAGRAM_URL=servers["instagram"].url,
+               STAND_IN_DOWNLOADER=args.downloader,
+               REPOST_LEDGER_PATH=os.path.join(workdir, "reposts.sqlite3"),
+               UPLOAD_LIMITER_PATH=os.path.join(workdir, "upload_limits.sqlite3"),
+               UPLOADS_PER_HOUR="1000000000", UPLOADS_PER_DAY="1000000000", UPLOAD_BURST="1000000000")
+    if args.videos < args.jobs:
+        # Repeated videos would be rejected as duplicates; they are here to measure the download cache
+        env["REPOST_LEDGER"] = "0"
+    os.environ.update(env)
+    os.chdir(workdir)
+
+    run_tag = format(int(time.time()) % 100000, "05d")
+    urls = job_urls(args, run_tag, args.jobs, videos=args.videos)
+    warmup = job_urls(args, run_tag, args.warmup, first_video=args.videos)
+    real_stdout, real_stderr = sys.stdout, sys.stderr
+    phase_means = None
+    trace_peak = None
+    try:
+        if args.mode == "server":
+            recorders, sampler, phase_means, wall = run_server(args, urls, warmup, env, workdir)
+        else:
+            stand_ins.install(servers["media"].url, servers["instagram"].url, args.downloader)
+            # Import everything before measuring so module start-up is not counted
+            import simple_repost_api  # noqa: F401
+            if args.mode == "async":
+                import async_repost  # noqa: F401
+            if args.mode == "graph":
+                import instagram_graph_api  # noqa: F401
+            if args.mode == "graph":
+                run = functools.partial(run_graph, samples=servers["media"].samples)
+            else:
+                run = {"sync": run_sync, "async": run_async}[args.mode]
+            sys.stdout = sys.stderr = RoutedOutput()
+            sampler = None
+            try:
+                # Warm-up jobs load yt-dlp's extractors and log in before anything is measured
+                run(args, warmup)
+                if args.trace_memory:
+                    tracemalloc.start()
+                sampler = MemorySampler().start()
+                started = time.perf_counter()
+                recorders = run(args, urls)
+                wall = time.perf_counter() - started
+            finally:
+                sys.stdout, sys.stderr = real_stdout, real_stderr
+                if sampler:
+                    sampler.stop()
+            if args.trace_memory:
+                trace_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    finally:
+        for server in servers.values():
+            server.stop()
+        os.chdir(REPO_ROOT)
+        if args.keep:
+            print(f"Working folder kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = summarize(args, recorders, wall, sampler, phase_means, trace_peak)
+    print_report(result, servers)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
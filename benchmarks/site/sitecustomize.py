@@ -0,0 +1,14 @@
+"""
+Routes backend-spawned Python workers to the benchmark stand-ins
+pipeline_bench.py --mode server puts this folder on PYTHONPATH, so every Python
+process the backend starts calls stand_ins.install_from_env() before running.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import stand_ins  # noqa: E402
+
+stand_ins.install_from_env()
@@ -0,0 +1,425 @@
+"""
+Local stand-ins for YouTube, Instagram and the Graph API
+Two small HTTP servers let the repost pipeline run end to end without the network:
+
+- MediaServer serves the sample MP4s in backend/downloaded_reels/ as plain HTTP
+  downloads (with Range support), so yt-dlp's generic extractor can fetch them.
+  Every video ID maps to one of the samples.
+- InstagramServer answers the private API calls made by StandInClient and the
+  Graph API publish flow (container, resumable upload, status, publish, quota).
+
+Both take a latency (seconds added to every request), an error rate (share of
+requests that fail) and the status those failures get: 503 by default, which the
+pipeline retries quickly, or 429, which sends it into its long rate-limit backoff. install() routes yt-dlp, the instagrapi client
+pool and the Graph API session to them; install_from_env() does the same inside
+worker processes started by the backend (see benchmarks/site/sitecustomize.py).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import types
+import random
+import hashlib
+import itertools
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SAMPLE_FOLDER = os.path.join(REPO_ROOT, "backend", "downloaded_reels")
+STREAM_CHUNK = 256 * 1024
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server with injected latency and errors."""
+
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0.0, error_rate=0.0, error_status=503, seed=1, port=0):
+        super().__init__(("127.0.0.1", port), handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def should_fail(self):
+        with self.random_lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def handle_error(self, request, client_address):
+        # Clients going away mid-request (a worker being stopped) is normal here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        """Read and discard the request body; returns its size."""
+        remaining = int(self.headers.get("Content-Length") or 0)
+        size = 0
+        while remaining:
+            chunk = self.rfile.read(min(remaining, STREAM_CHUNK))
+            if not chunk:
+                break
+            size += len(chunk)
+            remaining -= len(chunk)
+        return size
+
+    def injected_failure(self):
+        """Apply the configured latency, then answer with an error if this request is unlucky."""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.server.should_fail():
+            return False
+        self.read_body()
+        self.send_json({"message": "Please wait a few minutes before you try again.", "status": "fail"},
+                       self.server.error_status)
+        return True
+
+class MediaHandler(StandInHandler):
+    """Serves /media/<video_id>.mp4 from the sample videos."""
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def serve(self, send_body):
+        match = re.match(r"^/media/([\w-]+)\.mp4$", self.path.split("?", 1)[0])
+        if not match:
+            self.send_json({"error": "not found"}, 404)
+            return
+        if self.injected_failure():
+            return
+
+        path = self.server.sample_for(match.group(1))
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        range_match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if range_match:
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or end), end)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not send_body:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                chunk = f.read(min(remaining, STREAM_CHUNK))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+class MediaServer(StandInServer):
+    """yt-dlp-compatible media host backed by the sample MP4s."""
+
+    def __init__(self, sample_folder=SAMPLE_FOLDER, **kwargs):
+        super().__init__(MediaHandler, **kwargs)
+        self.samples = sorted(
+            os.path.join(sample_folder, name) for name in os.listdir(sample_folder) if name.endswith(".mp4")
+        )
+        if not self.samples:
+            raise FileNotFoundError(f"No sample MP4s in {sample_folder}")
+
+    def sample_for(self, video_id):
+        """Map any video ID to a sample, the same one every time."""
+        digest = hashlib.sha1(video_id.encode("utf-8")).digest()
+        return self.samples[int.from_bytes(digest[:4], "big") % len(self.samples)]
+
+class InstagramHandler(StandInHandler):
+    """Private API calls from StandInClient plus the Graph API publish flow."""
+
+    def do_GET(self):
+        if self.injected_failure():
+            return
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/content_publishing_limit"):
+            quota = {"quota_total": self.server.quota_total, "quota_duration": 86400}
+            self.send_json({"data": [{"quota_usage": 0, "config": quota}]})
+        elif re.match(r"^/v[\d.]+/[\w-]+$", path):
+            # Container status: processing is instant here
+            self.send_json({"status_code": "FINISHED", "status": "Finished: Media has been uploaded",
+                            "video_status": {"uploading_phase": {"bytes_transferred": 0}}})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.injected_failure():
+            return
+        path = self.path.split("?", 1)[0]
+        size = self.read_body()
+        server = self.server
+
+        if path == "/api/v1/accounts/login/":
+            self.send_json({"logged_in_user": {"pk": 1, "username": "stand_in"}, "status": "ok"})
+        elif path.startswith("/rupload_igvideo/") or path.startswith("/rupload_igphoto/"):
+            server.uploaded_bytes += size
+            self.send_json({"upload_id": path.rsplit("/", 1)[-1], "status": "ok"})
+        elif path.startswith("/api/v1/media/configure"):
+            self.send_json({"media": {"pk": next(server.media_ids), "code": "standin"}, "status": "ok"})
+        elif path.startswith("/ig-api-upload/"):
+            server.uploaded_bytes += size
+            self.send_json({"success": True})
+        elif path.endswith("/media_publish"):
+            self.send_json({"id": str(next(server.media_ids))})
+        elif path.endswith("/media"):
+            container_id = str(next(server.media_ids))
+            self.send_json({"id": container_id, "uri": f"{server.url}/ig-api-upload/v18.0/{container_id}"})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+class InstagramServer(StandInServer):
+    """Stand-in for the Instagram private API and the Graph API."""
+
+    def __init__(self, **kwargs):
+        super().__init__(InstagramHandler, **kwargs)
+        self.media_ids = itertools.count(17900000000000000)
+        self.uploaded_bytes = 0
+        # Benchmarks measure the pipeline, not Instagram's real limit of 25 posts a day
+        self.quota_total = 1000000
+
+# --- Client side ---
+
+# Named like the instagrapi and yt-dlp exceptions so retry.classify_error treats them the same
+class PleaseWaitFewMinutes(Exception):
+    pass
+
+class LoginRequired(Exception):
+    pass
+
+class ClientConnectionError(Exception):
+    pass
+
+def _post(url, data, content_type="application/octet-stream"):
+    request = urllib.request.Request(url, data=data, method="POST", headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        if e.code == 429:
+            raise PleaseWaitFewMinutes(f"{e.code} Please wait a few minutes before you try again.") from e
+        if e.code in (401, 403):
+            raise LoginRequired(f"{e.code} login required") from e
+        raise ClientConnectionError(f"{e.code} {e.reason}") from e
+    except (urllib.error.URLError, OSError) as e:
+        raise ClientConnectionError(str(e)) from e
+
+class StandInClient:
+    """instagrapi.Client stand-in that logs in and uploads to InstagramServer.
+
+    Uploads really send the video bytes over HTTP, so upload cost scales with file
+    size as it does against Instagram.
+    """
+
+    base_url = None
+
+    def __init__(self):
+        self.settings = {"uuids": {"phone_id": "stand-in"}}
+        self.logged_in = False
+        # Like instagrapi's requests session, so response hooks see the video upload
+        self.private = types.SimpleNamespace(hooks={"response": []})
+
+    def load_settings(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            self.settings = json.load(f)
+        return self.settings
+
+    def get_settings(self):
+        return self.settings
+
+    def set_settings(self, settings):
+        self.settings = settings
+        return True
+
+    def dump_settings(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.settings, f)
+        return True
+
+    def login(self, username, password, relogin=False):
+        _post(f"{self.base_url}/api/v1/accounts/login/",
+              json.dumps({"username": username}).encode("utf-8"), "application/json")
+        self.logged_in = True
+        return True
+
+    def _upload(self, path, caption, configure, thumbnail=None):
+        upload_id = str(int(time.time() * 1000))
+        rupload_url = f"{self.base_url}/rupload_igvideo/{upload_id}"
+        with open(path, "rb") as f:
+            _post(rupload_url, f.read())
+        response = types.SimpleNamespace(url=rupload_url, ok=True, request=types.SimpleNamespace(method="POST"))
+        for hook in self.private.hooks["response"]:
+            hook(response)
+        if thumbnail and os.path.exists(str(thumbnail)):
+            with open(thumbnail, "rb") as f:
+                _post(f"{self.base_url}/rupload_igphoto/{upload_id}", f.read())
+        result = _post(f"{self.base_url}/api/v1/media/{configure}/",
+                       json.dumps({"upload_id": upload_id, "caption": caption}).encode("utf-8"),
+                       "application/json")
+        return types.SimpleNamespace(pk=result["media"]["pk"], code=result["media"]["code"])
+
+    def clip_upload(self, path, caption="", thumbnail=None, **kwargs):
+        return self._upload(path, caption, "configure_to_clips", thumbnail)
+
+    def video_upload(self, path, caption="", thumbnail=None, **kwargs):
+        return self._upload(path, caption, "configure", thumbnail)
+
+class RoutedYoutubeDL:
+    """yt_dlp.YoutubeDL stand-in that fetches every video from MediaServer.
+
+    With a real yt-dlp available (and downloader "yt-dlp") the download is handed to
+    it with the URL rewritten to the media server, so its extractor and HTTP
+    downloader are part of what is measured. Otherwise the file is streamed with urllib.
+    """
+
+    media_url = None
+    real_youtube_dl = None
+
+    def __init__(self, opts=None):
+        self.opts = dict(opts or {})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def local_url(self, url):
+        from url_normalizer import extract_video_id
+        return f"{self.media_url}/media/{extract_video_id(url)}.mp4"
+
+    def download(self, urls):
+        local_urls = [self.local_url(url) for url in urls]
+        if self.real_youtube_dl:
+            opts = dict(self.opts, quiet=True, no_warnings=True, noprogress=True)
+            # The samples are plain progressive MP4s; format selectors written for Instagram may not match
+            opts["format"] = "best"
+            with self.real_youtube_dl(opts) as ydl:
+                return ydl.download(local_urls)
+
+        output = self.opts["outtmpl"]
+        for url in local_urls:
+            try:
+                with urllib.request.urlopen(url, timeout=60) as response, open(output, "wb") as f:
+                    while True:
+                        chunk = response.read(STREAM_CHUNK)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+            except urllib.error.HTTPError as e:
+                raise ClientConnectionError(f"HTTP Error {e.code}: {e.reason}") from e
+            except (urllib.error.URLError, OSError) as e:
+                raise ClientConnectionError(str(e)) from e
+        return 0
+
+class RoutedSession:
+    """Wraps the Graph API session and sends graph/rupload.facebook.com calls to InstagramServer."""
+
+    HOSTS = re.compile(r"^https://(?:graph|rupload)\.facebook\.com")
+
+    def __init__(self, session, base_url):
+        self.session = session
+        self.base_url = base_url
+
+    def request(self, method, url, **kwargs):
+        url = self.HOSTS.sub(self.base_url, url)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+def install(media_url, instagram_url, downloader="yt-dlp"):
+    """Route yt-dlp, instagrapi and the Graph API session to the stand-in servers.
+
+    Call before the repost modules are imported, or after; both work. Replacing the
+    yt_dlp module in sys.modules also covers scripts run as __main__.
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    RoutedYoutubeDL.media_url = media_url
+    if downloader == "yt-dlp":
+        try:
+            import yt_dlp
+            RoutedYoutubeDL.real_youtube_dl = yt_dlp.YoutubeDL
+        except ImportError:
+            print("yt-dlp is not installed, downloading with urllib", file=sys.stderr)
+    sys.modules["yt_dlp"] = types.SimpleNamespace(YoutubeDL=RoutedYoutubeDL)
+    if "simple_repost_api" in sys.modules:
+        sys.modules["simple_repost_api"].yt_dlp = sys.modules["yt_dlp"]
+
+    StandInClient.base_url = instagram_url
+    import instagram_client_pool
+    instagram_client_pool.Client = StandInClient
+
+    try:
+        import graph_http
+        import instagram_graph_api
+    except ImportError:
+        # The Graph API path needs requests; the instagrapi path does not
+        return
+    session = RoutedSession(graph_http.get_session(), instagram_url)
+    instagram_graph_api.get_session = lambda: session
+    instagram_graph_api.RUPLOAD_URL = f"{instagram_url}/ig-api-upload"
+
+def install_from_env():
+    """install() using STAND_IN_MEDIA_URL and STAND_IN_INSTAGRAM_URL, if they are set."""
+    media_url = os.environ.get("STAND_IN_MEDIA_URL")
+    instagram_url = os.environ.get("STAND_IN_INSTAGRAM_URL")
+    if media_url and instagram_url:
+        install(media_url, instagram_url, os.environ.get("STAND_IN_DOWNLOADER", "yt-dlp"))
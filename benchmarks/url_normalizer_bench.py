@@ -0,0 +1,132 @@
+"""
+Micro-benchmark and fuzz check for url_normalizer
+Checks every URL in url_corpus.jsonl against its expected (source, id, canonical), fuzzes
+mutated copies of the corpus to make sure the normalizer never raises and keeps
+keys stable under tracking parameters, then times it against the old split-based
+extract_video_id.
+
+    python benchmarks/url_normalizer_bench.py --fuzz 20000 --repeat 5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from url_normalizer import normalize_url, extract_video_id  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "url_corpus.jsonl")
+ID_CHARACTERS = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-")
+NOISE = "/?&=#.%:-_ abcXYZ019"
+SUFFIXES = ["?igsh=abc123", "?si=XyZ", "&utm_source=share", "#t=10", "/", "?feature=share"]
+
+def legacy_extract_video_id(url):
+    """The chained-split extractor url_normalizer replaced, kept for comparison."""
+    video_id = None
+    if "instagram.com/reel/" in url:
+        video_id = url.split("/reel/")[1].split("/")[0].split("?")[0]
+    elif "instagram.com/p/" in url:
+        video_id = url.split("/p/")[1].split("/")[0].split("?")[0]
+    elif "youtube.com/shorts/" in url:
+        video_id = url.split("/shorts/")[1].split("?")[0]
+    elif "youtu.be/" in url:
+        video_id = url.split("youtu.be/")[1].split("?")[0]
+    return video_id or "video_" + str(int(time.time()))
+
+def load_corpus():
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def check_corpus(corpus):
+    """Return the number of corpus entries whose key does not match the expectation."""
+    failures = 0
+    for case in corpus:
+        key = normalize_url(case["url"])
+        got = (key.source, key.video_id, key.canonical) if key else (None, None, True)
+        expected = (case["source"], case["id"], case.get("canonical", True))
+        if got != expected:
+            print(f"MISMATCH {case['url']!r}: expected {expected}, got {got}")
+            failures += 1
+    return failures
+
+def mutate(url, rng):
+    """Apply one random edit: insert, delete or replace a character, or flip the case."""
+    if not url:
+        return rng.choice(NOISE)
+    position = rng.randrange(len(url))
+    action = rng.randrange(4)
+    if action == 0:
+        return url[:position] + rng.choice(NOISE) + url[position:]
+    if action == 1:
+        return url[:position] + url[position + 1:]
+    if action == 2:
+        return url[:position] + rng.choice(NOISE) + url[position + 1:]
+    return url.swapcase()
+
+def fuzz(corpus, iterations, seed):
+    """Return the number of fuzz cases that raised, produced a bad ID or changed key."""
+    rng = random.Random(seed)
+    failures = 0
+    for _ in range(iterations):
+        case = rng.choice(corpus)
+        url = case["url"]
+        for _ in range(rng.randint(1, 4)):
+            url = mutate(url, rng)
+        try:
+            key = normalize_url(url)
+            fallback = extract_video_id(url)
+        except Exception as e:
+            print(f"RAISED on {url!r}: {e}")
+            failures += 1
+            continue
+        if key and not set(key.video_id) <= ID_CHARACTERS:
+            print(f"BAD ID {key.video_id!r} from {url!r}")
+            failures += 1
+        if fallback != extract_video_id(url):
+            print(f"UNSTABLE fallback ID for {url!r}")
+            failures += 1
+
+        # Tracking parameters and fragments must never change a recognised key
+        if case["source"]:
+            suffixed = case["url"].strip().rstrip("/") + "/" + rng.choice(SUFFIXES)
+            suffixed_key = normalize_url(suffixed)
+            if suffixed_key and suffixed_key[:2] != (case["source"], case["id"]):
+                print(f"KEY CHANGED for {suffixed!r}: {suffixed_key}")
+                failures += 1
+    return failures
+
+def bench(corpus, repeat):
+    urls = [case["url"] for case in corpus]
+    number = 2000
+
+    def run(func):
+        best = min(timeit.repeat(lambda: [func(url) for url in urls], number=number, repeat=repeat))
+        return best / (number * len(urls)) * 1e9
+
+    def cold_normalize(url):
+        return normalize_url.__wrapped__(url)
+
+    print(f"{'extractor':<32}{'ns/url':>10}")
+    print(f"{'legacy split':<32}{run(legacy_extract_video_id):>10.0f}")
+    print(f"{'normalize_url (uncached)':<32}{run(cold_normalize):>10.0f}")
+    print(f"{'normalize_url (cached)':<32}{run(normalize_url):>10.0f}")
+    print(f"{'extract_video_id (cached)':<32}{run(extract_video_id):>10.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and benchmark url_normalizer")
+    parser.add_argument("--fuzz", type=int, default=20000, help="Number of mutated URLs to try")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the fuzzer")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    failures = check_corpus(corpus)
+    print(f"Corpus: {len(corpus)} URLs, {failures} mismatches")
+    fuzz_failures = fuzz(corpus, args.fuzz, args.seed)
+    print(f"Fuzz: {args.fuzz} mutated URLs, {fuzz_failures} failures")
+    bench(corpus, args.repeat)
+    sys.exit(1 if failures or fuzz_failures else 0)
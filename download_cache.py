@@ -0,0 +1,232 @@
+"""
+Download cache for the repost tool
+Keeps yt-dlp downloads keyed by video ID plus a hash of the format selection,
+so reposting the same source again (e.g. to another account) skips the network.
+Entries are checked against their recorded size and SHA-256 before reuse and
+evicted least-recently-used once the cache grows past its size or age limits.
+The index lives in SQLite, so every worker process sees the others' entries
+and eviction accounts for all of them.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: downloads are only single-flight within one process
+    fcntl = None
+
+CACHE_FOLDER = os.path.join("downloaded_reels", "cache")
+CACHE_MAX_BYTES = int(os.environ.get("DOWNLOAD_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))  # 2 GB
+CACHE_MAX_AGE = int(os.environ.get("DOWNLOAD_CACHE_MAX_AGE", 7 * 24 * 60 * 60))  # 7 days
+INDEX_FILE = "index.sqlite3"
+LEGACY_INDEX_FILE = "index.json"
+# Cross-process download locks are striped over a fixed set of files, so none ever has to be deleted
+LOCK_STRIPES = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hash a file in chunks so large videos are not read into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(video_id, format_selector):
+    """Build the cache key for a video ID downloaded with a given yt-dlp format."""
+    format_hash = hashlib.sha1(format_selector.encode("utf-8")).hexdigest()[:10]
+    return f"{video_id}-{format_hash}"
+
+class DownloadCache:
+    """Content-checked LRU cache of downloaded videos."""
+
+    def __init__(self, folder=CACHE_FOLDER, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._connection = None
+        # cache key -> [lock, number of threads using it]
+        self._download_locks = {}
+
+    @property
+    def index_path(self):
+        return os.path.join(self.folder, INDEX_FILE)
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(self.folder, exist_ok=True)
+            # Autocommit mode, so BEGIN IMMEDIATE below controls the transactions
+            connection = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._import_legacy_index(connection)
+            self._connection = connection
+        return self._connection
+
+    def _import_legacy_index(self, connection):
+        """Adopt the entries of an index.json written by earlier versions, then remove it."""
+        legacy_path = os.path.join(self.folder, LEGACY_INDEX_FILE)
+        if not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, "r") as f:
+                entries = json.load(f)
+            connection.executemany(
+                "INSERT OR IGNORE INTO entries (key, file, size, sha256, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, entry["file"], entry["size"], entry["sha256"], entry["created"], entry["last_used"])
+                 for key, entry in entries.items()],
+            )
+            os.remove(legacy_path)
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"Ignoring unreadable download cache index: {e}")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Run a block as one write transaction, so worker processes never interleave updates."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _remove(self, connection, key, file_name):
+        connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        path = os.path.join(self.folder, file_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _lock_path(self, key):
+        stripe = int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % LOCK_STRIPES
+        return os.path.join(self.folder, "locks", f"{stripe:03d}.lock")
+
+    @contextlib.contextmanager
+    def download_lock(self, video_id, format_selector):
+        """Hold while downloading a video, so each one is fetched once at a time.
+
+        Threads in this process wait on a lock per cache key, and other worker
+        processes wait on an flock of the key's lock file.
+        """
+        key = cache_key(video_id, format_selector)
+        with self._lock:
+            entry = self._download_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                if fcntl is None:
+                    yield
+                    return
+                lock_path = self._lock_path(key)
+                os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+                with open(lock_path, "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._download_locks[key]
+
+    def _is_valid(self, file_name, size, sha256, created, now):
+        path = os.path.join(self.folder, file_name)
+        if now - created > self.max_age:
+            return False
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return False
+        return file_sha256(path) == sha256
+
+    def contains(self, path):
+        """Return True if the path points at a file owned by the cache."""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.folder)
+
+    def get(self, video_id, format_selector):
+        """Return the cached path for a download, or None on a miss."""
+        key = cache_key(video_id, format_selector)
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT file, size, sha256, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+
+        # Hash outside the transaction so other processes are not blocked while a large file is read
+        file_name, size, sha256, created = row
+        now = time.time()
+        valid = self._is_valid(file_name, size, sha256, created, now)
+        with self._transaction() as connection:
+            # Only touch the entry if nobody replaced it in the meantime
+            current = connection.execute(
+                "SELECT sha256 FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if not current or current[0] != sha256:
+                return None
+            if not valid:
+                print(f"Discarding stale or corrupt cache entry: {key}")
+                self._remove(connection, key, file_name)
+                return None
+            connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+        return os.path.join(self.folder, file_name)
+
+    def put(self, video_id, format_selector, source_path):
+        """Move a finished download into the cache and return its new path."""
+        key = cache_key(video_id, format_selector)
+        file_name = f"{key}{os.path.splitext(source_path)[1] or '.mp4'}"
+        cached_path = os.path.join(self.folder, file_name)
+        size = os.path.getsize(source_path)
+        sha256 = file_sha256(source_path)
+
+        with self._transaction() as connection:
+            os.replace(source_path, cached_path)
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, file, size, sha256, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, file_name, size, sha256, now, now),
+            )
+            self._evict(connection, now, keep=key)
+        return cached_path
+
+    def _evict(self, connection, now, keep=None):
+        """Drop expired entries, then least recently used ones until under the size limit."""
+        expired = connection.execute(
+            "SELECT key, file FROM entries WHERE created < ? AND key != ?", (now - self.max_age, keep)
+        ).fetchall()
+        for key, file_name in expired:
+            self._remove(connection, key, file_name)
+
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, file_name, size in connection.execute(
+            "SELECT key, file, size FROM entries WHERE key != ? ORDER BY last_used", (keep,)
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            total -= size
+            self._remove(connection, key, file_name)
+
+# Shared cache used by the repost scripts
+download_cache = DownloadCache()
@@ -0,0 +1,76 @@
+"""
+Shared HTTP client for Instagram Graph API calls
+Every Graph API request goes through one pooled session with keep-alive,
+default timeouts and a retry policy, so multi-step publish flows reuse the
+same TLS connections instead of opening a new one per call.
+Set GRAPH_HTTP2=1 to use httpx over HTTP/2 when httpx and h2 are installed.
+"""
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+except ImportError:
+    httpx = None
+
+# Connection pool and retry settings
+POOL_CONNECTIONS = int(os.environ.get("GRAPH_HTTP_POOL_CONNECTIONS", 10))  # Hosts kept in the pool
+POOL_MAXSIZE = int(os.environ.get("GRAPH_HTTP_POOL_MAXSIZE", 20))         # Connections per host
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+USE_HTTP2 = os.environ.get("GRAPH_HTTP2", "") == "1"
+
+# Exceptions raised by whichever client is in use
+HTTP_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+class TimeoutSession(requests.Session):
+    """requests.Session that applies a default timeout to every request."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+def build_session():
+    """Create a pooled keep-alive session with retries for idempotent requests."""
+    if USE_HTTP2 and httpx:
+        # With a custom transport, httpx.Client ignores its own http2= and limits=
+        limits = httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE)
+        transport = httpx.HTTPTransport(http2=True, limits=limits, retries=RETRY_TOTAL)
+        return httpx.Client(
+            transport=transport,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+
+    # Only GETs are retried automatically; a retried POST could publish twice
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = TimeoutSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the shared session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
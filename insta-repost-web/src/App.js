@@ -151,42 +151,99 @@ function App() {
   // Monitor job status
   useEffect(() => {
     if (!jobId) return;
-      const statusInterval = setInterval(async () => {
-      try {
-        const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5000';
-        const response = await axios.get(`${apiUrl}/api/status/${jobId}`);
-        const data = response.data;
+    
+    const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5000';
+    let statusInterval = null;
+    let eventSource = null;
+    let finished = false;
+    
+    // Shared handling for a finished job, whichever way its status arrived
+    const handleCompletion = (status) => {
+      if (finished) return;
+      finished = true;
+      setIsSubmitting(false);
+      
+      // Show success notification
+      if (status.success) {
+        setOpenSnackbar(true);
         
-        if (data.success) {
-          setJobStatus(data.jobStatus);
+        // Start cooldown timer if successful
+        setCooldownActive(true);
+        setCooldownRemaining(60);
+      }
+    };
+    
+    // Fallback: poll the full status every second
+    const startPolling = () => {
+      statusInterval = setInterval(async () => {
+        try {
+          const response = await axios.get(`${apiUrl}/api/status/${jobId}`);
+          const data = response.data;
           
-          // Stop polling if job is completed
-          if (data.jobStatus.completed) {
-            clearInterval(statusInterval);
-            setIsSubmitting(false);
+          if (data.success) {
+            setJobStatus(data.jobStatus);
             
-            // Show success notification
-            if (data.jobStatus.success) {
-              setOpenSnackbar(true);
-              
-              // Start cooldown timer if successful
-              setCooldownActive(true);
-              setCooldownRemaining(60);
+            // Stop polling if job is completed
+            if (data.jobStatus.completed) {
+              clearInterval(statusInterval);
+              handleCompletion(data.jobStatus);
             }
+          } else {
+            setError(data.error || 'Failed to check job status');
+            clearInterval(statusInterval);
+            setIsSubmitting(false);
           }
-        } else {
-          setError(data.error || 'Failed to check job status');
+        } catch (err) {
+          setError('Server error while checking status');
           clearInterval(statusInterval);
           setIsSubmitting(false);
         }
-      } catch (err) {
-        setError('Server error while checking status');
-        clearInterval(statusInterval);
-        setIsSubmitting(false);
-      }
-    }, 1000); // Poll every second
+      }, 1000); // Poll every second
+    };
     
-    return () => clearInterval(statusInterval);
+    if (window.EventSource) {
+      // Preferred: the server pushes a snapshot and then only the changes
+      eventSource = new EventSource(`${apiUrl}/api/status/${jobId}/stream`);
+      let latestStatus = null;
+      
+      eventSource.addEventListener('snapshot', (e) => {
+        latestStatus = JSON.parse(e.data);
+        setJobStatus(latestStatus);
+      });
+      
+      eventSource.addEventListener('update', (e) => {
+        latestStatus = { ...latestStatus, ...JSON.parse(e.data) };
+        setJobStatus(latestStatus);
+      });
+      
+      eventSource.addEventListener('log', (e) => {
+        const { line } = JSON.parse(e.data);
+        latestStatus = { ...latestStatus, log: [...(latestStatus?.log || []), line] };
+      });
+      
+      eventSource.addEventListener('done', () => {
+        eventSource.close();
+        if (latestStatus) {
+          setJobStatus(latestStatus);
+          handleCompletion(latestStatus);
+        }
+      });
+      
+      eventSource.onerror = () => {
+        // Stream unavailable or dropped: fall back to polling
+        eventSource.close();
+        if (!finished) {
+          startPolling();
+        }
+      };
+    } else {
+      startPolling();
+    }
+    
+    return () => {
+      if (eventSource) eventSource.close();
+      if (statusInterval) clearInterval(statusInterval);
+    };
   }, [jobId]);
   
   // Handle form submission
@@ -0,0 +1,102 @@
+"""
+Instagram client pool for the repost tool
+Keeps one authenticated instagrapi Client per account so repeated jobs reuse the
+same session instead of logging in again. Sessions are only re-validated when a
+call actually fails with an auth error.
+"""
+
+import os
+import json
+import tempfile
+import threading
+from instagrapi import Client
+from instagrapi.exceptions import LoginRequired, ClientUnauthorizedError
+
+# Errors that mean the cached session is no longer accepted
+AUTH_ERRORS = (LoginRequired, ClientUnauthorizedError)
+
+def save_session_atomically(client, session_file):
+    """Write the client settings to a temp file and move it into place."""
+    directory = os.path.dirname(os.path.abspath(session_file))
+    fd, temp_path = tempfile.mkstemp(prefix=".session_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(client.get_settings(), f, indent=4)
+        os.replace(temp_path, session_file)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class ClientPool:
+    """Caches logged-in instagrapi clients per account."""
+
+    def __init__(self, session_dir="."):
+        self.session_dir = session_dir
+        self._clients = {}
+        self._account_locks = {}
+        self._call_locks = {}
+        self._lock = threading.Lock()
+
+    def session_file(self, username):
+        return os.path.join(self.session_dir, f"{username}_session.json")
+
+    def _account_lock(self, username):
+        with self._lock:
+            return self._account_locks.setdefault(username, threading.Lock())
+
+    def _call_lock(self, username):
+        with self._lock:
+            return self._call_locks.setdefault(username, threading.Lock())
+
+    def is_cached(self, username):
+        return username in self._clients
+
+    def get(self, username, password):
+        """Return a cached client for the account, logging in only if there is none."""
+        with self._account_lock(username):
+            client = self._clients.get(username)
+            if client is None:
+                client = self._login(username, password)
+                self._clients[username] = client
+            return client
+
+    def call(self, username, password, action):
+        """Run action(client), logging in again once if the session was rejected.
+
+        An instagrapi Client is not thread-safe, so calls on one account run one at a time.
+        """
+        with self._call_lock(username):
+            client = self.get(username, password)
+            try:
+                return action(client)
+            except AUTH_ERRORS:
+                print(f"Session for {username} was rejected, logging in again")
+                with self._account_lock(username):
+                    # relogin=True makes instagrapi drop the stale session but keep the device settings
+                    client.login(username, password, relogin=True)
+                    save_session_atomically(client, self.session_file(username))
+                    self._clients[username] = client
+                return action(client)
+
+    def _login(self, username, password):
+        """Log in, reusing the saved session file when there is one."""
+        client = Client()
+        session_file = self.session_file(username)
+
+        if os.path.exists(session_file):
+            try:
+                # With saved settings loaded, login() reuses the session instead of a fresh login
+                client.load_settings(session_file)
+                client.login(username, password)
+                return client
+            except Exception as e:
+                print(f"Could not use saved session: {str(e).encode('ascii', 'replace').decode('ascii')}")
+                client = Client()
+
+        client.login(username, password)
+        save_session_atomically(client, session_file)
+        return client
+
+# Shared pool used by the repost scripts
+client_pool = ClientPool()
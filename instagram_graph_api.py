@@ -4,10 +4,16 @@ This module provides functions to authenticate and post content using Instagram
 """
 
 import os
-import requests
+import time
+import random
 import json
+import hashlib
+import tempfile
+import threading
 import webbrowser
 from urllib.parse import urlencode
+from graph_http import get_session, HTTP_ERRORS
+from upload_rate_limiter import upload_rate_limiter, UploadQuotaExceeded
 
 # Configuration - Values from Meta Developer Dashboard
 APP_ID = "1842291649888953"
@@ -15,6 +21,27 @@ APP_SECRET = "4315cb405ae229639ec08"
 REDIRECT_URI = "https://insta-reposter32.vercel.app/auth/callback"
 GRAPH_API_VERSION = "v18.0"  # Update to the latest version
 TOKEN_FILE = "instagram_token.json"
+RUPLOAD_URL = "https://rupload.facebook.com/ig-api-upload"
+
+# Upload and publishing settings
+REQUEST_TIMEOUT = 60                # Seconds per HTTP request
+UPLOAD_CHUNK_SIZE = int(os.environ.get("GRAPH_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))  # 8 MB
+CHUNK_MAX_RETRIES = 5               # Consecutive failures allowed per chunk
+POLL_INITIAL_DELAY = 2              # Seconds before the first container status re-check
+POLL_MAX_DELAY = 30                 # Longest wait between status checks
+CONTAINER_MAX_WAIT = 600            # Total seconds to wait for processing before giving up
+
+# Account discovery settings
+ACCOUNTS_PAGE_SIZE = 100            # Facebook Pages fetched per request
+ACCOUNTS_CACHE_TTL = 300            # Seconds to reuse a discovered account list
+
+# Token lifetime settings
+TOKEN_REFRESH_MARGIN = 7 * 24 * 60 * 60   # Refresh long-lived tokens a week before they expire
+TOKEN_REFRESH_RETRY = 60 * 60             # Seconds before retrying a failed refresh
+TOKEN_DEFAULT_LIFETIME = 60 * 24 * 60 * 60  # Assumed for tokens returned without expires_in (long-lived: 60 days)
+
+# Discovered accounts per token hash: {hash: (fetched_at, accounts)}
+_accounts_cache = {}
 
 # Permission scopes needed
 SCOPES = [
@@ -46,6 +73,35 @@ def open_auth_page():
     webbrowser.open(auth_url)
     print("Please authorize the application and copy the code from the redirect URL")
 
+def stamp_expiry(token_data):
+    """Record when a token expires, from its expires_in or the usual long-lived lifetime."""
+    if token_data and token_data.get("access_token"):
+        lifetime = int(token_data.get("expires_in") or TOKEN_DEFAULT_LIFETIME)
+        token_data["expires_at"] = int(time.time()) + lifetime
+    return token_data
+
+def exchange_for_long_lived_token(access_token):
+    """Exchange a short-lived or long-lived token for a new long-lived one."""
+    long_lived_token_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/oauth/access_token"
+    long_lived_params = {
+        "grant_type": "fb_exchange_token",
+        "client_id": APP_ID,
+        "client_secret": APP_SECRET,
+        "fb_exchange_token": access_token
+    }
+    
+    try:
+        long_lived_response = get_session().get(long_lived_token_url, params=long_lived_params)
+    except HTTP_ERRORS as e:
+        print(f"Error getting long-lived token: {e}")
+        return None
+    
+    if long_lived_response.status_code != 200:
+        print(f"Error getting long-lived token: {long_lived_response.text}")
+        return None
+    
+    return stamp_expiry(long_lived_response.json())
+
 def exchange_code_for_token(auth_code):
     """Exchange the auth code for a long-lived access token."""
     token_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/oauth/access_token"
@@ -57,123 +113,443 @@ def exchange_code_for_token(auth_code):
         "code": auth_code
     }
     
-    response = requests.get(token_url, params=params)
+    response = get_session().get(token_url, params=params)
     
     if response.status_code != 200:
         print(f"Error getting access token: {response.text}")
         return None
         
-    token_data = response.json()
+    token_data = stamp_expiry(response.json())
     
     # Exchange for long-lived token
-    long_lived_token_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/oauth/access_token"
-    long_lived_params = {
-        "grant_type": "fb_exchange_token",
-        "client_id": APP_ID,
-        "client_secret": APP_SECRET,
-        "fb_exchange_token": token_data.get("access_token")
-    }
-    
-    long_lived_response = requests.get(long_lived_token_url, params=long_lived_params)
-    
-    if long_lived_response.status_code != 200:
-        print(f"Error getting long-lived token: {long_lived_response.text}")
+    long_lived_data = exchange_for_long_lived_token(token_data.get("access_token"))
+    return long_lived_data or token_data
+
+class TokenManager:
+    """In-memory and on-disk cache of the Graph API token with expiry tracking.
+
+    A token whose expires_at is further away than the refresh margin is used
+    without a validation request. Tokens close to expiry, or saved before expiry
+    was tracked, are refreshed, and a background timer refreshes the token ahead
+    of time while the process keeps running.
+    """
+
+    def __init__(self, token_file=TOKEN_FILE, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.token_file = token_file
+        self.refresh_margin = refresh_margin
+        self._lock = threading.RLock()
+        self._token_data = None
+        self._mtime = None
+        self._timer = None
+        # expires_at of the token the running timer was armed for
+        self._timer_expires_at = None
+        self._retry_at = 0
+
+    def load(self):
+        """Return the stored token data, re-reading the file only if it changed."""
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.token_file)
+            except OSError:
+                return self._token_data
+            if self._token_data is None or mtime != self._mtime:
+                try:
+                    with open(self.token_file, 'r') as f:
+                        self._token_data = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Ignoring unreadable token file: {e}")
+                    self._token_data = None
+                self._mtime = mtime
+            return self._token_data
+
+    def save(self, token_data):
+        """Write the token data to a temp file, move it into place and cache it."""
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.token_file))
+            fd, temp_path = tempfile.mkstemp(prefix=".token_", suffix=".json", dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(token_data, f)
+                os.replace(temp_path, self.token_file)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self._token_data = token_data
+            self._mtime = os.path.getmtime(self.token_file)
+        print(f"Token saved to {self.token_file}")
+        self.schedule_refresh()
+
+    def is_fresh(self, token_data):
+        """True if the token is known to stay valid for longer than the refresh margin."""
+        expires_at = (token_data or {}).get("expires_at")
+        return bool(expires_at) and expires_at - time.time() > self.refresh_margin
+
+    def is_unexpired(self, token_data):
+        """True if the token's expires_at is still in the future."""
+        expires_at = (token_data or {}).get("expires_at")
+        return bool(expires_at) and expires_at > time.time()
+
+    def _exchange(self, token_data):
+        """Exchange the token for a new long-lived one and save it; None on failure."""
+        print("Refreshing Instagram Graph API token...")
+        refreshed = exchange_for_long_lived_token(token_data["access_token"])
+        if not refreshed or "access_token" not in refreshed:
+            return None
+        # Keep extra fields such as the username alongside the new token
+        token_data = {**token_data, **refreshed}
+        self.save(token_data)
         return token_data
-    
-    return long_lived_response.json()
+
+    def refresh(self, token_data=None, force=False):
+        """Return token data that is fresh, refreshing it first if needed.
+
+        If the exchange fails while the token has not expired yet, the current
+        token is returned and the exchange is tried again after
+        TOKEN_REFRESH_RETRY. Returns None once the token has expired or been
+        revoked, which means the user has to log in again.
+        """
+        with self._lock:
+            token_data = token_data or self.load()
+            if not token_data or "access_token" not in token_data:
+                return None
+            if not force and self.is_fresh(token_data):
+                self.schedule_refresh()
+                return token_data
+            if not force and self.is_unexpired(token_data) and time.time() < self._retry_at:
+                return token_data
+
+            refreshed = self._exchange(token_data)
+            if refreshed:
+                self._retry_at = 0
+                return refreshed
+            if self.is_unexpired(token_data):
+                print("Token refresh failed, using the current token until it expires")
+                self._retry_at = time.time() + TOKEN_REFRESH_RETRY
+                return token_data
+            return None
+
+    def get_access_token(self):
+        """Return a usable access token, or None if a new login is needed."""
+        token_data = self.refresh()
+        return token_data["access_token"] if token_data else None
+
+    def schedule_refresh(self, delay=None):
+        """Start a daemon timer that refreshes the token before it expires.
+
+        Without an explicit delay, a timer already running for the same expiry is kept.
+        """
+        with self._lock:
+            token_data = self._token_data
+            if delay is None:
+                if not token_data or not token_data.get("expires_at"):
+                    return
+                if self._timer and self._timer_expires_at == token_data["expires_at"]:
+                    return
+                delay = max(0, token_data["expires_at"] - self.refresh_margin - time.time())
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._background_refresh)
+            self._timer_expires_at = (token_data or {}).get("expires_at")
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            self._timer = None
+            token_data = self.load()
+            if not token_data or "access_token" not in token_data or self._exchange(token_data) is None:
+                print("Background token refresh failed, will retry later")
+                self.schedule_refresh(TOKEN_REFRESH_RETRY)
+
+# Shared token manager used by the Graph API scripts
+token_manager = TokenManager()
 
 def save_token(token_data):
     """Save the token data to a file."""
-    with open(TOKEN_FILE, 'w') as f:
-        json.dump(token_data, f)
-    print(f"Token saved to {TOKEN_FILE}")
+    token_manager.save(token_data)
 
 def load_token():
     """Load the token data from file."""
-    if os.path.exists(TOKEN_FILE):
-        with open(TOKEN_FILE, 'r') as f:
-            return json.load(f)
-    return None
+    return token_manager.load()
 
-def get_user_instagram_accounts(access_token):
-    """Get all Instagram accounts connected to the user."""
-    # First, get user's Facebook pages
-    pages_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/me/accounts"
-    params = {"access_token": access_token}
-    
-    response = requests.get(pages_url, params=params)
-    if response.status_code != 200:
-        print(f"Error getting user's Facebook pages: {response.text}")
-        return []
+def refresh_token(token_data=None):
+    """Refresh the token if it is close to expiry; returns None if it is no longer valid."""
+    return token_manager.refresh(token_data)
+
+def get_user_instagram_accounts(access_token, use_cache=True):
+    """Get all Instagram accounts connected to the user.
+
+    The connected Instagram account is requested as a field on /me/accounts, so each
+    page of up to ACCOUNTS_PAGE_SIZE Facebook Pages costs one request, and every
+    pagination cursor is followed. Results are cached for ACCOUNTS_CACHE_TTL seconds.
+    """
+    cache_key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+    cached = _accounts_cache.get(cache_key)
+    if use_cache and cached and time.monotonic() - cached[0] < ACCOUNTS_CACHE_TTL:
+        return list(cached[1])
     
-    pages = response.json().get("data", [])
+    pages_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/me/accounts"
+    params = {
+        "fields": "id,name,instagram_business_account{id,username}",
+        "limit": ACCOUNTS_PAGE_SIZE,
+        "access_token": access_token
+    }
     instagram_accounts = []
     
-    # For each page, check if there's a connected Instagram account
-    for page in pages:
-        page_id = page.get("id")
-        instagram_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{page_id}/instagram_business_account"
-        instagram_params = {"access_token": access_token}
+    while pages_url:
+        response = get_session().get(pages_url, params=params)
+        if response.status_code != 200:
+            print(f"Error getting user's Facebook pages: {response.text}")
+            return []
         
-        instagram_response = requests.get(instagram_url, params=instagram_params)
-        if instagram_response.status_code == 200 and "data" in instagram_response.json():
-            instagram_account = instagram_response.json().get("data", {})
+        data = response.json()
+        # For each page, keep the connected Instagram account if there is one
+        for page in data.get("data", []):
+            instagram_account = page.get("instagram_business_account")
             if instagram_account:
-                instagram_account["page_id"] = page_id
+                instagram_account["page_id"] = page.get("id")
                 instagram_account["page_name"] = page.get("name")
                 instagram_accounts.append(instagram_account)
+        
+        # The "next" URL already carries every query parameter, including the cursor
+        pages_url = data.get("paging", {}).get("next")
+        params = None
     
-    return instagram_accounts
+    _accounts_cache[cache_key] = (time.monotonic(), instagram_accounts)
+    return list(instagram_accounts)
 
-def upload_media(instagram_account_id, video_path, caption, access_token):
-    """Upload a video to Instagram using Graph API."""
-    # Step 1: Create a media container
+def create_media_container(instagram_account_id, caption, access_token, video_url=None):
+    """Create a Reels media container, resumable unless a public video URL is given.
+
+    Returns the container JSON ({"id": ..., "uri": ...}) or None on failure.
+    """
     container_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{instagram_account_id}/media"
     container_params = {
         "media_type": "REELS",
-        "video_url": video_path,
         "caption": caption,
         "access_token": access_token
     }
+    if video_url:
+        container_params["video_url"] = video_url
+    else:
+        container_params["upload_type"] = "resumable"
+    
+    try:
+        container_response = get_session().post(container_url, data=container_params, timeout=REQUEST_TIMEOUT)
+    except HTTP_ERRORS as e:
+        print(f"Error creating media container: {e}")
+        return None
     
-    container_response = requests.post(container_url, data=container_params)
     if container_response.status_code != 200:
         print(f"Error creating media container: {container_response.text}")
-        return False
+        return None
+    
+    return container_response.json()
+
+def get_uploaded_offset(container_id, access_token):
+    """Ask Instagram how many bytes of a resumable upload it already has."""
+    status_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{container_id}"
+    params = {"fields": "video_status", "access_token": access_token}
     
-    creation_id = container_response.json().get("id")
+    try:
+        response = get_session().get(status_url, params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            uploading_phase = response.json().get("video_status", {}).get("uploading_phase", {})
+            return int(uploading_phase.get("bytes_transferred", 0))
+    except (*HTTP_ERRORS, ValueError) as e:
+        print(f"Could not check upload progress: {e}")
+    return None
+
+def backoff_delay(attempt, base=POLL_INITIAL_DELAY, cap=POLL_MAX_DELAY):
+    """Exponential backoff with full jitter for the given attempt number (1-based)."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+def upload_video_chunks(upload_uri, container_id, video_path, access_token, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Send a local video to a resumable upload URI in chunks.
+
+    After a failed chunk the server-side offset is re-read and the upload resumes from there,
+    up to CHUNK_MAX_RETRIES times in a row. Returns True once every byte is accepted.
+    """
+    file_size = os.path.getsize(video_path)
+    offset = 0
+    failures = 0
+    
+    with open(video_path, "rb") as f:
+        while offset < file_size:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            headers = {
+                "Authorization": f"OAuth {access_token}",
+                "offset": str(offset),
+                "file_size": str(file_size),
+            }
+            
+            try:
+                response = get_session().post(upload_uri, headers=headers, data=chunk, timeout=REQUEST_TIMEOUT)
+                if response.status_code == 200 and response.json().get("success", True):
+                    offset += len(chunk)
+                    failures = 0
+                    print(f"Uploaded {offset}/{file_size} bytes")
+                    continue
+                print(f"Chunk upload at offset {offset} failed: {response.text}")
+            except (*HTTP_ERRORS, ValueError) as e:
+                print(f"Chunk upload at offset {offset} failed: {e}")
+            
+            failures += 1
+            if failures > CHUNK_MAX_RETRIES:
+                print("Giving up on upload after repeated chunk failures")
+                return False
+            
+            # Resume from whatever the server actually received
+            time.sleep(backoff_delay(failures))
+            server_offset = get_uploaded_offset(container_id, access_token)
+            if server_offset is not None and server_offset <= file_size:
+                offset = server_offset
     
-    # Step 2: Publish the container
+    return True
+
+def wait_for_container(container_id, access_token, max_wait=CONTAINER_MAX_WAIT):
+    """Poll a container's status_code until it is FINISHED, fails, or the time budget runs out."""
+    status_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{container_id}"
+    params = {"fields": "status_code,status", "access_token": access_token}
+    deadline = time.monotonic() + max_wait
+    attempt = 0
+    
+    while True:
+        try:
+            response = get_session().get(status_url, params=params, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 200:
+                data = response.json()
+                status_code = data.get("status_code")
+                if status_code in ("FINISHED", "PUBLISHED"):
+                    return True
+                if status_code in ("ERROR", "EXPIRED"):
+                    print(f"Media container {container_id} failed: {data.get('status', status_code)}")
+                    return False
+            else:
+                print(f"Error checking container status: {response.text}")
+        except (*HTTP_ERRORS, ValueError) as e:
+            print(f"Error checking container status: {e}")
+        
+        attempt += 1
+        # Grow the delay towards POLL_MAX_DELAY, but never sleep past the deadline
+        delay = min(POLL_INITIAL_DELAY * (2 ** (attempt - 1)), POLL_MAX_DELAY)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"Media container {container_id} was not ready after {max_wait} seconds")
+            return False
+        time.sleep(min(delay, remaining))
+
+def publish_container(instagram_account_id, creation_id, access_token):
+    """Publish a finished media container. Returns the media ID or None."""
     publish_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{instagram_account_id}/media_publish"
     publish_params = {
         "creation_id": creation_id,
         "access_token": access_token
     }
     
-    publish_response = requests.post(publish_url, data=publish_params)
+    try:
+        publish_response = get_session().post(publish_url, data=publish_params, timeout=REQUEST_TIMEOUT)
+    except HTTP_ERRORS as e:
+        print(f"Error publishing media: {e}")
+        return None
+    
     if publish_response.status_code != 200:
         print(f"Error publishing media: {publish_response.text}")
+        return None
+    
+    return publish_response.json().get("id")
+
+def get_publishing_limit(instagram_account_id, access_token):
+    """Return (quota_usage, quota_total) for the last 24 hours of publishing, or None."""
+    limit_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{instagram_account_id}/content_publishing_limit"
+    params = {"fields": "config,quota_usage", "access_token": access_token}
+    
+    try:
+        response = get_session().get(limit_url, params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            data = (response.json().get("data") or [{}])[0]
+            return int(data.get("quota_usage", 0)), data.get("config", {}).get("quota_total")
+        print(f"Could not check publishing limit: {response.text}")
+    except (*HTTP_ERRORS, ValueError) as e:
+        print(f"Could not check publishing limit: {e}")
+    return None
+
+def wait_for_publish_slot(instagram_account_id, access_token):
+    """Sync the account's publishing quota and wait for a slot. Returns the slot, or None if none is near."""
+    usage = get_publishing_limit(instagram_account_id, access_token)
+    if usage:
+        used, total = usage
+        print(f"Publishing quota used: {used}/{total or '?'} in the last 24 hours")
+        upload_rate_limiter.sync_quota(instagram_account_id, used, total)
+    try:
+        return upload_rate_limiter.acquire(instagram_account_id)
+    except UploadQuotaExceeded as e:
+        print(f"Upload skipped: {e}")
+        return None
+
+def create_and_publish(instagram_account_id, video_path, caption, access_token, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Create a Reels container, send the video, wait for processing and publish it.
+
+    Returns the media ID, or None if any step failed.
+    """
+    is_remote = video_path.startswith(("http://", "https://"))
+    
+    # Step 1: Create a media container
+    container = create_media_container(
+        instagram_account_id, caption, access_token,
+        video_url=video_path if is_remote else None
+    )
+    if not container:
+        return None
+    creation_id = container.get("id")
+    
+    # Step 2: Send the video bytes for local files
+    if not is_remote:
+        upload_uri = container.get("uri") or f"{RUPLOAD_URL}/{GRAPH_API_VERSION}/{creation_id}"
+        if not upload_video_chunks(upload_uri, creation_id, video_path, access_token, chunk_size):
+            return None
+    
+    # Step 3: Wait for Instagram to finish processing the video
+    if not wait_for_container(creation_id, access_token):
+        return None
+    
+    # Step 4: Publish the container
+    return publish_container(instagram_account_id, creation_id, access_token)
+
+def upload_media(instagram_account_id, video_path, caption, access_token, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Upload a video to Instagram using Graph API.
+
+    video_path can be a local file, which is sent with the resumable upload protocol,
+    or a public http(s) URL that Instagram fetches itself. The container is only
+    published once Instagram reports it has finished processing.
+    """
+    # Containers expire after 24 hours, so wait for a publishing slot before creating one
+    slot = wait_for_publish_slot(instagram_account_id, access_token)
+    if slot is None:
         return False
     
-    print(f"Successfully published media with ID: {publish_response.json().get('id')}")
+    media_id = create_and_publish(instagram_account_id, video_path, caption, access_token, chunk_size)
+    if not media_id:
+        # Nothing was published, so the slot goes back to the account's budget
+        upload_rate_limiter.release(slot)
+        return False
+    
+    print(f"Successfully published media with ID: {media_id}")
     return True
 
 def authenticate():
     """Interactive authentication flow."""
-    # Check if we already have a token
-    token_data = load_token()
-    if token_data and "access_token" in token_data:
-        print("Found existing token. Testing its validity...")
-        # Test token validity by making a simple API call
-        test_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/me"
-        test_params = {"access_token": token_data["access_token"]}
-        
-        response = requests.get(test_url, params=test_params)
-        if response.status_code == 200:
-            print("Token is valid!")
-            return token_data["access_token"]
-        else:
-            print("Token has expired. Generating new one...")
+    # Reuse the stored token; it is only checked with the API when close to expiry
+    access_token = token_manager.get_access_token()
+    if access_token:
+        print("Using stored token.")
+        return access_token
+    
+    if load_token():
+        print("Token has expired. Generating new one...")
     
     # Open auth page and get auth code
     open_auth_page()
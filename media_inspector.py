@@ -0,0 +1,189 @@
+"""
+Media inspector for the repost tool
+Reads container and stream metadata with ffprobe once per file and keeps the
+summary in a small SQLite index keyed by the file's SHA-256, shared by every
+worker process, so repeat uploads of the same video (and the transcode check)
+never probe it again. The summary is also used to pick clip_upload or
+video_upload up front instead of trying both.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import subprocess
+from collections import OrderedDict
+from download_cache import file_sha256
+
+FFPROBE = os.environ.get("FFPROBE_BINARY", "ffprobe")
+PROBE_TIMEOUT = 30
+INDEX_PATH = os.path.join("downloaded_reels", "media_index.sqlite3")
+LEGACY_INDEX_PATH = os.path.join("downloaded_reels", "media_index.json")
+INDEX_MAX_ENTRIES = 1000
+# Downloads get unique file names, so the in-memory hash memo keeps only recent paths
+HASH_MEMO_ENTRIES = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    digest TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_last_used ON media (last_used);
+"""
+
+# Videos Instagram accepts as Reels through clip_upload
+REEL_MIN_DURATION = 3
+REEL_MAX_DURATION = 90
+REEL_MAX_ASPECT = 1.0  # width / height; anything wider goes through video_upload
+
+def run_ffprobe(video_path):
+    """Return ffprobe's JSON output for a file, or None if it cannot be read."""
+    command = [
+        FFPROBE, "-v", "error",
+        "-show_entries", "format=format_name,duration,bit_rate"
+        ":stream=codec_type,codec_name,width,height,bit_rate,pix_fmt,avg_frame_rate",
+        "-of", "json", video_path,
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Could not inspect video: {e}")
+        return None
+    if result.returncode != 0:
+        print(f"Could not inspect video: {result.stderr.strip()}")
+        return None
+    try:
+        return json.loads(result.stdout or "{}")
+    except ValueError as e:
+        print(f"Could not inspect video: {e}")
+        return None
+
+def frame_rate(value):
+    """Parse ffprobe's fractional frame rate, e.g. "30000/1001"."""
+    numerator, _, denominator = (value or "0/1").partition("/")
+    try:
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def summarize(probe_data):
+    """Reduce raw ffprobe output to the fields the repost pipeline uses."""
+    streams = probe_data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    container = probe_data.get("format", {})
+    width, height = video.get("width") or 0, video.get("height") or 0
+    return {
+        "format_name": container.get("format_name", ""),
+        "duration": float(container.get("duration") or 0),
+        "width": width,
+        "height": height,
+        "aspect_ratio": round(width / height, 4) if width and height else None,
+        "video_codec": video.get("codec_name"),
+        "pix_fmt": video.get("pix_fmt"),
+        "video_bitrate": int(video.get("bit_rate") or 0),
+        "frame_rate": round(frame_rate(video.get("avg_frame_rate")), 3),
+        "audio_codec": audio.get("codec_name"),
+        "audio_bitrate": int(audio.get("bit_rate") or 0),
+    }
+
+def choose_upload_method(media):
+    """Pick clip_upload for Reel-shaped videos and video_upload for everything else."""
+    if not media or not media.get("aspect_ratio"):
+        return None
+    if media["aspect_ratio"] > REEL_MAX_ASPECT:
+        return "video_upload"
+    if not REEL_MIN_DURATION <= media["duration"] <= REEL_MAX_DURATION:
+        return "video_upload"
+    return "clip_upload"
+
+class MediaInspector:
+    """Caches probed media metadata by file content."""
+
+    def __init__(self, index_path=INDEX_PATH, max_entries=INDEX_MAX_ENTRIES):
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = None
+        # path -> (size, mtime, sha256) so unchanged files are not hashed again, least recently used first
+        self._hashes = OrderedDict()
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.index_path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            if self.index_path == INDEX_PATH:
+                self._import_legacy_index(connection)
+            self._connection = connection
+        return self._connection
+
+    def _import_legacy_index(self, connection):
+        """Adopt the entries of a media_index.json written by earlier versions, then remove it."""
+        if not os.path.exists(LEGACY_INDEX_PATH):
+            return
+        try:
+            with open(LEGACY_INDEX_PATH, "r") as f:
+                entries = json.load(f)
+            with connection:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO media (digest, summary, last_used) VALUES (?, ?, ?)",
+                    [(digest, json.dumps(entry["media"]), entry["last_used"]) for digest, entry in entries.items()],
+                )
+            os.remove(LEGACY_INDEX_PATH)
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"Ignoring unreadable media index: {e}")
+
+    def file_hash(self, video_path):
+        """Return the file's SHA-256, reusing the last result while size and mtime are unchanged."""
+        stat = os.stat(video_path)
+        with self._lock:
+            known = self._hashes.get(video_path)
+            if known and known[:2] == (stat.st_size, stat.st_mtime):
+                self._hashes.move_to_end(video_path)
+                return known[2]
+        digest = file_sha256(video_path)
+        with self._lock:
+            self._hashes[video_path] = (stat.st_size, stat.st_mtime, digest)
+            self._hashes.move_to_end(video_path)
+            while len(self._hashes) > HASH_MEMO_ENTRIES:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def inspect(self, video_path):
+        """Return the metadata summary for a file, or None if it cannot be probed."""
+        digest = self.file_hash(video_path)
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT summary FROM media WHERE digest = ?", (digest,)).fetchone()
+            if row:
+                with connection:
+                    connection.execute("UPDATE media SET last_used = ? WHERE digest = ?", (time.time(), digest))
+                return json.loads(row[0])
+
+        probe_data = run_ffprobe(video_path)
+        if probe_data is None:
+            return None
+        media = summarize(probe_data)
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO media (digest, summary, last_used) VALUES (?, ?, ?)",
+                    (digest, json.dumps(media), time.time()),
+                )
+                # Keep the index small by dropping the least recently used entries
+                connection.execute(
+                    "DELETE FROM media WHERE digest NOT IN "
+                    "(SELECT digest FROM media ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+        return media
+
+# Shared inspector used by the repost scripts
+media_inspector = MediaInspector()
@@ -0,0 +1,116 @@
+"""
+Repost ledger for the repost tool
+Remembers which source videos have already been posted to which account, so a
+duplicate repost is stopped before anything is downloaded. Rows live in SQLite
+keyed by (account, source, video_id); lookups are primary-key seeks and stay fast
+at millions of rows. An optional perceptual hash of the video also catches the
+same clip reposted from a different URL.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import subprocess
+
+LEDGER_PATH = os.environ.get("REPOST_LEDGER_PATH") or os.path.join("downloaded_reels", "reposts.sqlite3")
+LEDGER_ENABLED = os.environ.get("REPOST_LEDGER", "1") != "0"
+# Perceptual hashing needs an ffmpeg frame grab per video, so it is opt-in
+PHASH_ENABLED = os.environ.get("REPOST_LEDGER_PHASH", "") == "1"
+FFMPEG = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+PHASH_SEEK = 1.0
+PHASH_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reposts (
+    account TEXT NOT NULL,
+    source TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    url TEXT,
+    phash TEXT,
+    created REAL NOT NULL,
+    PRIMARY KEY (account, source, video_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS reposts_phash ON reposts (account, phash) WHERE phash IS NOT NULL;
+"""
+
+def perceptual_hash(video_path, media=None):
+    """Return a 64-bit difference hash of one frame as hex, or None if ffmpeg fails.
+
+    The frame is shrunk to 9x8 grayscale, so re-encodes, resizes and small quality
+    changes of the same clip give the same hash.
+    """
+    duration = (media or {}).get("duration") or 0
+    seek = min(PHASH_SEEK, duration / 2) if duration else 0
+    command = [
+        FFMPEG, "-v", "error", "-ss", f"{seek:.3f}", "-i", video_path,
+        "-frames:v", "1", "-vf", "scale=9:8,format=gray", "-f", "rawvideo", "-",
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=PHASH_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Could not fingerprint video: {e}")
+        return None
+    pixels = result.stdout
+    if result.returncode != 0 or len(pixels) != 72:
+        print("Could not fingerprint video")
+        return None
+
+    bits = 0
+    for row in range(8):
+        for column in range(8):
+            left, right = pixels[row * 9 + column], pixels[row * 9 + column + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+class RepostLedger:
+    """SQLite-backed record of completed reposts."""
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # WAL lets the backend's worker processes read while one of them writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def find(self, account, source, video_id):
+        """Return (url, created) for an earlier repost of this video, or None."""
+        with self._lock:
+            return self._connect().execute(
+                "SELECT url, created FROM reposts WHERE account = ? AND source = ? AND video_id = ?",
+                (account, source, video_id),
+            ).fetchone()
+
+    def find_by_phash(self, account, phash):
+        """Return (url, created) for an earlier repost with the same perceptual hash, or None."""
+        if not phash:
+            return None
+        with self._lock:
+            return self._connect().execute(
+                "SELECT url, created FROM reposts WHERE account = ? AND phash = ? LIMIT 1",
+                (account, phash),
+            ).fetchone()
+
+    def record(self, account, source, video_id, url=None, phash=None):
+        """Remember a completed repost."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO reposts (account, source, video_id, url, phash, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (account, source, video_id, url, phash, time.time()),
+                )
+
+# Shared ledger used by the repost scripts
+repost_ledger = RepostLedger()
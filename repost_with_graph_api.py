@@ -5,38 +5,16 @@ Instagram Repost Tool using Graph API for authentication
 
 import os
 import sys
-import time
 import argparse
-from urllib.parse import urlparse
 import yt_dlp
-from instagram_graph_api import load_token, refresh_token, auth_flow, upload_reel
+from instagram_graph_api import authenticate, get_user_instagram_accounts, upload_media
+from url_normalizer import extract_video_id
 
 # --- Configuration ---
 DEFAULT_CAPTION = "Thanks for watching, hit follow for more! 🙏"
 HASHTAGS = "#reels #instareels #trending #viral #foryou #fyp #repost"
 DOWNLOAD_FOLDER = "downloaded_reels"
 
-def extract_video_id(url):
-    """Extract video ID from Instagram or YouTube URL."""
-    video_id = None
-    
-    # Instagram patterns
-    if "instagram.com/reel/" in url:
-        video_id = url.split("/reel/")[1].split("/")[0].split("?")[0]
-    elif "instagram.com/p/" in url:
-        video_id = url.split("/p/")[1].split("/")[0].split("?")[0]
-    # YouTube Shorts patterns
-    elif "youtube.com/shorts/" in url:
-        video_id = url.split("/shorts/")[1].split("?")[0]
-    elif "youtu.be/" in url:
-        video_id = url.split("youtu.be/")[1].split("?")[0]
-    elif "youtube.com/watch" in url:
-        parsed_url = urlparse(url)
-        query_params = {k: v[0] for k, v in [p.split('=') for p in parsed_url.query.split('&')]}
-        video_id = query_params.get('v', None)
-    
-    return video_id or f"video_{int(time.time())}"
-
 def download_video(video_url, download_path):
     """Downloads a video using yt-dlp."""
     print(f"Downloading video from: {video_url}")
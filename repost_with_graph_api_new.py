@@ -5,42 +5,19 @@ Instagram Repost Tool using Graph API for authentication
 
 import os
 import sys
-import time
 import argparse
-from urllib.parse import urlparse
 import yt_dlp
-from instagram_graph_api import load_token, refresh_token, auth_flow, upload_reel, TOKEN_FILE
+from instagram_graph_api import load_token, refresh_token, authenticate, get_user_instagram_accounts, upload_media, TOKEN_FILE
+from url_normalizer import extract_video_id, detect_source
 
 # --- Configuration ---
 DEFAULT_CAPTION = "Thanks for watching, hit follow for more! 🙏"
 HASHTAGS = "#reels #instareels #trending #viral #foryou #fyp #repost"
 DOWNLOAD_FOLDER = "downloaded_reels"
 
-def extract_video_id(url):
-    """Extract video ID from Instagram or YouTube URL."""
-    video_id = None
-    
-    # Instagram patterns
-    if "instagram.com/reel/" in url:
-        video_id = url.split("/reel/")[1].split("/")[0].split("?")[0]
-    elif "instagram.com/p/" in url:
-        video_id = url.split("/p/")[1].split("/")[0].split("?")[0]
-    # YouTube Shorts patterns
-    elif "youtube.com/shorts/" in url:
-        video_id = url.split("/shorts/")[1].split("?")[0]
-    elif "youtu.be/" in url:
-        video_id = url.split("youtu.be/")[1].split("?")[0]
-    
-    return video_id or "video_" + str(int(time.time()))
-
 def determine_source(url):
     """Determine the source platform of the video URL."""
-    if "instagram.com" in url:
-        return "instagram"
-    elif "youtube.com" in url or "youtu.be" in url:
-        return "youtube"
-    else:
-        return "unknown"
+    return detect_source(url) or "unknown"
 
 def download_video(url, output_folder):
     """Download a video using yt-dlp."""
@@ -92,9 +69,20 @@ def authenticate_instagram():
     else:
         # Start authentication flow
         print("No stored authentication. Starting Instagram login flow...")
-        auth_flow()
+        authenticate()
         return load_token()
 
+def upload_reel(video_path, caption, token_data):
+    """Upload the video to the first Instagram account connected to the token."""
+    access_token = token_data["access_token"]
+    instagram_accounts = get_user_instagram_accounts(access_token)
+    if not instagram_accounts:
+        print("No Instagram business accounts are connected to this login.")
+        return False
+    account = instagram_accounts[0]
+    print(f"Posting to {account.get('username', account['id'])}")
+    return upload_media(account["id"], video_path, caption, access_token)
+
 def repost_with_graph_api():
     """Main function to repost content using Instagram Graph API."""
     print("\nInstagram Repost Tool (Graph API)")
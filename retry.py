@@ -0,0 +1,225 @@
+"""
+Retry policies and circuit breakers for the repost tool
+Each phase (download, login, upload) runs under its own retry budget. Errors are
+classified first, so rate limits back off longer, timeouts are retried only
+where repeating the call is safe, and auth failures or rejected media fail
+straight away. Circuit breakers per account and per source stop new attempts
+for a while after repeated failures instead of hammering a service that is down
+or throttling us.
+"""
+
+import time
+import random
+import threading
+
+# Error classes
+RATE_LIMIT = "rate_limit"
+AUTH = "auth"
+MEDIA_REJECTED = "media_rejected"
+TIMEOUT = "timeout"
+TRANSIENT = "transient"
+UNCONFIRMED = "unconfirmed"
+PERMANENT = "permanent"
+
+class UnconfirmedError(Exception):
+    """A call failed after its request went out, so it may have taken effect anyway."""
+
+# Exception class names from instagrapi, requests and yt-dlp, matched by name so
+# none of them has to be importable here
+_CLASS_NAMES = {
+    UNCONFIRMED: {"UnconfirmedError"},
+    RATE_LIMIT: {"PleaseWaitFewMinutes", "RateLimitError", "ClientThrottledError", "FeedbackRequired"},
+    AUTH: {"LoginRequired", "ChallengeRequired", "BadPassword", "BadCredentials", "TwoFactorRequired",
+           "ClientUnauthorizedError", "ClientForbiddenError", "ReloginAttemptExceeded"},
+    MEDIA_REJECTED: {"VideoNotUpload", "VideoNotDownload", "ClipNotUpload", "VideoTooLongException",
+                     "VideoConfigureError", "VideoConfigureStoryError", "UnsupportedError"},
+    TIMEOUT: {"Timeout", "TimeoutError", "ReadTimeout", "ConnectTimeout", "ReadTimeoutError",
+              "ClientRequestTimeout"},
+    TRANSIENT: {"ConnectionError", "ClientConnectionError", "ProtocolError", "ChunkedEncodingError",
+                "ClientJSONDecodeError", "ClientIncompleteReadError", "IncompleteRead", "TransportError"},
+}
+
+def _status_class(status):
+    if status == 429:
+        return RATE_LIMIT
+    if status in (401, 403):
+        return AUTH
+    if status == 408:
+        return TIMEOUT
+    if status >= 500:
+        return TRANSIENT
+    return PERMANENT
+
+def _status_code(error):
+    """Return the HTTP status a requests, urllib, yt-dlp or instagrapi error carries, if any."""
+    response = getattr(error, "response", None)
+    for status in (getattr(response, "status_code", None), getattr(response, "status", None),
+                   getattr(error, "status", None), getattr(error, "code", None)):
+        if isinstance(status, int) and 100 <= status < 600:
+            return status
+    return None
+
+def _error_chain(error):
+    """Yield the error, then the exceptions it wraps (yt-dlp's exc_info, __cause__, __context__)."""
+    seen = set()
+    while isinstance(error, BaseException) and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        exc_info = getattr(error, "exc_info", None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = wrapped if isinstance(wrapped, BaseException) else error.__cause__ or error.__context__
+
+def classify_error(error):
+    """Return the error class for an exception raised by a repost phase.
+
+    Only exception types and HTTP status codes are looked at, never message text.
+    The error and the exceptions it wraps are checked in turn; anything not
+    recognised is permanent.
+    """
+    for current in _error_chain(error):
+        names = {cls.__name__ for cls in type(current).__mro__}
+        for error_class, class_names in _CLASS_NAMES.items():
+            if names & class_names:
+                return error_class
+        status = _status_code(current)
+        if status is not None:
+            return _status_class(status)
+    return PERMANENT
+
+class RetryPolicy:
+    """How often and how long to retry one phase."""
+
+    def __init__(self, attempts=3, base_delay=2.0, max_delay=60.0, retry_on=(RATE_LIMIT, TIMEOUT, TRANSIENT),
+                 rate_limit_delay=60.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.rate_limit_delay = rate_limit_delay
+
+    def should_retry(self, error_class, attempt):
+        return error_class in self.retry_on and attempt + 1 < self.attempts
+
+    def delay(self, error_class, attempt):
+        """Exponential backoff with full jitter; rate limits start from a longer base."""
+        base = self.rate_limit_delay if error_class == RATE_LIMIT else self.base_delay
+        return random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+
+# A timed-out upload may still have been published, so uploads are not retried on timeouts,
+# and callers raise UnconfirmedError for failures after the video bytes were sent
+PHASE_POLICIES = {
+    "download": RetryPolicy(attempts=3, base_delay=2.0, max_delay=30.0),
+    "login": RetryPolicy(attempts=2, base_delay=5.0, max_delay=60.0),
+    "upload": RetryPolicy(attempts=3, base_delay=5.0, max_delay=300.0, retry_on=(RATE_LIMIT, TRANSIENT),
+                          rate_limit_delay=120.0),
+}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"Circuit breaker for {name} is open, retry in {int(retry_in)}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one trial call through after a cool-down."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited < self.reset_timeout or self._trial_running:
+                raise CircuitOpenError(self.name, max(0.0, self.reset_timeout - waited))
+            # Half-open: let one call test whether the service has recovered
+            self._trial_running = True
+
+    def is_open(self):
+        """True while the breaker is refusing calls, without claiming the half-open trial."""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            return self._trial_running or time.monotonic() - self.opened_at < self.reset_timeout
+
+    def release(self):
+        """Give back a half-open trial that never made its call."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def circuit_breaker(kind, key):
+    """Return the shared breaker for an account or source, e.g. ("account", "name")."""
+    name = f"{kind}:{key}"
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+# Error classes that say nothing about the health of the account or source
+_NOT_BREAKER_FAILURES = (MEDIA_REJECTED, PERMANENT)
+
+def run_with_retries(phase, action, breakers=(), policy=None, on_retry=None, sleep=time.sleep):
+    """Call action() under the phase's retry policy and breakers; returns its result.
+
+    on_retry(error, error_class, attempt, delay) is called before each wait. The
+    last error is re-raised once the policy gives up.
+    """
+    policy = policy or PHASE_POLICIES[phase]
+    attempt = 0
+    while True:
+        passed = []
+        try:
+            for breaker in breakers:
+                breaker.before_call()
+                passed.append(breaker)
+        except CircuitOpenError:
+            for breaker in passed:
+                breaker.release()
+            raise
+        try:
+            result = action()
+        except Exception as e:
+            error_class = classify_error(e)
+            if error_class not in _NOT_BREAKER_FAILURES:
+                for breaker in breakers:
+                    breaker.record_failure()
+            else:
+                for breaker in breakers:
+                    breaker.record_success()
+            if not policy.should_retry(error_class, attempt):
+                raise
+            delay = policy.delay(error_class, attempt)
+            if on_retry:
+                on_retry(e, error_class, attempt + 1, delay)
+            sleep(delay)
+            attempt += 1
+            continue
+        for breaker in breakers:
+            breaker.record_success()
+        return result
@@ -1,9 +1,28 @@
 import os
 import sys
+import glob
 import time
+import math
 import json
+import uuid
 import argparse
-from instagrapi import Client
+import contextlib
+import shutil
+import io
+import socketserver
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from instagram_client_pool import client_pool
+from download_cache import download_cache
+from url_normalizer import normalize_url, extract_video_id, detect_source
+from transcode import ensure_reel_compliant
+from media_inspector import media_inspector, choose_upload_method
+from thumbnails import thumbnail_store
+from retry import (run_with_retries, circuit_breaker, classify_error, CircuitOpenError, UnconfirmedError,
+                   MEDIA_REJECTED, PERMANENT, TIMEOUT, TRANSIENT, UNCONFIRMED)
+from upload_rate_limiter import upload_rate_limiter, UploadQuotaExceeded
+from repost_ledger import repost_ledger, perceptual_hash, LEDGER_ENABLED, PHASH_ENABLED
 import yt_dlp
 
 # --- Configuration ---
@@ -12,57 +31,103 @@ INSTAGRAM_PASSWORD = "DantesisBest101"
 DEFAULT_CAPTION = "Thanks for watching, hit follow for more! 🙏"
 DEFAULT_HASHTAGS = "#reels #instareels #trending #viral #foryou #fyp #repost"
 DOWNLOAD_FOLDER = "downloaded_reels"
+DOWNLOAD_FORMAT = "best[ext=mp4]"
+WORKER_HOST = "127.0.0.1"
+BATCH_DOWNLOAD_WORKERS = 2
+BATCH_UPLOAD_WORKERS = 1
+# "memory" downloads into a tmpfs spool instead of DOWNLOAD_FOLDER, skipping the disk cache
+DOWNLOAD_SPOOL = os.environ.get("DOWNLOAD_SPOOL", "disk")
+MEMORY_SPOOL_ROOT = "/dev/shm"
+MEMORY_SPOOL_MIN_FREE = int(os.environ.get("DOWNLOAD_SPOOL_MIN_FREE", 512 * 1024 * 1024))  # 512 MB
+# When set (worker mode), an upload with no free slot is handed back to the backend to run
+# later instead of sleeping; the CLI and batch mode wait for the slot
+UPLOAD_DEFER = False
+
+def safe_error_text(error):
+    """Return the error message with problematic characters replaced"""
+    return str(error).encode('ascii', 'replace').decode('ascii')
 
 def safe_print_error(message, error):
     """Print errors safely without Unicode issues"""
-    error_str = str(error)
-    # Replace problematic characters instead of using backslash in f-string
-    safe_error = error_str.encode('ascii', 'replace').decode('ascii')
-    print(f"{message}: {safe_error}")
-
-def extract_video_id(url):
-    """Extract video ID from Instagram or YouTube URL."""
-    video_id = None
-    
-    # Instagram patterns
-    if "instagram.com/reel/" in url:
-        video_id = url.split("/reel/")[1].split("/")[0].split("?")[0]
-    elif "instagram.com/p/" in url:
-        video_id = url.split("/p/")[1].split("/")[0].split("?")[0]
-    # YouTube Shorts patterns
-    elif "youtube.com/shorts/" in url:
-        video_id = url.split("/shorts/")[1].split("?")[0]
-    elif "youtu.be/" in url:
-        video_id = url.split("youtu.be/")[1].split("?")[0]
-    
-    return video_id or "video_" + str(int(time.time()))
-
-def download_video(video_url, download_path, source="instagram"):
-    """Downloads a video using yt-dlp from either Instagram or YouTube."""
-    print(f"Downloading {source} video from: {video_url}")
-    print("STEP_MARKER: DOWNLOAD_STARTED")
-    
-    if not os.path.exists(download_path):
-        os.makedirs(download_path)
+    print(f"{message}: {safe_error_text(error)}")
 
-    # Extract video ID
-    video_id = extract_video_id(video_url)
-    output_path = os.path.join(download_path, f"{video_id}.mp4")
+# --- Progress events ---
+# Progress is reported as one JSON object per line on stdout, e.g.
+#   {"type": "progress", "phase": "download", "state": "completed", "ts": 1700000000.0, "bytes": 1234}
+# phase is download, transcode, login, upload or job; state is started, retrying, waiting,
+# completed or failed.
+# Completed and failed events carry the phase's duration_ms, failed events also carry an
+# error_code and a message. Steps too short to be phases are reported as timing lines, e.g.
+#   {"type": "timing", "name": "caption", "duration_ms": 0.2}
+# Every other stdout line is plain log text.
+
+# When each phase of the current job started; concurrent async jobs each get their own dict
+phase_started = contextvars.ContextVar("phase_started", default=None)
+
+def emit_event(phase, state, **fields):
+    """Print a progress event and flush it so the backend sees it straight away."""
+    started = phase_started.get()
+    if started is None:
+        started = {}
+        phase_started.set(started)
+    if state == "started":
+        started[phase] = time.monotonic()
+    elif state in ("completed", "failed") and phase in started:
+        fields.setdefault("duration_ms", round((time.monotonic() - started.pop(phase)) * 1000, 1))
     
-    # First clean up any existing files with this ID
-    for file in os.listdir(download_path):
-        if video_id and video_id in file:
-            try:
-                os.remove(os.path.join(download_path, file))
-                print(f"Removed previous file: {file}")
-            except Exception as e:
-                safe_print_error("Error removing file", e)
-                pass
+    event = {"type": "progress", "phase": phase, "state": state, "ts": round(time.time(), 3)}
+    event.update({key: value for key, value in fields.items() if value is not None})
+    print(json.dumps(event), flush=True)
+
+@contextlib.contextmanager
+def timed(name):
+    """Report how long the block took as a timing line."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timing = {"type": "timing", "name": name, "duration_ms": round((time.monotonic() - start) * 1000, 3)}
+        print(json.dumps(timing), flush=True)
+
+def memory_spool_folder():
+    """Return a tmpfs-backed download folder, or None if none is available with enough room."""
+    if not os.path.isdir(MEMORY_SPOOL_ROOT) or not os.access(MEMORY_SPOOL_ROOT, os.W_OK):
+        return None
+    if shutil.disk_usage(MEMORY_SPOOL_ROOT).free < MEMORY_SPOOL_MIN_FREE:
+        return None
+    folder = os.path.join(MEMORY_SPOOL_ROOT, "insta_repost")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def report_retry(phase):
+    """Return an on_retry callback that logs and emits a retrying event for a phase."""
+    def on_retry(error, error_class, attempt, delay):
+        safe_print_error(f"{phase.capitalize()} attempt {attempt} failed ({error_class}), retrying in {delay:.1f}s", error)
+        emit_event(phase, "retrying", attempt=attempt, delay=round(delay, 1), error_class=error_class,
+                   message=safe_error_text(error))
+    return on_retry
+
+def failure_fields(phase, error):
+    """Event fields for a phase that gave up, including how the error was classified."""
+    if isinstance(error, CircuitOpenError):
+        return {"error_code": "circuit_open", "error_class": "circuit_open", "message": safe_error_text(error)}
+    return {"error_code": f"{phase}_failed", "error_class": classify_error(error), "message": safe_error_text(error)}
+
+def fetch_video(video_url, download_path, video_id, spool=None):
+    """Download one video with yt-dlp; returns (path, spooled) or raises."""
+    spool = spool or DOWNLOAD_SPOOL
+    # Download straight into memory when a spool is configured and has room
+    spool_folder = memory_spool_folder() if spool == "memory" else None
+    if spool == "memory" and not spool_folder:
+        print("Memory spool unavailable, downloading to disk")
+    output_folder = spool_folder or download_path
+    # A name of its own per download, so concurrent jobs for the same video never touch each other's files
+    output_path = os.path.join(output_folder, f"{video_id}.{uuid.uuid4().hex[:12]}.mp4")
 
     # Use yt-dlp to download the video as MP4
     ydl_opts = {
         'outtmpl': output_path,
-        'format': 'best[ext=mp4]',  # Force mp4 format
+        'format': DOWNLOAD_FORMAT,  # Force mp4 format
         'merge_output_format': 'mp4',  # Force merging to mp4
     }
     
@@ -70,66 +135,374 @@ def download_video(video_url, download_path, source="instagram"):
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             ydl.download([video_url])
         
-        if os.path.exists(output_path):
-            print(f"Downloaded video: {output_path}")
-            print("STEP_MARKER: DOWNLOAD_COMPLETED")
-            return output_path
-        else:
-            print(f"Video not found at expected location: {output_path}")
-            return None
-            
-    except Exception as e:
-        safe_print_error("Error downloading video", e)
-        return None
+        if not os.path.exists(output_path):
+            raise FileNotFoundError(f"Video not found at expected location: {output_path}")
+    except Exception:
+        # Remove what this attempt left behind (.part files, unmerged formats)
+        for leftover in glob.glob(glob.escape(os.path.splitext(output_path)[0]) + ".*"):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+        raise
+    if spool_folder:
+        # Spooled downloads stay in memory and are deleted once uploaded
+        return output_path, True
+    return download_cache.put(video_id, DOWNLOAD_FORMAT, output_path), False
 
-def login_to_instagram(username, password):
-    """Logs into Instagram using instagrapi."""
-    print("Logging into Instagram...")
-    print("STEP_MARKER: LOGIN_STARTED")
+def download_video(video_url, download_path, source="instagram", spool=None):
+    """Downloads a video using yt-dlp from either Instagram or YouTube."""
+    print(f"Downloading {source} video from: {video_url}")
+    emit_event("download", "started", source=source)
     
-    cl = Client()
-    session_file = f"{username}_session.json"
+    if not os.path.exists(download_path):
+        os.makedirs(download_path)
+
+    # Extract video ID
+    video_id = extract_video_id(video_url)
     
-    if os.path.exists(session_file):
+    # One download per video at a time; a job that waited usually finds it in the cache
+    with download_cache.download_lock(video_id, DOWNLOAD_FORMAT):
+        # Reuse an earlier download of the same source if the cache still has it
+        cached_path = download_cache.get(video_id, DOWNLOAD_FORMAT)
+        if cached_path:
+            print(f"Using cached download for {video_id}")
+            print(f"Downloaded video: {cached_path}")
+            emit_event("download", "completed", bytes=os.path.getsize(cached_path), cached=True)
+            return cached_path
+        
+        fetch_started = time.monotonic()
         try:
-            cl.load_settings(session_file)
-            cl.login(username, password)
-            cl.get_timeline_feed()
-            print(f"Logged in successfully using saved session for {username}")
-            print("STEP_MARKER: LOGIN_COMPLETED")
-            return cl
+            video_path, spooled = run_with_retries(
+                "download", lambda: fetch_video(video_url, download_path, video_id, spool),
+                breakers=[circuit_breaker("source", source)], on_retry=report_retry("download"))
         except Exception as e:
-            safe_print_error("Could not use saved session", e)
+            safe_print_error("Error downloading video", e)
+            emit_event("download", "failed", **failure_fields("download", e))
+            return None
+    
+    print(f"Downloaded video: {video_path}")
+    size = os.path.getsize(video_path)
+    elapsed = time.monotonic() - fetch_started
+    emit_event("download", "completed", bytes=size, cached=False, spooled=spooled,
+               bytes_per_second=round(size / elapsed) if elapsed > 0 else None)
+    return video_path
+
+def login_to_instagram(username, password):
+    """Logs into Instagram using a pooled instagrapi client."""
+    print("Logging into Instagram...")
+    emit_event("login", "started")
+    
+    reused = client_pool.is_cached(username)
     
     try:
-        cl.login(username, password)
-        cl.dump_settings(session_file)
-        print(f"Logged in successfully and saved session for {username}")
-        print("STEP_MARKER: LOGIN_COMPLETED")
+        # A pooled client needs no network call, so it says nothing about the account's health
+        breakers = [] if reused else [circuit_breaker("account", username)]
+        cl = run_with_retries("login", lambda: client_pool.get(username, password),
+                              breakers=breakers, on_retry=report_retry("login"))
+        if reused:
+            print(f"Logged in successfully using pooled client for {username}")
+        else:
+            print(f"Logged in successfully for {username}")
+        emit_event("login", "completed", reused=reused)
         return cl
     except Exception as e:
         safe_print_error("Error: Failed to login", e)
+        emit_event("login", "failed", **failure_fields("login", e))
         return None
 
+def is_valid_source_url(video_url, source):
+    """Check that the URL is a supported video link on the platform it claims to come from."""
+    key = normalize_url(video_url)
+    return key is not None and key.source == source
+
+def build_caption(custom_caption=None, custom_hashtags=None):
+    """Combine the caption and hashtags, falling back to the defaults."""
+    # Use custom caption and hashtags if provided, otherwise use defaults
+    # Explicitly check if they're None or empty strings
+    caption_text = DEFAULT_CAPTION
+    hashtags_text = DEFAULT_HASHTAGS
+    
+    print("Processing caption and hashtags...")
+    
+    # Only use custom caption if it's not None and not empty
+    if custom_caption and isinstance(custom_caption, str) and custom_caption.strip():
+        caption_text = custom_caption.strip()
+        print("Using custom caption")
+    else:
+        print("Using default caption")
+    
+    # Only use custom hashtags if it's not None and not empty
+    if custom_hashtags and isinstance(custom_hashtags, str) and custom_hashtags.strip():
+        # Make sure hashtags start with #
+        hashtags_text = custom_hashtags.strip()
+        
+        # If hashtags don't start with # and there are spaces, add # to each word
+        if not hashtags_text.startswith("#") and " " in hashtags_text:
+            words = hashtags_text.split()
+            hashtags_text = " ".join([f"#{w}" if not w.startswith("#") else w for w in words])
+        # If there's just one word without #, add it
+        elif not hashtags_text.startswith("#"):
+            hashtags_text = f"#{hashtags_text}"
+            
+        print("Using custom hashtags")
+    else:
+        print("Using default hashtags")
+    
+    return f"{caption_text}\n\n{hashtags_text}"
+
+def transcode_for_upload(video_path):
+    """Convert the video to the Reels spec if it does not already meet it; returns the path to upload."""
+    emit_event("transcode", "started")
+    upload_path = ensure_reel_compliant(video_path)
+    emit_event("transcode", "completed", transcoded=upload_path != video_path,
+               bytes=os.path.getsize(upload_path))
+    return upload_path
+
+def take_upload_slot():
+    """Take a slot in the account's upload budget; returns it, or None if the upload cannot go ahead.
+
+    One slot covers retries and the fallback method. In defer mode a job with no free
+    slot reports an upload deferred event instead of waiting.
+    """
+    try:
+        return upload_rate_limiter.acquire(
+            INSTAGRAM_USERNAME, max_wait=0 if UPLOAD_DEFER else None,
+            on_wait=lambda delay: emit_event("upload", "waiting", delay=round(delay, 1)))
+    except UploadQuotaExceeded as e:
+        if UPLOAD_DEFER:
+            print(f"Upload deferred: the next slot for {INSTAGRAM_USERNAME} is in {int(e.wait)}s")
+            emit_event("upload", "deferred", retry_in=math.ceil(e.wait))
+            return None
+        safe_print_error("Upload skipped", e)
+        emit_event("upload", "failed", error_code="upload_quota", error_class="rate_limit",
+                   message=safe_error_text(e), retry_in=int(e.wait))
+        return None
+
+def publish_video(video_path, custom_caption=None, custom_hashtags=None, source="instagram", video_id=None):
+    """Take an upload slot, transcode if needed, then log in and upload. Returns True on success."""
+    # Check the slot first, so a deferred job has not spent a transcode and a login on nothing
+    slot = take_upload_slot()
+    if slot is None:
+        return False
+    try:
+        upload_path = transcode_for_upload(video_path)
+        # A cover sidecar was taken from the original download, so it does not fit a transcoded copy
+        sidecar_id = video_id if upload_path == video_path else None
+        try:
+            return upload_to_instagram(upload_path, custom_caption, custom_hashtags, source, sidecar_id, slot)
+        finally:
+            # The transcoded copy is only needed for this upload
+            if upload_path != video_path:
+                cleanup_video(upload_path)
+    except Exception:
+        # upload_to_instagram handles upload errors itself, so nothing reached Instagram
+        upload_rate_limiter.release(slot)
+        raise
+
+def send_upload(cl, method, **kwargs):
+    """Call an instagrapi upload method; failures after the video bytes went out raise UnconfirmedError."""
+    # instagrapi uploads the bytes and then publishes (configures) the media in this one call,
+    # so a hook on its session notes when Instagram has accepted the bytes
+    sent = []
+    def note_rupload(response, *args, **hook_kwargs):
+        if response.request.method == "POST" and "/rupload_igvideo/" in response.url and response.ok:
+            sent.append(True)
+    hooks = getattr(getattr(cl, "private", None), "hooks", None)
+    if hooks is not None:
+        hooks["response"].append(note_rupload)
+    try:
+        return getattr(cl, method)(**kwargs)
+    except Exception as e:
+        # The reel may already be published; calling again could post it twice
+        if sent and classify_error(e) in (TIMEOUT, TRANSIENT):
+            raise UnconfirmedError(f"{method} failed after the video was sent: {safe_error_text(e)}") from e
+        raise
+    finally:
+        if hooks is not None:
+            hooks["response"].remove(note_rupload)
+
+def upload_with(method, video_path, caption, thumbnail=None):
+    """Upload through the pooled client with clip_upload or video_upload."""
+    # Passing a thumbnail stops instagrapi from decoding the video to make its own cover
+    extra = {"thumbnail": thumbnail} if thumbnail else {}
+    with timed("publish"):
+        client_pool.call(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD, lambda cl: send_upload(
+            cl, method,
+            path=video_path,
+            caption=caption,
+            **extra
+        ))
+    print("Reel uploaded successfully!" if method == "clip_upload" else "Video uploaded successfully!")
+    emit_event("upload", "completed", method=method)
+
+def upload_to_instagram(video_path, custom_caption=None, custom_hashtags=None, source="instagram", video_id=None,
+                        slot=None):
+    """Log in and upload an already downloaded video. Returns True on success.
+
+    slot is the upload slot taken by take_upload_slot(); it is given back unless the
+    upload succeeded or may already have been published.
+    """
+    # STEP 2: Login phase
+    client = login_to_instagram(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD)
+    
+    if not client:
+        print("Error: Failed to login to Instagram.")
+        upload_rate_limiter.release(slot)
+        return False
+    
+    with timed("caption"):
+        full_caption = build_caption(custom_caption, custom_hashtags)
+    
+    print("Caption and hashtags prepared")
+    
+    # Pick the upload call from the file's metadata so a mismatched attempt is not wasted
+    with timed("prepare"):
+        media = media_inspector.inspect(video_path)
+        method = choose_upload_method(media)
+        thumbnail = thumbnail_store.get(video_path, media, video_id)
+    
+    # STEP 3: Upload phase; the slot was taken before the transcode, so its duration is the upload alone
+    emit_event("upload", "started", bytes=os.path.getsize(video_path))
+    print(f"Uploading {source} video to Instagram...")
+    
+    def upload_attempts(upload_method):
+        # Rate limits and dropped connections are retried; the downloaded file and login are reused
+        return run_with_retries(
+            "upload", lambda: upload_with(upload_method, video_path, full_caption, thumbnail),
+            breakers=[circuit_breaker("account", INSTAGRAM_USERNAME)], on_retry=report_retry("upload"))
+    
+    try:
+        print("Starting upload attempt...")
+        if method:
+            print(f"Using {method} method based on the video metadata...")
+            upload_attempts(method)
+        else:
+            # Metadata unavailable: try clip_upload (for Reels), then video_upload if the clip was rejected
+            try:
+                print("Trying clip_upload method...")
+                upload_attempts("clip_upload")
+            except Exception as e:
+                if isinstance(e, CircuitOpenError) or classify_error(e) not in (MEDIA_REJECTED, PERMANENT):
+                    raise
+                safe_print_error("clip_upload failed", e)
+                print("Trying video_upload method...")
+                try:
+                    upload_attempts("video_upload")
+                except Exception as inner_e:
+                    safe_print_error("video_upload also failed", inner_e)
+                    raise inner_e
+        return True
+    except Exception as e:
+        safe_print_error("Upload failed", e)
+        emit_event("upload", "failed", **failure_fields("upload", e))
+        # Only an upload that may have been published keeps its slot
+        if classify_error(e) != UNCONFIRMED:
+            upload_rate_limiter.release(slot)
+        
+        # Try to provide specific solutions based on error message
+        error_msg = str(e).lower()
+        if "moviepy" in error_msg:
+            print("\nTroubleshooting:")
+            print("1. The error is related to moviepy, which is needed for video processing.")
+            print("2. Try these commands in your terminal:")
+            print("   pip install moviepy==1.0.3")
+            print("   pip install decorator==4.4.2")
+        elif "ffmpeg" in error_msg:
+            print("\nTroubleshooting:")
+            print("1. The error is related to ffmpeg, which is needed for video processing.")
+            print("2. Download ffmpeg from: https://ffmpeg.org/download.html")
+            print("3. Add ffmpeg to your PATH or set IMAGEIO_FFMPEG_EXE environment variable.")
+        # Make sure to leave the process in a failed state
+        return False
+
+def cleanup_video(video_path):
+    """Delete a downloaded video unless the download cache owns it."""
+    if video_path and os.path.exists(video_path) and not download_cache.contains(video_path):
+        try:
+            os.remove(video_path)
+            print(f"Deleted temp file: {video_path}")
+        except Exception:
+            pass
+
+# --- Duplicate checks ---
+# Completed reposts are recorded per account in the repost ledger. A known video ID
+# is rejected before download; with REPOST_LEDGER_PHASH=1 the downloaded video is
+# also fingerprinted so the same clip from another URL is caught before upload.
+
+def find_previous_repost(video_id, source):
+    """Return (url, created) of an earlier repost of this video to the account, or None."""
+    if not LEDGER_ENABLED:
+        return None
+    try:
+        return repost_ledger.find(INSTAGRAM_USERNAME, source, video_id)
+    except Exception as e:
+        safe_print_error("Could not read repost ledger", e)
+        return None
+
+def fingerprint_video(video_path):
+    """Return the video's perceptual hash and an earlier repost with the same hash, if any."""
+    if not LEDGER_ENABLED or not PHASH_ENABLED:
+        return None, None
+    phash = perceptual_hash(video_path, media_inspector.inspect(video_path))
+    try:
+        return phash, repost_ledger.find_by_phash(INSTAGRAM_USERNAME, phash)
+    except Exception as e:
+        safe_print_error("Could not read repost ledger", e)
+        return phash, None
+
+def record_repost(video_id, source, video_url, phash=None):
+    """Remember a completed repost so it is not posted to the account again."""
+    if not LEDGER_ENABLED:
+        return
+    try:
+        repost_ledger.record(INSTAGRAM_USERNAME, source, video_id, video_url, phash)
+    except Exception as e:
+        safe_print_error("Could not update repost ledger", e)
+
+def account_unavailable():
+    """Emit a failure and return True if the account's circuit breaker is refusing uploads."""
+    breaker = circuit_breaker("account", INSTAGRAM_USERNAME)
+    if not breaker.is_open():
+        return False
+    print(f"Skipping: uploads to {INSTAGRAM_USERNAME} are paused after repeated failures")
+    emit_event("job", "failed", error_code="circuit_open", message="Uploads to this account are paused after repeated failures")
+    return True
+
+def report_duplicate(previous):
+    """Log and emit the failure for a video that was already reposted."""
+    url, created = previous
+    posted_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(created))
+    print(f"Skipping: already reposted to {INSTAGRAM_USERNAME} on {posted_at} ({url})")
+    emit_event("job", "failed", error_code="duplicate", message="Video was already reposted to this account")
+
 def repost_video(video_url, custom_caption=None, custom_hashtags=None, source="instagram"):
     """Main function to repost a video from Instagram or YouTube to Instagram."""
-    success = False  # Initialize success flag
     upload_success = False  # Initialize upload success flag
     video_path = None  # Initialize video path
+    error = None  # Unexpected error, if any
     
     if not video_url:
         print("Error: No video URL provided")
+        emit_event("job", "failed", error_code="missing_url", message="No video URL provided")
         return False
         
     # Validate URL based on source
-    is_valid = False
-    if source == "instagram" and ("instagram.com/reel/" in video_url or "instagram.com/p/" in video_url):
-        is_valid = True
-    elif source == "youtube" and ("youtube.com/shorts/" in video_url or "youtu.be/" in video_url):
-        is_valid = True
-        
-    if not is_valid:
+    with timed("parse"):
+        valid = is_valid_source_url(video_url, source)
+        video_id = extract_video_id(video_url)
+    if not valid:
         print(f"Error: Invalid {source} URL")
+        emit_event("job", "failed", error_code="invalid_url", message=f"Invalid {source} URL")
+        return False
+    
+    # Stop duplicates before any network work
+    previous = find_previous_repost(video_id, source)
+    if previous:
+        report_duplicate(previous)
+        return False
+    # No point downloading while uploads to the account are failing
+    if account_unavailable():
         return False
     
     try:
@@ -140,131 +513,173 @@ def repost_video(video_url, custom_caption=None, custom_hashtags=None, source="i
             print("Error: Failed to download video.")
             return False
         
-        # Wait a moment to ensure status is updated
-        time.sleep(1)
-        
-        # STEP 2: Login phase
-        client = login_to_instagram(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD)
-        
-        if not client:
-            print("Error: Failed to login to Instagram.")
-            if os.path.exists(video_path):
-                os.remove(video_path)
+        phash, previous = fingerprint_video(video_path)
+        if previous:
             return False
         
-        # Wait a moment to ensure status is updated
-        time.sleep(1)
-        
-        # Use custom caption and hashtags if provided, otherwise use defaults
-        # Explicitly check if they're None or empty strings
-        caption_text = DEFAULT_CAPTION
-        hashtags_text = DEFAULT_HASHTAGS
-        
-        print("Processing caption and hashtags...")
-        
-        # Only use custom caption if it's not None and not empty
-        if custom_caption and isinstance(custom_caption, str) and custom_caption.strip():
-            caption_text = custom_caption.strip()
-            print("Using custom caption")
-        else:
-            print("Using default caption")
-        
-        # Only use custom hashtags if it's not None and not empty
-        if custom_hashtags and isinstance(custom_hashtags, str) and custom_hashtags.strip():
-            # Make sure hashtags start with #
-            hashtags_text = custom_hashtags.strip()
-            
-            # If hashtags don't start with # and there are spaces, add # to each word
-            if not hashtags_text.startswith("#") and " " in hashtags_text:
-                words = hashtags_text.split()
-                hashtags_text = " ".join([f"#{w}" if not w.startswith("#") else w for w in words])
-            # If there's just one word without #, add it
-            elif not hashtags_text.startswith("#"):
-                hashtags_text = f"#{hashtags_text}"
-                
-            print("Using custom hashtags")
-        else:
-            print("Using default hashtags")
-        
-        # STEP 3: Upload phase
-        print("STEP_MARKER: UPLOAD_STARTED")
-        print(f"Uploading {source} video to Instagram...")
-        full_caption = f"{caption_text}\n\n{hashtags_text}"
-        print("Caption and hashtags prepared")
-        
-        try:
-            print("Starting upload attempt...")
-            # First attempt with clip_upload (for Reels)
-            try:
-                print("Trying clip_upload method...")
-                client.clip_upload(
-                    path=video_path,
-                    caption=full_caption
-                )
-                upload_success = True
-                print("Reel uploaded successfully!")
-                print("STEP_MARKER: UPLOAD_COMPLETED")  # Add marker here too
-            except Exception as e:
-                safe_print_error("clip_upload failed", e)
-                print("Trying video_upload method...")
-                # Second attempt with video_upload (for regular videos)
-                try:
-                    client.video_upload(
-                        path=video_path,
-                        caption=full_caption
-                    )
-                    upload_success = True
-                    print("Video uploaded successfully!")
-                    print("STEP_MARKER: UPLOAD_COMPLETED")  # Add marker here too
-                except Exception as inner_e:
-                    safe_print_error("video_upload also failed", inner_e)
-                    raise inner_e
-        except Exception as e:
-            safe_print_error("Upload failed", e)
-            print("STEP_MARKER: UPLOAD_FAILED")
-            
-            # Try to provide specific solutions based on error message
-            error_msg = str(e).lower()
-            if "moviepy" in error_msg:
-                print("\nTroubleshooting:")
-                print("1. The error is related to moviepy, which is needed for video processing.")
-                print("2. Try these commands in your terminal:")
-                print("   pip install moviepy==1.0.3")
-                print("   pip install decorator==4.4.2")
-            elif "ffmpeg" in error_msg:
-                print("\nTroubleshooting:")
-                print("1. The error is related to ffmpeg, which is needed for video processing.")
-                print("2. Download ffmpeg from: https://ffmpeg.org/download.html")
-                print("3. Add ffmpeg to your PATH or set IMAGEIO_FFMPEG_EXE environment variable.")
-            # Make sure to leave the process in a failed state
-            return False
+        # STEPS 2 and 3: Login and upload
+        upload_success = publish_video(video_path, custom_caption, custom_hashtags, source, video_id)
+        if upload_success:
+            record_repost(video_id, source, video_url, phash)
+        return upload_success
     except Exception as e:
         safe_print_error("Unexpected error during repost process", e)
-        print("STEP_MARKER: UPLOAD_FAILED")
+        error = e
         return False
     finally:
-        # Check if upload was successful and mark accordingly
         if upload_success:
-            # Ensure this marker is printed for the backend to detect
-            print("STEP_MARKER: UPLOAD_COMPLETED")
             print("Upload completed successfully!")
-            success = True
         
-        # Clean up
-        if video_path and os.path.exists(video_path):
-            try:
-                os.remove(video_path)
-                print(f"Deleted temp file: {video_path}")
-            except Exception:
-                pass
+        # Clean up, leaving cached downloads for later reposts of the same source
+        cleanup_video(video_path)
         
-        # Final status message for the backend to detect
-        if success:
-            print("FINAL_STATUS: SUCCESS")
+        # Final status event for the backend
+        if upload_success:
+            emit_event("job", "completed")
+        elif previous:
+            report_duplicate(previous)
+        elif error:
+            emit_event("job", "failed", error_code="unexpected_error", message=safe_error_text(error))
         else:
-            print("FINAL_STATUS: FAILED")
+            emit_event("job", "failed")
+
+def prefetch_video(video_url, source="instagram"):
+    """Download, inspect and validate a video ahead of a scheduled post. Returns True if it is ready.
+
+    The download goes to the disk cache (never the memory spool) and the metadata and
+    cover image are stored, so the repost at the scheduled time skips that work.
+    """
+    if not video_url or not is_valid_source_url(video_url, source):
+        print(f"Error: Invalid {source} URL")
+        emit_event("job", "failed", error_code="invalid_url", message=f"Invalid {source} URL")
+        return False
+    
+    video_id = extract_video_id(video_url)
+    previous = find_previous_repost(video_id, source)
+    if previous:
+        report_duplicate(previous)
+        return False
     
-    return success
+    video_path = download_video(video_url, DOWNLOAD_FOLDER, source, spool="disk")
+    if not video_path:
+        emit_event("job", "failed", error_code="download_failed", message="Could not download the video")
+        return False
+    
+    _, previous = fingerprint_video(video_path)
+    if previous:
+        report_duplicate(previous)
+        return False
+    
+    media = media_inspector.inspect(video_path)
+    if media:
+        print(f"Prefetched {video_id}: {media.get('width')}x{media.get('height')}, "
+              f"{media.get('duration')}s, upload with {choose_upload_method(media)}")
+        thumbnail_store.get(video_path, media, video_id)
+    else:
+        print(f"Prefetched {video_id}; metadata unavailable, it will be checked at upload time")
+    emit_event("job", "completed", prefetched=True)
+    return True
+
+# --- Batch mode ---
+# Each line of a batch file is either a JSON object
+#   {"url": "...", "caption": "...", "hashtags": "...", "source": "..."}
+# or a URL optionally followed by a tab-separated caption and hashtags.
+# Blank lines and lines starting with "#" are skipped.
+
+def read_batch_items(batch_file, default_source="instagram"):
+    """Read batch items from a file, or from stdin when the file is "-"."""
+    stream = sys.stdin if batch_file == "-" else open(batch_file, "r", encoding="utf-8")
+    items = []
+    try:
+        for line in stream:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+            else:
+                parts = line.split("\t")
+                item = {
+                    "url": parts[0].strip(),
+                    "caption": parts[1] if len(parts) > 1 else None,
+                    "hashtags": parts[2] if len(parts) > 2 else None,
+                }
+            item["source"] = item.get("source") or detect_source(item["url"]) or default_source
+            items.append(item)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return items
+
+def repost_batch(items, download_workers=BATCH_DOWNLOAD_WORKERS, upload_workers=BATCH_UPLOAD_WORKERS):
+    """Repost many items, downloading later items while earlier ones upload."""
+    results = [{"url": item.get("url"), "success": False} for item in items]
+    # Caps how many videos sit on disk between download and upload
+    in_flight = threading.BoundedSemaphore(download_workers + upload_workers)
+    
+    def download_item(index, item):
+        # The slot is held until the upload finishes, or released below if the download fails
+        in_flight.acquire()
+        try:
+            if not item.get("url") or not is_valid_source_url(item["url"], item["source"]):
+                print(f"[{index + 1}/{len(items)}] Error: Invalid {item['source']} URL")
+                return None
+            if find_previous_repost(extract_video_id(item["url"]), item["source"]):
+                print(f"[{index + 1}/{len(items)}] Skipping: already reposted to {INSTAGRAM_USERNAME}")
+                results[index]["duplicate"] = True
+                return None
+            return download_video(item["url"], DOWNLOAD_FOLDER, item["source"])
+        except Exception as e:
+            safe_print_error(f"[{index + 1}/{len(items)}] Error downloading video", e)
+            return None
+    
+    def upload_item(index, item, video_path):
+        try:
+            phash, previous = fingerprint_video(video_path)
+            if previous:
+                print(f"[{index + 1}/{len(items)}] Skipping: the same video was already reposted")
+                results[index]["duplicate"] = True
+                return
+            results[index]["success"] = publish_video(video_path, item.get("caption"), item.get("hashtags"),
+                                                      item["source"], extract_video_id(item["url"]))
+            if results[index]["success"]:
+                record_repost(extract_video_id(item["url"]), item["source"], item["url"], phash)
+        except Exception as e:
+            safe_print_error(f"[{index + 1}/{len(items)}] Upload failed", e)
+        finally:
+            cleanup_video(video_path)
+            in_flight.release()
+        status = "succeeded" if results[index]["success"] else "failed"
+        print(f"[{index + 1}/{len(items)}] Repost {status}: {item['url']}")
+    
+    # The ledger only knows finished reposts, so a video listed twice in this batch is caught here
+    seen = set()
+    for index, item in enumerate(items):
+        if not item.get("url"):
+            continue
+        key = (item["source"], extract_video_id(item["url"]))
+        if key in seen:
+            print(f"[{index + 1}/{len(items)}] Skipping: the same video is earlier in this batch")
+            results[index]["duplicate"] = True
+        seen.add(key)
+    
+    with ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="download") as downloads, \
+         ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="upload") as uploads:
+        pending = {downloads.submit(download_item, index, item): index
+                   for index, item in enumerate(items) if not results[index].get("duplicate")}
+        for future in as_completed(pending):
+            index = pending[future]
+            video_path = future.result()
+            if results[index].get("duplicate"):
+                in_flight.release()
+                continue
+            if not video_path or not os.path.exists(video_path):
+                print(f"[{index + 1}/{len(items)}] Error: Failed to download video.")
+                in_flight.release()
+                continue
+            uploads.submit(upload_item, index, items[index], video_path)
+    
+    return results
 
 # Format a result for the API
 def format_api_result(success, message="", status="completed", steps=None):
@@ -280,20 +695,181 @@ def format_api_result(success, message="", status="completed", steps=None):
     
     return json.dumps(result)
 
+# --- Worker mode ---
+# Jobs arrive as one JSON object per line:
+#   {"id": "...", "url": "...", "caption": "...", "hashtags": "...", "source": "..."}
+# and everything a job prints is sent back as one JSON frame per line:
+#   {"type": "ready"}
+#   {"id": "...", "type": "log", "line": "..."}
+#   {"id": "...", "type": "stderr", "line": "..."}
+#   {"id": "...", "type": "result", "success": true}
+
+def write_frame(stream, frame):
+    """Write a single JSON frame and flush it straight away"""
+    stream.write(json.dumps(frame) + "\n")
+    stream.flush()
+
+class FramedJobOutput(io.TextIOBase):
+    """File-like object that turns each printed line into a framed log message"""
+
+    def __init__(self, stream, job_id, frame_type="log"):
+        self.stream = stream
+        self.job_id = job_id
+        self.frame_type = frame_type
+        self.buffer = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            write_frame(self.stream, {"id": self.job_id, "type": self.frame_type, "line": line})
+        return len(text)
+
+    def finish(self):
+        """Send any partial line left in the buffer"""
+        if self.buffer:
+            write_frame(self.stream, {"id": self.job_id, "type": self.frame_type, "line": self.buffer})
+            self.buffer = ""
+
+class LockedStream(io.TextIOBase):
+    """Writes whole lines under a lock, so lines printed by different threads never run together"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        # print() writes the text and the newline separately, so partial lines wait per thread
+        self.pending = threading.local()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        lines, newline, rest = (getattr(self.pending, "text", "") + text).rpartition("\n")
+        if newline:
+            with self.lock:
+                self.stream.write(lines + newline)
+                self.stream.flush()
+        self.pending.text = rest
+        return len(text)
+
+    def flush(self):
+        pass
+
+def run_worker_job(job, stream):
+    """Run one framed job, keeping the imports and Instagram client warm"""
+    job_id = job.get("id")
+    stdout = FramedJobOutput(stream, job_id)
+    stderr = FramedJobOutput(stream, job_id, "stderr")
+    success = False
+    
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            if job.get("action") == "prefetch":
+                success = prefetch_video(job.get("url"), job.get("source") or "instagram")
+            else:
+                success = repost_video(job.get("url"), job.get("caption"), job.get("hashtags"),
+                                       job.get("source") or "instagram")
+        except Exception as e:
+            safe_print_error("Unexpected error", e)
+            emit_event("job", "failed", error_code="unexpected_error", message=safe_error_text(e))
+    
+    stdout.finish()
+    stderr.finish()
+    write_frame(stream, {"id": job_id, "type": "result", "success": bool(success)})
+
+def serve_jobs(lines, stream):
+    """Read framed jobs from an iterable of lines until it ends or asks to shut down"""
+    write_frame(stream, {"type": "ready"})
+    for raw in lines:
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", errors="replace")
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            job = json.loads(raw)
+        except ValueError as e:
+            write_frame(stream, {"type": "error", "error": f"Invalid job frame: {e}"})
+            continue
+        if job.get("type") == "shutdown":
+            break
+        run_worker_job(job, stream)
+
+class WorkerRequestHandler(socketserver.StreamRequestHandler):
+    """Serves framed jobs over a local socket connection"""
+
+    def handle(self):
+        stream = io.TextIOWrapper(self.wfile, encoding="utf-8", errors="replace", write_through=True)
+        serve_jobs(self.rfile, stream)
+
+def run_worker(port=None):
+    """Run as a persistent worker on stdin/stdout, or on a local socket if a port is given"""
+    if port:
+        # TCPServer handles one connection at a time, so jobs never interleave their output
+        with socketserver.TCPServer((WORKER_HOST, port), WorkerRequestHandler) as server:
+            print(f"Worker listening on {WORKER_HOST}:{server.server_address[1]}", file=sys.stderr)
+            server.serve_forever()
+    else:
+        serve_jobs(sys.stdin, sys.stdout)
+
 # For use with API
 if __name__ == "__main__":
     # Configure sys.stdout to handle Unicode characters properly
-    import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+    sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
     
     parser = argparse.ArgumentParser(description='Repost Videos to Instagram')
-    parser.add_argument('url', help='Instagram reel or YouTube shorts URL to repost')
+    parser.add_argument('url', nargs='?', help='Instagram reel or YouTube shorts URL to repost')
     parser.add_argument('--caption', help='Custom caption for the repost')
     parser.add_argument('--hashtags', help='Custom hashtags for the repost')
     parser.add_argument('--source', help='Source platform (instagram or youtube)', default='instagram')
+    parser.add_argument('--worker', action='store_true', help='Run as a persistent worker reading JSON jobs from stdin')
+    parser.add_argument('--port', type=int, help='Serve worker jobs on a local socket instead of stdin')
+    parser.add_argument('--spool', choices=['disk', 'memory'], default=DOWNLOAD_SPOOL,
+                        help='Where downloads are written before upload (memory uses tmpfs)')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='Only download and validate the video ahead of a scheduled post')
+    parser.add_argument('--defer-uploads', action='store_true',
+                        help='Report a deferred upload instead of waiting for a free upload slot')
+    parser.add_argument('--batch', help='File with one URL or JSON item per line to repost ("-" for stdin)')
+    parser.add_argument('--download-workers', type=int, default=BATCH_DOWNLOAD_WORKERS,
+                        help='Concurrent downloads in batch mode')
+    parser.add_argument('--upload-workers', type=int, default=BATCH_UPLOAD_WORKERS,
+                        help='Concurrent uploads in batch mode')
     
     args = parser.parse_args()
+    DOWNLOAD_SPOOL = args.spool
+    UPLOAD_DEFER = args.defer_uploads or args.worker or bool(args.port)
+    
+    if args.worker or args.port:
+        run_worker(args.port)
+        sys.exit(0)
+    
+    if args.prefetch:
+        success = prefetch_video(args.url, args.source)
+        print(format_api_result(success, "Video prefetched" if success else "Could not prefetch video"))
+        sys.exit(0)
+    
+    if args.batch:
+        try:
+            items = read_batch_items(args.batch, args.source)
+        except (OSError, ValueError, KeyError) as e:
+            safe_print_error("Error reading batch file", e)
+            print(format_api_result(False, "Could not read batch file"))
+            sys.exit(1)
+        print(f"Starting batch repost of {len(items)} videos...")
+        # Download and upload threads print events at the same time
+        sys.stdout = LockedStream(sys.stdout)
+        results = repost_batch(items, max(1, args.download_workers), max(1, args.upload_workers))
+        succeeded = sum(1 for result in results if result["success"])
+        print(format_api_result(succeeded == len(results),
+                                f"{succeeded} of {len(results)} videos uploaded successfully",
+                                steps=results))
+        sys.exit(0)
     
     # Print arguments safely without encoding issues
     try:
@@ -314,20 +890,16 @@ if __name__ == "__main__":
             print("Starting video repost process...")
             success = repost_video(args.url, args.caption, args.hashtags, args.source)
             
-            # Always output a clear status marker
+            # Progress events are flushed as they happen, so only the summary is needed here
             if success:
-                print("STEP_MARKER: UPLOAD_COMPLETED")  # First to ensure it's not missed
                 print("Upload successful!")
                 print(format_api_result(True, f"{args.source.capitalize()} video uploaded successfully"))
-                # Print it again in case the earlier ones are lost
-                print("STEP_MARKER: UPLOAD_COMPLETED")
             else:
-                print("STEP_MARKER: UPLOAD_FAILED")
                 print("Upload failed!")
                 print(format_api_result(False, f"Failed to upload {args.source} video"))
         except Exception as e:
             safe_print_error("Unexpected error", e)
-            print("STEP_MARKER: UPLOAD_FAILED")  # Clear marker for failure
+            emit_event("job", "failed", error_code="unexpected_error", message=safe_error_text(e))
             print(format_api_result(False, "Error occurred during processing"))
     else:
         print(format_api_result(False, "Error: No video URL provided"))
@@ -6,6 +6,7 @@ import argparse
 from instagrapi import Client
 import yt_dlp
 from dotenv import load_dotenv
+from url_normalizer import extract_video_id
 
 # Load environment variables
 load_dotenv()
@@ -24,23 +25,6 @@ def safe_print_error(message, error):
     safe_error = error_str.encode('ascii', 'replace').decode('ascii')
     print(f"{message}: {safe_error}")
 
-def extract_video_id(url):
-    """Extract video ID from Instagram or YouTube URL."""
-    video_id = None
-    
-    # Instagram patterns
-    if "instagram.com/reel/" in url:
-        video_id = url.split("/reel/")[1].split("/")[0].split("?")[0]
-    elif "instagram.com/p/" in url:
-        video_id = url.split("/p/")[1].split("/")[0].split("?")[0]
-    # YouTube Shorts patterns
-    elif "youtube.com/shorts/" in url:
-        video_id = url.split("/shorts/")[1].split("?")[0]
-    elif "youtu.be/" in url:
-        video_id = url.split("youtu.be/")[1].split("?")[0]
-    
-    return video_id or "video_" + str(int(time.time()))
-
 def download_video(video_url, download_path, source="instagram"):
     """Downloads a video using yt-dlp from either Instagram or YouTube."""
     print(f"Downloading {source} video from: {video_url}")
@@ -6,6 +6,7 @@ import argparse
 import re
 from instagrapi import Client
 import yt_dlp
+from url_normalizer import extract_video_id
 
 # --- Configuration ---
 INSTAGRAM_USERNAME = "dantesclipz"
@@ -14,23 +15,6 @@ DEFAULT_CAPTION = "Thanks for watching, hit follow for more! 🙏"
 DEFAULT_HASHTAGS = "#reels #instareels #trending #viral #foryou #fyp #repost"
 DOWNLOAD_FOLDER = "downloaded_reels"
 
-def extract_video_id(url):
-    """Extract video ID from Instagram or YouTube URL."""
-    video_id = None
-    
-    # Instagram patterns
-    if "instagram.com/reel/" in url:
-        video_id = url.split("/reel/")[1].split("/")[0].split("?")[0]
-    elif "instagram.com/p/" in url:
-        video_id = url.split("/p/")[1].split("/")[0].split("?")[0]
-    # YouTube Shorts patterns
-    elif "youtube.com/shorts/" in url:
-        video_id = url.split("/shorts/")[1].split("?")[0]
-    elif "youtu.be/" in url:
-        video_id = url.split("youtu.be/")[1].split("?")[0]
-    
-    return video_id or "video_" + str(int(time.time()))
-
 def download_video(video_url, download_path, source="instagram"):
     """Downloads a video using yt-dlp from either Instagram or YouTube."""
     print(f"Downloading {source} video from: {video_url}")
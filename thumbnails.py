@@ -0,0 +1,103 @@
+"""
+Thumbnails for the repost tool
+Finds a cover image for each upload once and stores it by the video's SHA-256,
+so repeat uploads of the same file reuse it. A downloaded_reels/<id>.mp4.jpg
+sidecar left by earlier instagrapi uploads of the same video ID is adopted as is
+when the original download is uploaded unchanged; otherwise one frame is grabbed with an input seek, which decodes a single frame
+instead of the whole video.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+from media_inspector import media_inspector
+
+FFMPEG = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+THUMBNAIL_FOLDER = os.path.join("downloaded_reels", "thumbnails")
+SIDECAR_FOLDER = "downloaded_reels"  # Where older uploads left <video id>.mp4.jpg covers
+THUMBNAIL_MAX_FILES = 500
+THUMBNAIL_SEEK = 1.0       # Seconds into the video to take the cover frame from
+THUMBNAIL_TIMEOUT = 30
+
+class ThumbnailStore:
+    """Content-addressed store of cover images."""
+
+    def __init__(self, folder=THUMBNAIL_FOLDER, max_files=THUMBNAIL_MAX_FILES):
+        self.folder = folder
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def path_for(self, digest):
+        return os.path.join(self.folder, f"{digest}.jpg")
+
+    def sidecar_path(self, video_id):
+        """Path of the cover an earlier instagrapi upload of this video ID left behind."""
+        return os.path.join(SIDECAR_FOLDER, f"{video_id}.mp4.jpg")
+
+    def get(self, video_path, media=None, video_id=None):
+        """Return a thumbnail path for the video, or None so the uploader makes its own.
+
+        Pass video_id only when video_path is the original download, so a sidecar
+        cover of a different aspect ratio is never paired with a transcoded copy.
+        """
+        digest = media_inspector.file_hash(video_path)
+        stored_path = self.path_for(digest)
+        if os.path.exists(stored_path):
+            return stored_path
+
+        os.makedirs(self.folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".thumb_", suffix=".jpg", dir=self.folder)
+        os.close(fd)
+        try:
+            # Downloads are cached under keyed names, so the sidecar is found by video ID
+            sidecar_path = self.sidecar_path(video_id) if video_id else None
+            if sidecar_path and os.path.exists(sidecar_path) and os.path.getsize(sidecar_path) > 0:
+                print("Reusing existing thumbnail")
+                shutil.copyfile(sidecar_path, temp_path)
+            elif not self.extract_frame(video_path, temp_path, media):
+                return None
+            os.replace(temp_path, stored_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self._prune()
+        return stored_path
+
+    def extract_frame(self, video_path, output_path, media=None):
+        """Grab one frame with a fast input seek; returns True on success."""
+        duration = (media or {}).get("duration") or 0
+        # Stay inside very short clips
+        seek = min(THUMBNAIL_SEEK, duration / 2) if duration else 0
+        command = [
+            FFMPEG, "-y", "-v", "error", "-ss", f"{seek:.3f}", "-i", video_path,
+            "-frames:v", "1", "-q:v", "2", "-f", "image2", output_path,
+        ]
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=THUMBNAIL_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Could not create thumbnail: {e}")
+            return False
+        if result.returncode != 0 or not os.path.getsize(output_path):
+            print(f"Could not create thumbnail: {result.stderr.strip()}")
+            return False
+        return True
+
+    def _prune(self):
+        """Delete the oldest thumbnails once the store holds more than max_files."""
+        with self._lock:
+            paths = [os.path.join(self.folder, name) for name in os.listdir(self.folder)
+                     if name.endswith(".jpg") and not name.startswith(".")]
+            if len(paths) <= self.max_files:
+                return
+            paths.sort(key=lambda path: os.path.getmtime(path))
+            for path in paths[:len(paths) - self.max_files]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+# Shared thumbnail store used by the repost scripts
+thumbnail_store = ThumbnailStore()
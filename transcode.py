@@ -0,0 +1,116 @@
+"""
+Transcode stage for the repost tool
+Converts downloads to the Instagram Reels spec (H.264/AAC in MP4, 9:16, capped
+bitrates) before upload. The cached media inspection skips files that already comply,
+and at most one ffmpeg process per core transcodes at a time.
+"""
+
+import os
+import tempfile
+import threading
+import subprocess
+from media_inspector import media_inspector
+
+FFMPEG = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+TRANSCODE_FOLDER = os.path.join("downloaded_reels", "transcoded")
+TRANSCODE_WORKERS = max(1, int(os.environ.get("TRANSCODE_WORKERS") or os.cpu_count() or 1))
+TRANSCODE_TIMEOUT = 15 * 60  # Seconds before a transcode is abandoned
+
+# Instagram Reels spec
+REEL_WIDTH = 1080
+REEL_HEIGHT = 1920
+ASPECT_TOLERANCE = 0.02               # Accept aspect ratios within 2% of 9:16
+MAX_VIDEO_BITRATE = 5_000_000         # bits per second
+MAX_AUDIO_BITRATE = 128_000
+MAX_FRAME_RATE = 60
+VIDEO_CODEC = "h264"
+AUDIO_CODEC = "aac"
+PIXEL_FORMAT = "yuv420p"
+
+def compliance_issues(media):
+    """List the ways an inspected file misses the Reels spec; empty means it can be uploaded as is."""
+    if not media.get("video_codec"):
+        return ["no video stream"]
+
+    issues = []
+    if "mp4" not in media["format_name"]:
+        issues.append("container is not MP4")
+    if media["video_codec"] != VIDEO_CODEC:
+        issues.append(f"video codec is {media['video_codec']}")
+    if media["pix_fmt"] != PIXEL_FORMAT:
+        issues.append(f"pixel format is {media['pix_fmt']}")
+
+    width, height = media["width"], media["height"]
+    target_aspect = REEL_WIDTH / REEL_HEIGHT
+    if not media["aspect_ratio"] or abs(media["aspect_ratio"] - target_aspect) > ASPECT_TOLERANCE * target_aspect:
+        issues.append(f"aspect ratio is {width}x{height}")
+    elif height > REEL_HEIGHT:
+        issues.append(f"resolution {width}x{height} is above {REEL_WIDTH}x{REEL_HEIGHT}")
+
+    if media["video_bitrate"] > MAX_VIDEO_BITRATE:
+        issues.append(f"video bitrate is {media['video_bitrate']}")
+    if media["frame_rate"] > MAX_FRAME_RATE:
+        issues.append(f"frame rate is {media['frame_rate']}")
+    if media["audio_codec"] and media["audio_codec"] != AUDIO_CODEC:
+        issues.append(f"audio codec is {media['audio_codec']}")
+    if media["audio_bitrate"] > MAX_AUDIO_BITRATE * 2:
+        issues.append(f"audio bitrate is {media['audio_bitrate']}")
+    return issues
+
+def transcode_file(source_path, output_path, threads=1):
+    """Run ffmpeg to produce a Reels-compliant copy."""
+    # Scale to fit 1080x1920 and pad the rest, so nothing is cropped
+    video_filter = (
+        f"scale={REEL_WIDTH}:{REEL_HEIGHT}:force_original_aspect_ratio=decrease,"
+        f"pad={REEL_WIDTH}:{REEL_HEIGHT}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+        f"fps='min(source_fps,{MAX_FRAME_RATE})'"
+    )
+    command = [
+        FFMPEG, "-y", "-v", "error", "-i", source_path,
+        "-vf", video_filter,
+        "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "high", "-pix_fmt", PIXEL_FORMAT,
+        "-crf", "23", "-maxrate", str(MAX_VIDEO_BITRATE), "-bufsize", str(MAX_VIDEO_BITRATE * 2),
+        "-c:a", "aac", "-b:a", str(MAX_AUDIO_BITRATE), "-ar", "48000", "-ac", "2",
+        "-movflags", "+faststart", "-threads", str(threads),
+        output_path,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, timeout=TRANSCODE_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+    return output_path
+
+# ffmpeg already runs in its own process, so callers run it from their own thread and
+# only take a slot here to cap how many transcodes run at once
+_slots = threading.BoundedSemaphore(TRANSCODE_WORKERS)
+
+def ensure_reel_compliant(video_path, output_folder=TRANSCODE_FOLDER):
+    """Return a path to a Reels-compliant version of the video.
+
+    The original path is returned when it already complies, or when it cannot be
+    inspected or transcoded, so the upload still gets attempted. A new file is
+    only created when a transcode succeeds; the caller deletes it after upload.
+    """
+    media = media_inspector.inspect(video_path)
+    if media is None:
+        return video_path
+    issues = compliance_issues(media)
+    if not issues:
+        print("Video already meets the Reels spec, skipping transcode")
+        return video_path
+
+    print(f"Transcoding video for Reels: {', '.join(issues)}")
+    os.makedirs(output_folder, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    fd, output_path = tempfile.mkstemp(prefix=f"{base_name}_", suffix=".mp4", dir=output_folder)
+    os.close(fd)
+
+    # Split the cores between the concurrent transcodes so they do not oversubscribe
+    threads = max(1, (os.cpu_count() or 1) // TRANSCODE_WORKERS)
+    try:
+        with _slots:
+            return transcode_file(video_path, output_path, threads)
+    except Exception as e:
+        print(f"Transcode failed, uploading the original: {str(e).encode('ascii', 'replace').decode('ascii')}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return video_path
@@ -0,0 +1,187 @@
+"""
+Upload rate limiter for the repost tool
+Spaces uploads per Instagram account with a token bucket, so bursts of uploads
+no longer get accounts temporarily blocked. The bucket refills at the sustained
+rate the hourly and daily limits allow, and also respects a rolling 24 hour
+publishing quota. That quota is synced from the Graph API's
+content_publishing_limit when that path is used. State lives in SQLite, so
+every worker process shares it and it survives restarts.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+LIMITER_PATH = os.environ.get("UPLOAD_LIMITER_PATH") or os.path.join("downloaded_reels", "upload_limits.sqlite3")
+UPLOADS_PER_HOUR = float(os.environ.get("UPLOADS_PER_HOUR", 6))
+UPLOADS_PER_DAY = int(os.environ.get("UPLOADS_PER_DAY", 25))       # Graph API publishing limit per 24h
+UPLOAD_BURST = float(os.environ.get("UPLOAD_BURST", 2))             # Uploads allowed back to back
+# Longest a blocking caller waits for the next slot; by default one refill interval, so
+# spacing alone never fails an upload and only a used-up daily quota does
+UPLOAD_MAX_WAIT = float(os.environ["UPLOAD_MAX_WAIT"]) if os.environ.get("UPLOAD_MAX_WAIT") else None
+QUOTA_WINDOW = 24 * 60 * 60
+QUOTA_SYNC_TTL = 10 * 60  # Seconds a synced Graph API quota reading is trusted
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    account TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    quota_used INTEGER,
+    quota_total INTEGER,
+    quota_synced REAL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    account TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_account_ts ON uploads (account, ts);
+"""
+
+class UploadQuotaExceeded(Exception):
+    """Raised when the next upload slot is further away than the caller will wait."""
+
+    def __init__(self, account, wait):
+        super().__init__(f"Upload limit reached for {account}, next slot in {int(wait)}s")
+        self.account = account
+        self.wait = wait
+
+class UploadRateLimiter:
+    """Persistent per-account token bucket with a rolling daily quota."""
+
+    def __init__(self, path=LIMITER_PATH, per_hour=UPLOADS_PER_HOUR, per_day=UPLOADS_PER_DAY, burst=UPLOAD_BURST,
+                 max_wait=UPLOAD_MAX_WAIT):
+        self.path = path
+        self.per_day = per_day
+        self.burst = burst
+        # Refill no faster than either limit allows over the long run
+        self.rate = min(per_hour / 3600.0, per_day / float(QUOTA_WINDOW))
+        self.max_wait = 1 / self.rate if max_wait is None else max_wait
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # Autocommit mode, so BEGIN IMMEDIATE below controls the transactions
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def reserve(self, account, now=None):
+        """Take an upload slot if one is free.
+
+        Returns (slot, 0) when a slot was taken, where slot identifies it for
+        release(), or (None, seconds until the next slot). The check and the update
+        happen in one write transaction, so worker processes never hand out the
+        same slot twice.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT tokens, updated, quota_used, quota_total, quota_synced FROM buckets WHERE account = ?",
+                    (account,),
+                ).fetchone()
+                tokens, updated, quota_used, quota_total, quota_synced = row or (self.burst, now, None, None, None)
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                slot = None
+
+                connection.execute("DELETE FROM uploads WHERE account = ? AND ts <= ?", (account, now - QUOTA_WINDOW))
+                recent = connection.execute(
+                    "SELECT COUNT(*), MIN(ts) FROM uploads WHERE account = ?", (account,)
+                ).fetchone()
+                used, oldest = recent
+                limit = self.per_day
+                # A fresh reading from the Graph API overrides our own count
+                if quota_synced and now - quota_synced < QUOTA_SYNC_TTL:
+                    used = max(used, quota_used or 0)
+                    limit = min(limit, quota_total or limit)
+
+                if used >= limit:
+                    # Wait for the oldest upload in the window to age out
+                    wait = (oldest + QUOTA_WINDOW - now) if oldest else QUOTA_SYNC_TTL
+                elif tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                    slot = connection.execute("INSERT INTO uploads (account, ts) VALUES (?, ?)", (account, now)).lastrowid
+                else:
+                    wait = (1 - tokens) / self.rate
+
+                connection.execute(
+                    "INSERT OR REPLACE INTO buckets (account, tokens, updated, quota_used, quota_total, quota_synced) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (account, tokens, now, quota_used, quota_total, quota_synced),
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return slot, max(0.0, wait)
+
+    def acquire(self, account, max_wait=None, on_wait=None, sleep=time.sleep):
+        """Block until an upload slot is free; returns the slot for release().
+
+        on_wait(delay) is called before each wait. Raises UploadQuotaExceeded if
+        the next slot is more than max_wait (default self.max_wait) away; with
+        max_wait=0 it never sleeps.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        while True:
+            slot, wait = self.reserve(account)
+            if slot is not None:
+                return slot
+            if wait > max_wait:
+                raise UploadQuotaExceeded(account, wait)
+            print(f"Upload limit for {account}: waiting {wait:.0f}s for the next slot")
+            if on_wait:
+                on_wait(wait)
+            sleep(wait)
+
+    def release(self, slot):
+        """Give back a slot taken by acquire(), for an upload that never reached Instagram.
+
+        The slot is removed by its ID, so a concurrent upload on the same account keeps its own.
+        """
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT account FROM uploads WHERE rowid = ?", (slot,)).fetchone()
+                if row:
+                    connection.execute("DELETE FROM uploads WHERE rowid = ?", (slot,))
+                    connection.execute(
+                        "UPDATE buckets SET tokens = MIN(?, tokens + 1) WHERE account = ?", (self.burst, row[0])
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def sync_quota(self, account, used, total, now=None):
+        """Record the publishing quota usage reported by the Graph API."""
+        now = time.time() if now is None else now
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT INTO buckets (account, tokens, updated, quota_used, quota_total, quota_synced) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(account) DO UPDATE SET "
+                    "quota_used = excluded.quota_used, quota_total = excluded.quota_total, "
+                    "quota_synced = excluded.quota_synced",
+                    (account, self.burst, now, used, total, now),
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+# Shared limiter used by the repost scripts
+upload_rate_limiter = UploadRateLimiter()
@@ -0,0 +1,69 @@
+"""
+URL normalizer for the repost tool
+Turns any supported Instagram or YouTube link into a canonical (source, id) key
+with precompiled patterns, so the download cache and the repost ledger see the
+same key for every spelling of the same video. Covers reels, posts, IGTV, shorts,
+youtu.be, watch, embed, live, mobile and share links, with or without scheme,
+tracking parameters or fragments. Instagram share links only carry a share token,
+so their keys are marked canonical=False: the same reel has another key under
+its /reel/ link.
+"""
+
+import re
+import hashlib
+import functools
+from collections import namedtuple
+
+VideoKey = namedtuple("VideoKey", ["source", "video_id", "canonical"], defaults=[True])
+
+# Path segments that can follow /reels/ or /p/ but name a page rather than a video,
+# e.g. instagram.com/reels/audio/<id> is a sound page
+_NON_MEDIA = r"(?!(?:audio|explore|tags|locations|stories|accounts|direct)(?![\w-]))"
+
+# Scheme and the www, m or music subdomain are optional, so pasted links still match.
+# All link shapes are alternatives of one pattern, so each URL costs a single match call;
+# the name of the group that matched tells the source.
+_VIDEO_URL = re.compile(
+    r"^\s*(?:https?://)?(?:www\.|m\.|music\.)?(?:"
+    # instagram.com/share/reel/TOKEN share links, tried first so "share" is not taken for a username
+    r"instagram\.com/share/(?:reels?|p|tv)/" + _NON_MEDIA + r"(?P<instagram_share>[\w-]+)"
+    # instagram.com/reel/ID, /reels/ID, /p/ID, /tv/ID, optionally after a username
+    r"|instagram\.com/(?:[\w.]+/(?=(?:reels?|p|tv)/))?(?:reels?|p|tv)/" + _NON_MEDIA + r"(?P<instagram>[\w-]+)"
+    r"|instagr\.am/(?:reels?|p|tv)/" + _NON_MEDIA + r"(?P<instagram_short>[\w-]+)"
+    # youtube.com/shorts/ID, /embed/ID, /live/ID, /v/ID and youtube-nocookie.com/embed/ID
+    r"|youtube(?:-nocookie)?\.com/(?:shorts|embed|live|v)/(?P<youtube>[\w-]{11})(?![\w-])"
+    # youtube.com/watch?...v=ID in any position of the query string
+    r"|youtube\.com/watch/?\?(?:[^#]*&)?v=(?P<youtube_watch>[\w-]{11})(?![\w-])"
+    r"|youtu\.be/(?P<youtube_short>[\w-]{11})(?![\w-])"
+    r")",
+    re.IGNORECASE | re.ASCII,
+)
+
+# Each job looks its URL up several times (cache, ledger, download), so keep recent keys
+@functools.lru_cache(maxsize=4096)
+def normalize_url(url):
+    """Return the VideoKey for a supported video URL, or None if it is not recognised."""
+    if not url:
+        return None
+    match = _VIDEO_URL.match(url)
+    if not match:
+        return None
+    source, _, shape = match.lastgroup.partition("_")
+    return VideoKey(source, match.group(match.lastgroup), shape != "share")
+
+def extract_video_id(url):
+    """Extract the video ID from an Instagram or YouTube URL.
+
+    Unrecognised URLs get a stable ID derived from the URL itself, so the same
+    link always maps to the same cache entry and ledger row.
+    """
+    key = normalize_url(url)
+    if key:
+        return key.video_id
+    cleaned = (url or "").strip().split("#", 1)[0]
+    return "url_" + hashlib.sha1(cleaned.encode("utf-8")).hexdigest()[:16]
+
+def detect_source(url):
+    """Return "instagram" or "youtube" for a recognised video URL, or None."""
+    key = normalize_url(url)
+    return key.source if key else None